@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Compare throughput and tail latency of /graphql (sync) and /graphql/async.
+
+Both paths run in-process against the configured database: the sync view
+through Django's WSGI handler from a pool of client threads, the async view
+through the ASGI handler from concurrent asyncio tasks. Seed data first,
+e.g. ``python manage.py create_sample_data``.
+
+    python benchmarks/bench_async.py [--requests 400] [--concurrency 16]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crm.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connections  # noqa: E402
+from django.test import AsyncClient, Client  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+QUERY = '''{
+    totalCustomers totalOrders totalRevenue
+    ordersLastWeek { id orderDate customer { email } }
+    lowStockProducts { id name stock }
+}'''
+BODY = {'query': QUERY}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(name, latencies, elapsed):
+    ms = [latency * 1000 for latency in latencies]
+    print(f"{name:<6} {len(ms) / elapsed:>8.1f} req/s  "
+          f"p50 {statistics.median(ms):>7.2f} ms  "
+          f"p95 {percentile(ms, 95):>7.2f} ms  "
+          f"p99 {percentile(ms, 99):>7.2f} ms")
+
+
+def run_sync(requests, concurrency):
+    def one(_):
+        start = time.perf_counter()
+        response = Client().post(
+            '/graphql', BODY, content_type='application/json'
+        )
+        assert response.status_code == 200, response.content
+        return time.perf_counter() - start
+
+    def close_connection(_):
+        connections.close_all()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, range(requests)))
+        list(pool.map(close_connection, range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+async def run_async(requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    client = AsyncClient()
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(
+                '/graphql/async', BODY, content_type='application/json'
+            )
+            assert response.status_code == 200, response.content
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+    setup_test_environment()  # lets the test clients' 'testserver' host in
+
+    # Warm up both paths (document cache, connections).
+    run_sync(args.concurrency, args.concurrency)
+    asyncio.run(run_async(args.concurrency, args.concurrency))
+
+    print(f"{args.requests} requests, {args.concurrency} concurrent clients")
+    report('sync', *run_sync(args.requests, args.concurrency))
+    report('async', *asyncio.run(run_async(args.requests, args.concurrency)))
+
+
+if __name__ == '__main__':
+    main()
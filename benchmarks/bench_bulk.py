@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Rows per second of bulkUpsertCustomers, bulkUpsertProducts and bulkCreateOrders.
+
+Seeds ``--customers`` synthetic customers (and a tenth as many products)
+into their own SQLite file under ``benchmarks/`` (kept between runs;
+``--reseed`` rebuilds it), so the upsert lookups, unique index and search
+triggers work against a realistically sized table. Each mutation is then
+executed against the schema with ``--batch`` rows passed as variables,
+``--repeat`` times, each run in a transaction that is rolled back so every
+run sees the same data. The median wall time and the rows per second it
+gives are printed per operation and batch size.
+
+    python benchmarks/bench_bulk.py [--customers 100k] [--batch 500,5000] [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_resolvers import ROOT, SEED, parse_size, setup_django, size_label  # noqa: E402
+
+CUSTOMERS = '''
+    mutation ($rows: [CustomerInput!]!) {
+        bulkUpsertCustomers(rows: $rows) { created updated errors { index } }
+    }'''
+PRODUCTS = '''
+    mutation ($rows: [ProductInput!]!) {
+        bulkUpsertProducts(rows: $rows) { created updated errors { index } }
+    }'''
+ORDERS = '''
+    mutation ($rows: [OrderInput!]!) {
+        bulkCreateOrders(rows: $rows) { created errors { index } }
+    }'''
+
+
+def operations(batch):
+    """``(label, query, rows)`` for each operation at ``batch`` rows."""
+    from crm_app.models import Customer
+
+    ids = list(Customer.objects.order_by('id').values_list('id', flat=True)[:batch])
+    return [
+        ('customers, new', CUSTOMERS, [
+            {'name': f'Bulk {i}', 'email': f'bulk-{i}@example.com'} for i in range(batch)
+        ]),
+        ('customers, existing', CUSTOMERS, [
+            {'name': f'Renamed {i}', 'email': f'synthetic-{SEED}-{i}@example.com'}
+            for i in range(batch)
+        ]),
+        ('products, new', PRODUCTS, [
+            {'name': f'Bulk product {i}', 'price': '9.99', 'stock': 5} for i in range(batch)
+        ]),
+        ('products, existing', PRODUCTS, [
+            {'name': f'Product {SEED}-{i}', 'stock': 50} for i in range(batch)
+        ]),
+        ('orders, by id', ORDERS, [
+            {'customerId': str(ids[i % len(ids)]), 'totalAmount': '25.00'} for i in range(batch)
+        ]),
+        ('orders, by email', ORDERS, [
+            {'customerEmail': f'synthetic-{SEED}-{i}@example.com', 'totalAmount': '25.00'}
+            for i in range(batch)
+        ]),
+    ]
+
+
+def seed(customers, reseed):
+    from django.core.management import call_command
+    from crm_app.models import Customer, Product
+    from crm_app.synthetic import SyntheticGenerator
+
+    call_command('migrate', verbosity=0)
+    if reseed or Customer.objects.count() != customers:
+        Customer.objects.all().delete()
+        Product.objects.all().delete()
+        start = time.perf_counter()
+        report = SyntheticGenerator(seed=SEED, chunk_size=10000).generate(
+            customers=customers, products=customers // 10,
+        )
+        print(f"seeded {report.total} rows in {time.perf_counter() - start:.1f}s",
+              file=sys.stderr)
+
+
+def run(document, rows):
+    from django.db import transaction
+    from graphql import execute
+    from crm.schema import schema
+
+    with transaction.atomic():
+        start = time.perf_counter()
+        result = execute(schema.graphql_schema, document, variable_values={'rows': rows},
+                         context_value=SimpleNamespace())
+        elapsed = time.perf_counter() - start
+        transaction.set_rollback(True)
+    if result.errors:
+        raise SystemExit(result.errors)
+    data = next(iter(result.data.values()))
+    if data['errors']:
+        raise SystemExit(f"{len(data['errors'])} rows failed: {data['errors'][:3]}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--customers', default='100k')
+    parser.add_argument('--batch', default='500,5000')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--reseed', action='store_true')
+    args = parser.parse_args()
+
+    customers = parse_size(args.customers)
+    setup_django(os.path.join(
+        ROOT, 'benchmarks', f'bench_bulk_{size_label(customers)}_seed{SEED}.sqlite3'
+    ))
+    seed(customers, args.reseed)
+    from django.test.utils import override_settings
+    from graphql import parse
+
+    print(f"{size_label(customers)} customers, {args.repeat} runs")
+    print(f"{'operation':<22} {'rows':>6} {'p50 ms':>9} {'rows/s':>9}")
+    for batch in [parse_size(size) for size in args.batch.split(',')]:
+        with override_settings(CRM_BULK_MAX_ROWS=max(batch, 5000)):
+            for label, query, rows in operations(batch):
+                document = parse(query)
+                timings = sorted(run(document, rows) for _ in range(args.repeat))
+                median = statistics.median(timings)
+                print(f"{label:<22} {batch:>6} {median * 1000:>9.1f} {batch / median:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark the CPU saved per request by the GraphQL document cache.
+
+For each operation our jobs and dashboards send, measures the CPU time
+spent turning query text into a validated document with the cache disabled
+(parse + validate every time) and warm (one LRU lookup), then the same for
+a full ``{ hello }`` request through the view.
+
+    python benchmarks/bench_document_cache.py [--iterations 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crm.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test import RequestFactory  # noqa: E402
+
+from crm.document_cache import DocumentCache, query_hash  # noqa: E402
+from crm.views import CRMGraphQLView  # noqa: E402
+
+OPERATIONS = {
+    'hello': '{ hello }',
+    'report': '{ totalCustomers totalOrders totalRevenue }',
+    'reminders': '{ ordersLastWeek { id customer { email } orderDate } }',
+    'low_stock': '''
+        mutation ($threshold: Int, $increment: Int) {
+            updateLowStockProducts(threshold: $threshold, increment: $increment) {
+                success message updatedProducts { id name stock }
+            }
+        }
+    ''',
+    'dashboard': '''
+        query ($after: String) {
+            customers(first: 50, after: $after) {
+                edges { cursor node { id name email createdAt
+                    orderSet { id orderDate totalAmount } } }
+                pageInfo { hasNextPage endCursor }
+            }
+            lowStockProducts { id name stock }
+            totalCustomers totalOrders totalRevenue averageOrderValue
+        }
+    ''',
+}
+
+
+def cpu_per_call(func, iterations):
+    start = time.process_time()
+    for _ in range(iterations):
+        func()
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def make_view(cache):
+    view = CRMGraphQLView()
+    view.document_cache = cache
+    return view
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    cold = make_view(DocumentCache(maxsize=0))
+    warm = make_view(DocumentCache(maxsize=256))
+
+    print(f"{'operation':<12} {'uncached us':>12} {'cached us':>10} {'saved':>7}")
+    for name, query in OPERATIONS.items():
+        key = query_hash(query)
+        uncached = cpu_per_call(lambda: cold.get_document(query, key), args.iterations)
+        warm.get_document(query, key)
+        cached = cpu_per_call(lambda: warm.get_document(query, key), args.iterations)
+        print(f"{name:<12} {uncached:>12.1f} {cached:>10.1f} "
+              f"{(1 - cached / uncached):>6.0%}")
+
+    factory = RequestFactory()
+
+    def request(view):
+        def run():
+            view.get_response(factory.post('/graphql'), {'query': OPERATIONS['hello']})
+        return run
+
+    uncached = cpu_per_call(request(cold), args.iterations)
+    cached = cpu_per_call(request(warm), args.iterations)
+    print(f"\nfull {{ hello }} request: {uncached:.1f} us uncached, "
+          f"{cached:.1f} us cached ({(1 - cached / uncached):.0%} saved)")
+
+
+if __name__ == '__main__':
+    main()
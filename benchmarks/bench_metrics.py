@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Measure the overhead of the Prometheus instrumentation on /graphql.
+
+Runs the same operations through ``CRMGraphQLView`` with metrics off, with
+operation metrics only (``CRM_METRICS_FIELDS = False``) and with per-field
+timing too, against the 1k-order dataset of ``bench_resolvers.py``, and
+reports wall time per request and the overhead of each mode.
+
+    python benchmarks/bench_metrics.py [--iterations 300]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import date
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_resolvers import ROOT, SEED, seed, setup_django  # noqa: E402
+
+OPERATIONS = {
+    'hello': '{ hello }',
+    'totals': '{ totalCustomers totalOrders totalRevenue averageOrderValue }',
+    'orders page': '''{
+        orders(first: 50) { edges { node { id orderDate totalAmount customer { email } } } }
+    }''',
+    'customers page': '''{
+        customers(first: 50) { edges { node { id name orderSet { id totalAmount } } } }
+    }''',
+}
+MODES = {
+    'off': {'CRM_METRICS_ENABLED': False},
+    'operations': {'CRM_METRICS_ENABLED': True, 'CRM_METRICS_FIELDS': False},
+    'operations+fields': {'CRM_METRICS_ENABLED': True, 'CRM_METRICS_FIELDS': True},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=300)
+    args = parser.parse_args()
+
+    setup_django(os.path.join(
+        ROOT, 'benchmarks', f'bench_1k_seed{SEED}_{date.today():%Y%m%d}.sqlite3'
+    ))
+    seed(1000, reseed=False)
+
+    from django.test import RequestFactory
+    from django.test.utils import override_settings
+    from crm.views import CRMGraphQLView
+
+    view = CRMGraphQLView.as_view()
+    factory = RequestFactory()
+
+    def per_request_us(query):
+        body = json.dumps({'query': query})
+        samples = []
+        for _ in range(args.iterations):
+            request = factory.post('/graphql', body, content_type='application/json')
+            start = time.perf_counter()
+            response = view(request)
+            samples.append((time.perf_counter() - start) * 1e6)
+            assert response.status_code == 200, response.content
+        return statistics.median(samples)
+
+    print(f"{'operation':<16}" + ''.join(f'{mode:>20}' for mode in MODES))
+    for name, query in OPERATIONS.items():
+        timings = {}
+        for mode, overrides in MODES.items():
+            with override_settings(**overrides):
+                per_request_us(query)  # warm up
+                timings[mode] = per_request_us(query)
+        cells = [f"{timings['off']:>18.0f}us"]
+        for mode in list(MODES)[1:]:
+            overhead = timings[mode] / timings['off'] - 1
+            cells.append(f"{timings[mode]:>10.0f}us ({overhead:+.1%})")
+        print(f'{name:<16}' + ''.join(f'{cell:>20}' for cell in cells))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Benchmark every Query field and mutation of crm.schema across dataset sizes.
+
+For each size a deterministic synthetic dataset is seeded into its own
+SQLite file under ``benchmarks/`` (kept between runs; ``--reseed`` rebuilds
+it), then each operation is executed through ``schema.execute`` and its
+wall time (median and min of ``--repeat`` runs), SQL query count and peak
+Python memory (tracemalloc) are recorded. Every run is rolled back, so
+mutations see the same data each time. Results are written as JSON; two
+result files can be compared, and any regression beyond the threshold
+makes the comparison exit with status 1.
+
+    python benchmarks/bench_resolvers.py run [--sizes 1k,100k,1m] [--output results.json]
+        [--baseline old.json]
+    python benchmarks/bench_resolvers.py compare old.json new.json [--threshold 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+SEED = 1
+TRANSACTION_CONTROL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+OPERATIONS = {
+    'hello': ('{ hello }', {}),
+    'customers': ('''
+        query ($after: String) {
+            customers(first: 50, after: $after) {
+                edges { node { id name email orderSet { id totalAmount } } }
+                pageInfo { hasNextPage endCursor }
+            }
+        }''', {}),
+    'customers_deep': ('''
+        query ($after: String) {
+            customers(first: 50, after: $after) {
+                edges { node { id name email orderSet { id totalAmount } } }
+                pageInfo { hasNextPage endCursor }
+            }
+        }''', {'after': 'MIDDLE_CUSTOMER'}),
+    'products': ('''{
+            products(first: 50) { edges { node { id name price stock } } }
+        }''', {}),
+    'orders': ('''{
+            orders(first: 50) { edges { node { id orderDate totalAmount customer { email } } } }
+        }''', {}),
+    'ordersLastWeek': ('{ ordersLastWeek { id orderDate customer { email } } }', {}),
+    'lowStockProducts': ('{ lowStockProducts { id name stock } }', {}),
+    'totals': ('{ totalCustomers totalOrders totalRevenue averageOrderValue }', {}),
+    'revenueBetween': ('''
+        query ($from: DateTime!, $to: DateTime!) { revenueBetween(from: $from, to: $to) }
+        ''', {'from': 'MONTH_AGO', 'to': 'NOW'}),
+    'ordersCount': ('''
+        query ($from: DateTime!, $to: DateTime!) { ordersCount(from: $from, to: $to) }
+        ''', {'from': 'MONTH_AGO', 'to': 'NOW'}),
+    'revenueSeries': ('''
+        query ($from: Date!, $to: Date!) {
+            revenueSeries(from: $from, to: $to, granularity: WEEK) { start orders revenue }
+        }
+        ''', {'from': 'YEAR_AGO_DAY', 'to': 'TODAY'}),
+    'topCustomers': ('''
+        { topCustomers(limit: 10, window: 30) { customer { name } orders revenue } }
+        ''', {}),
+    'updateLowStockProducts': ('''
+        mutation { updateLowStockProducts { success updatedProducts { id stock } } }
+        ''', {}),
+}
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    factor = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * factor)
+
+
+def size_label(size):
+    for factor, suffix in ((1000000, 'm'), (1000, 'k')):
+        if size >= factor and size % factor == 0:
+            return f'{size // factor}{suffix}'
+    return str(size)
+
+
+# -- worker: runs inside a subprocess bound to one dataset -------------------
+
+def setup_django(db_path):
+    os.environ['CRM_BENCH_DB'] = db_path
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    import django
+    django.setup()
+
+
+def seed(orders, reseed):
+    from django.core.management import call_command
+    from crm_app import rollups
+    from crm_app.models import Customer, Order, Product
+    from crm_app.synthetic import SyntheticGenerator
+
+    call_command('migrate', verbosity=0)
+    if reseed or Order.objects.count() != orders:
+        Order.objects.all().delete()
+        Customer.objects.all().delete()
+        Product.objects.all().delete()
+        rollups.rebuild()
+        generator = SyntheticGenerator(seed=SEED, profile='uniform', chunk_size=10000)
+        start = time.perf_counter()
+        report = generator.generate(
+            customers=max(orders // 10, 10), products=max(orders // 100, 10), orders=orders
+        )
+        print(f"seeded {report.total} rows in {time.perf_counter() - start:.1f}s",
+              file=sys.stderr)
+    # revenueSeries and ordersCount read whole days from the rollups.
+    rollups.update()
+
+
+def resolve_variables(variables):
+    from django.utils import timezone
+    from crm.pagination import cursor_for
+    from crm_app.models import Customer
+
+    now = timezone.now()
+    values = {
+        'NOW': now.isoformat(),
+        'MONTH_AGO': (now - timedelta(days=30)).isoformat(),
+        'TODAY': timezone.localdate().isoformat(),
+        'YEAR_AGO_DAY': (timezone.localdate() - timedelta(days=365)).isoformat(),
+    }
+    if 'MIDDLE_CUSTOMER' in variables.values():
+        count = Customer.objects.count()
+        middle = Customer.objects.order_by('created_at', 'id')[count // 2]
+        values['MIDDLE_CUSTOMER'] = cursor_for(middle, ('created_at', 'id'))
+    return {key: values.get(value, value) for key, value in variables.items()}
+
+
+def measure(query, variables, repeat):
+    from django.db import connection, transaction
+    from django.test.utils import CaptureQueriesContext
+    from crm.schema import schema
+
+    def execute():
+        with transaction.atomic():
+            result = schema.execute(
+                query, variable_values=variables, context_value=SimpleNamespace()
+            )
+            transaction.set_rollback(True)
+        if result.errors:
+            raise RuntimeError(result.errors)
+
+    execute()  # warm caches
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        execute()
+        timings.append((time.perf_counter() - start) * 1000)
+    with CaptureQueriesContext(connection) as queries:
+        execute()
+    tracemalloc.start()
+    execute()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'wall_ms_median': round(statistics.median(timings), 3),
+        'wall_ms_min': round(min(timings), 3),
+        # Transaction control of the rollback wrapper is not the resolver's.
+        'queries': sum(
+            1 for q in queries.captured_queries
+            if not q['sql'].startswith(TRANSACTION_CONTROL)
+        ),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def worker(args):
+    size = args.worker
+    # Datasets are dated back from today (see crm_app.synthetic), so a file
+    # seeded on another day would shift ordersLastWeek.
+    db_path = os.path.join(
+        ROOT, 'benchmarks', f'bench_{size_label(size)}_seed{SEED}_{date.today():%Y%m%d}.sqlite3',
+    )
+    setup_django(db_path)
+    seed(size, args.reseed)
+    results = {}
+    for name, (query, variables) in OPERATIONS.items():
+        results[name] = measure(query, resolve_variables(variables), args.repeat)
+        print(f"  {size_label(size):>5} {name:<24} {results[name]['wall_ms_median']:>10.2f} ms "
+              f"{results[name]['queries']:>4} queries {results[name]['peak_kib']:>10.1f} KiB",
+              file=sys.stderr)
+    json.dump(results, sys.stdout)
+
+
+# -- orchestration -----------------------------------------------------------
+
+def run(args):
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    results = {}
+    for size in sizes:
+        command = [sys.executable, os.path.abspath(__file__), 'run',
+                   '--worker', str(size), '--repeat', str(args.repeat)]
+        if args.reseed:
+            command.append('--reseed')
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+        results[size_label(size)] = json.loads(output)
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'machine': platform.machine(),
+            'repeat': args.repeat,
+            'seed': SEED,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"wrote {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            return report_regressions(json.load(f), report, args)
+    return 0
+
+
+def regressions(baseline, current, threshold, min_delta_ms):
+    """Yield one message per metric that got worse beyond the threshold."""
+    for size, operations in current['results'].items():
+        for name, metrics in operations.items():
+            base = baseline['results'].get(size, {}).get(name)
+            if base is None:
+                continue
+            if metrics['queries'] > base['queries']:
+                yield f"{size} {name}: {base['queries']} -> {metrics['queries']} queries"
+            old, new = base['wall_ms_median'], metrics['wall_ms_median']
+            if new > old * (1 + threshold) and new - old > min_delta_ms:
+                yield f"{size} {name}: {old:.2f} -> {new:.2f} ms ({new / old - 1:+.0%})"
+            old, new = base['peak_kib'], metrics['peak_kib']
+            if new > old * (1 + threshold) and new - old > 64:
+                yield f"{size} {name}: {old:.0f} -> {new:.0f} KiB peak ({new / old - 1:+.0%})"
+
+
+def report_regressions(baseline, current, args):
+    found = list(regressions(baseline, current, args.threshold, args.min_delta_ms))
+    for message in found:
+        print(f"REGRESSION {message}")
+    if not found:
+        print(f"no regressions beyond {args.threshold:.0%}")
+    return 1 if found else 0
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    return report_regressions(baseline, current, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def thresholds(p):
+        p.add_argument('--threshold', type=float, default=0.2,
+                       help='relative slowdown or memory growth that counts as a regression')
+        p.add_argument('--min-delta-ms', type=float, default=1.0,
+                       help='ignore slowdowns smaller than this, whatever the ratio')
+
+    run_parser = commands.add_parser('run', help='seed datasets and benchmark')
+    run_parser.add_argument('--sizes', default='1k,100k,1m', help='order counts, e.g. 1k,100k,1m')
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--output', default='benchmarks/results.json')
+    run_parser.add_argument('--baseline', help='results file to compare against')
+    run_parser.add_argument('--reseed', action='store_true', help='rebuild cached datasets')
+    run_parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    thresholds(run_parser)
+
+    compare_parser = commands.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    thresholds(compare_parser)
+
+    args = parser.parse_args()
+    if args.command == 'compare':
+        return compare(args)
+    if args.worker:
+        return worker(args)
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
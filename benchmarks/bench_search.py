@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Latency of searchCustomers and searchProducts at a million customers.
+
+Seeds ``--customers`` synthetic customers and a tenth as many products into
+their own SQLite file under ``benchmarks/`` (kept between runs; ``--reseed``
+rebuilds it). The synthetic names all share a word ("Customer N",
+"Product 1-N"), so the broad queries below match every row: the worst
+case for the index. Each query is executed against the schema, parsed
+once like the view's document cache does, for a first page of 20 with the
+customers' orders loaded. The median, p95 and max wall times of
+``--repeat`` runs are printed.
+
+    python benchmarks/bench_search.py [--customers 1m] [--repeat 200] [--reseed]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_resolvers import ROOT, SEED, parse_size, setup_django, size_label  # noqa: E402
+
+CUSTOMERS = '''
+    query ($q: String!) {
+        searchCustomers(q: $q, first: 20) {
+            edges { node { id name email orderSet { id } } }
+            pageInfo { endCursor hasNextPage }
+        }
+    }'''
+PRODUCTS = '''
+    query ($q: String!) {
+        searchProducts(q: $q, first: 20) { edges { node { id name price } } }
+    }'''
+QUERIES = [
+    ('one customer by email', CUSTOMERS, 'synthetic-1-424242@example.com'),
+    ('email prefix', CUSTOMERS, 'synthetic-1-4242'),
+    ('name, exact number', CUSTOMERS, 'customer 123456'),
+    ('name prefix, typed', CUSTOMERS, 'customer 12'),
+    ('every row, one word', CUSTOMERS, 'customer'),
+    ('every row, 2 letters', CUSTOMERS, 'cu'),
+    ('no match', CUSTOMERS, 'zzyzx'),
+    ('product prefix', PRODUCTS, 'product 1-99'),
+    ('every product', PRODUCTS, 'prod'),
+]
+
+
+def seed(customers, reseed):
+    from django.core.management import call_command
+    from crm_app.models import Customer, Product
+    from crm_app.synthetic import SyntheticGenerator
+
+    call_command('migrate', verbosity=0)
+    if reseed or Customer.objects.count() != customers:
+        Customer.objects.all().delete()
+        Product.objects.all().delete()
+        start = time.perf_counter()
+        report = SyntheticGenerator(seed=SEED, chunk_size=10000).generate(
+            customers=customers, products=customers // 10,
+        )
+        call_command('rebuild_search_index', verbosity=0, stdout=open(os.devnull, 'w'))
+        print(f"seeded {report.total} rows in {time.perf_counter() - start:.1f}s",
+              file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--customers', default='1m')
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--reseed', action='store_true')
+    args = parser.parse_args()
+
+    customers = parse_size(args.customers)
+    setup_django(os.path.join(
+        ROOT, 'benchmarks', f'bench_search_{size_label(customers)}_seed{SEED}.sqlite3'
+    ))
+    seed(customers, args.reseed)
+    from graphql import execute, parse
+    from crm.schema import schema
+
+    print(f"{size_label(customers)} customers, {args.repeat} runs, first: 20")
+    print(f"{'query':<24} {'q':<32} {'hits':>5} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for label, query, q in QUERIES:
+        # Parsed and validated once, as the document cache does for /graphql.
+        document = parse(query)
+        timings = []
+        for _ in range(args.repeat + 1):
+            start = time.perf_counter()
+            result = execute(schema.graphql_schema, document, variable_values={'q': q},
+                             context_value=SimpleNamespace())
+            timings.append((time.perf_counter() - start) * 1000)
+            if result.errors:
+                raise SystemExit(result.errors)
+        timings = sorted(timings[1:])  # the first run warms the page cache
+        hits = len(next(iter(result.data.values()))['edges'])
+        print(f"{label:<24} {q:<32} {hits:>5} {statistics.median(timings):>8.2f} "
+              f"{timings[int(len(timings) * 0.95)]:>8.2f} {timings[-1]:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
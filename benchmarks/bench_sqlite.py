@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Concurrent readers and writers on SQLite: Django defaults vs the production profile.
+
+Seeds a dataset with ``bench_resolvers.seed``, then for each profile runs
+``--readers`` processes executing dashboard GraphQL operations and
+``--writers`` processes running the cron write paths (placing orders and
+restocking low-stock products, each in a ``transaction.atomic`` block) for
+``--duration`` seconds against a fresh copy of it. Readers end every
+operation the way Django ends a request (``close_old_connections``).
+
+Reports read and write throughput, latency percentiles (time spent waiting
+for locks included) and "database is locked" failures per profile.
+
+    python benchmarks/bench_sqlite.py [--orders 100k] [--readers 4] [--writers 2]
+        [--duration 10]
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_resolvers import ROOT, SEED, parse_size, seed, setup_django, size_label  # noqa: E402
+
+PROFILES = ('baseline', 'tuned')
+# Stored in the database file, so set before the workers connect.
+JOURNAL_MODES = {'baseline': 'DELETE', 'tuned': 'WAL'}
+READ_OPERATIONS = [
+    '{ totalCustomers totalOrders totalRevenue }',
+    '{ orders(first: 20) { edges { node { id orderDate totalAmount customer { email } } } } }',
+    '{ customers(first: 20) { edges { node { id name email } } } }',
+    '{ lowStockProducts { id name stock } }',
+]
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def is_lock_error(error):
+    return 'database is locked' in str(error)
+
+
+# -- workers: each runs in its own process -----------------------------------
+
+def wait_until(start):
+    time.sleep(max(0.0, start - time.time()))
+
+
+def reader(args):
+    from django.db import close_old_connections
+    from crm.schema import schema
+
+    latencies, errors = [], 0
+    wait_until(args.start)
+    deadline = args.start + args.duration
+    i = 0
+    while time.time() < deadline:
+        query = READ_OPERATIONS[i % len(READ_OPERATIONS)]
+        i += 1
+        begin = time.perf_counter()
+        result = schema.execute(query, context_value=SimpleNamespace())
+        close_old_connections()
+        if result.errors:
+            if not all(is_lock_error(error) for error in result.errors):
+                raise RuntimeError(result.errors)
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - begin)
+    return {'latencies': latencies, 'errors': errors}
+
+
+def writer(args):
+    import random
+    from decimal import Decimal
+    from django.db import OperationalError, close_old_connections, transaction
+    from django.db.models import F
+    from crm_app.inventory import restock_low_stock
+    from crm_app.models import Customer, Order, Product
+
+    rng = random.Random(args.index)
+    customer_ids = list(Customer.objects.values_list('id', flat=True)[:1000])
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    close_old_connections()
+
+    def place_order():
+        with transaction.atomic():
+            customer = Customer.objects.get(pk=rng.choice(customer_ids))
+            Order.objects.create(customer=customer, total_amount=Decimal('19.99'))
+            Product.objects.filter(pk=rng.choice(product_ids), stock__gt=0).update(
+                stock=F('stock') - 1
+            )
+
+    latencies, errors = [], 0
+    wait_until(args.start)
+    deadline = args.start + args.duration
+    i = 0
+    while time.time() < deadline:
+        i += 1
+        begin = time.perf_counter()
+        try:
+            if i % 10:
+                place_order()
+            else:
+                restock_low_stock(threshold=10, increment=1)
+        except OperationalError as e:
+            if not is_lock_error(e):
+                raise
+            errors += 1
+            continue
+        finally:
+            close_old_connections()
+        latencies.append(time.perf_counter() - begin)
+    return {'latencies': latencies, 'errors': errors}
+
+
+def worker(args):
+    os.environ['CRM_BENCH_SQLITE_PROFILE'] = args.profile
+    setup_django(args.db)
+    result = (reader if args.role == 'reader' else writer)(args)
+    json.dump(result, sys.stdout)
+
+
+# -- orchestration -----------------------------------------------------------
+
+def run_profile(profile, db_path, args):
+    start = time.time() + 2  # let every process import Django first
+    command = [sys.executable, os.path.abspath(__file__), '--profile', profile, '--db', db_path,
+               '--start', str(start), '--duration', str(args.duration)]
+    processes = [
+        (role, subprocess.Popen(command + ['--role', role, '--index', str(index)],
+                                stdout=subprocess.PIPE, text=True))
+        for role, count in (('reader', args.readers), ('writer', args.writers))
+        for index in range(count)
+    ]
+    totals = {'reader': {'latencies': [], 'errors': 0}, 'writer': {'latencies': [], 'errors': 0}}
+    for role, process in processes:
+        output, _ = process.communicate()
+        if process.returncode:
+            raise SystemExit(f'{profile} {role} failed')
+        result = json.loads(output)
+        totals[role]['latencies'].extend(result['latencies'])
+        totals[role]['errors'] += result['errors']
+    return totals
+
+
+def print_row(profile, role, result, duration):
+    ms = [latency * 1000 for latency in result['latencies']]
+    print(f"{profile:<9} {role:<7} {len(ms) / duration:>9.1f}/s "
+          f"{statistics.median(ms) if ms else 0:>8.2f} {percentile(ms, 95):>8.2f} "
+          f"{percentile(ms, 99):>8.2f} {max(ms, default=0):>9.2f} {result['errors']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--orders', default='100k')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--role', choices=('reader', 'writer'), help=argparse.SUPPRESS)
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--start', type=float, help=argparse.SUPPRESS)
+    parser.add_argument('--index', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.role:
+        return worker(args)
+
+    orders = parse_size(args.orders)
+    seeded = os.path.join(
+        ROOT, 'benchmarks',
+        f'bench_sqlite_{size_label(orders)}_seed{SEED}_{date.today():%Y%m%d}.sqlite3',
+    )
+    setup_django(seeded)
+    seed(orders, reseed=False)
+    from django.db import connection
+    connection.close()
+
+    work = os.path.join(ROOT, 'benchmarks', 'bench_sqlite_work.sqlite3')
+    print(f"{args.readers} readers, {args.writers} writers, {args.duration:.0f}s, "
+          f"{size_label(orders)} orders")
+    print(f"{'profile':<9} {'role':<7} {'ops':>11} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>9} {'locked':>7}")
+    for profile in PROFILES:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(work + suffix):
+                os.remove(work + suffix)
+        shutil.copyfile(seeded, work)
+        with sqlite3.connect(work) as db:
+            db.execute(f'PRAGMA journal_mode = {JOURNAL_MODES[profile]}')
+        totals = run_profile(profile, work, args)
+        for role in ('reader', 'writer'):
+            print_row(profile, role, totals[role], args.duration)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Throughput and memory of export_crm and import_crm.
+
+Seeds ``--orders`` synthetic orders (with a tenth as many customers and
+products) into their own SQLite file under ``benchmarks/`` (kept between
+runs; ``--reseed`` rebuilds it). For each format it exports everything
+twice: once timed, once under tracemalloc for the peak Python memory,
+which should stay flat however many rows there are. Then it imports the
+NDJSON file into a fresh database in a subprocess and reports the rate.
+
+    python benchmarks/bench_transfer.py [--orders 100k] [--chunk-size 2000] [--reseed]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_resolvers import ROOT, SEED, parse_size, setup_django, size_label  # noqa: E402
+
+
+def seed(orders, reseed):
+    from django.core.management import call_command
+    from crm_app.models import Customer, Order, Product
+    from crm_app.synthetic import SyntheticGenerator
+
+    call_command('migrate', verbosity=0)
+    if reseed or Order.objects.count() != orders:
+        Order.objects.all().delete()
+        Customer.objects.all().delete()
+        Product.objects.all().delete()
+        start = time.perf_counter()
+        report = SyntheticGenerator(seed=SEED, chunk_size=10000).generate(
+            customers=max(orders // 10, 1), products=max(orders // 10, 1), orders=orders,
+        )
+        print(f"seeded {report.total} rows in {time.perf_counter() - start:.1f}s",
+              file=sys.stderr)
+
+
+def export(path, fmt, chunk_size):
+    from crm_app import transfer
+
+    with open(path, 'w', newline='', encoding='utf-8') as out:
+        return sum(transfer.export(out, fmt=fmt, chunk_size=chunk_size).values())
+
+
+def import_into(db_path, path, chunk_size):
+    """Run in a subprocess: import ``path`` into a new database."""
+    setup_django(db_path)
+    from django.core.management import call_command
+    from crm_app import transfer
+
+    call_command('migrate', verbosity=0)
+    start = time.perf_counter()
+    with open(path, encoding='utf-8') as stream:
+        result = transfer.import_records(stream, 'ndjson', chunk_size=chunk_size)
+    seconds = time.perf_counter() - start
+    print(f"{'import ndjson':<14} {result.records:>9} {seconds:>8.1f} "
+          f"{result.records / seconds:>9.0f} {'':>9}  {result.errors} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--orders', default='100k')
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    parser.add_argument('--reseed', action='store_true')
+    parser.add_argument('--import-into', nargs=2, metavar=('DB', 'FILE'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.import_into:
+        import_into(*args.import_into, args.chunk_size)
+        return
+
+    orders = parse_size(args.orders)
+    setup_django(os.path.join(
+        ROOT, 'benchmarks', f'bench_transfer_{size_label(orders)}_seed{SEED}.sqlite3'
+    ))
+    seed(orders, args.reseed)
+
+    workdir = tempfile.mkdtemp()
+    print(f"{size_label(orders)} orders, chunk size {args.chunk_size}")
+    print(f"{'operation':<14} {'rows':>9} {'seconds':>8} {'rows/s':>9} {'peak KiB':>9}")
+    for fmt in ('ndjson', 'csv'):
+        path = os.path.join(workdir, f'export.{fmt}')
+        start = time.perf_counter()
+        rows = export(path, fmt, args.chunk_size)
+        seconds = time.perf_counter() - start
+        tracemalloc.start()
+        export(os.devnull, fmt, args.chunk_size)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{'export ' + fmt:<14} {rows:>9} {seconds:>8.1f} {rows / seconds:>9.0f} "
+              f"{peak / 1024:>9.0f}")
+
+    target = os.path.join(workdir, 'import.sqlite3')
+    subprocess.run([
+        sys.executable, os.path.abspath(__file__), '--chunk-size', str(args.chunk_size),
+        '--import-into', target, os.path.join(workdir, 'export.ndjson'),
+    ], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""
+Settings for the benchmark scripts.
+
+Same as ``crm.settings`` but on a separate SQLite file, named by
+``CRM_BENCH_DB``, so seeded benchmark datasets never touch ``db.sqlite3``.
+The benchmarks run with the production SQLite profile whatever
+``CRM_SQLITE_PROFILE`` says; ``CRM_BENCH_SQLITE_PROFILE=baseline`` swaps it
+for Django's defaults (no pragmas, a connection per request, deferred
+transactions). The journal mode is stored in the database file, so switch
+it back to ``DELETE`` before running against a file the tuned profile used.
+"""
+import os
+
+from crm.settings import *  # noqa: F401,F403
+from crm.settings import (
+    BASE_DIR, CRM_SQLITE_PRODUCTION_DATABASE, CRM_SQLITE_PRODUCTION_PRAGMAS,
+    DATABASES as CRM_DATABASES,
+)
+
+DATABASES = {
+    'default': {
+        **CRM_DATABASES['default'],
+        'NAME': os.environ.get('CRM_BENCH_DB', BASE_DIR / 'benchmarks' / 'bench.sqlite3'),
+    }
+}
+
+if os.environ.get('CRM_BENCH_SQLITE_PROFILE') == 'baseline':
+    DATABASES['default'].update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False, OPTIONS={})
+    CRM_SQLITE_PRAGMAS = {}
+else:
+    DATABASES['default'].update(CRM_SQLITE_PRODUCTION_DATABASE)
+    CRM_SQLITE_PRAGMAS = CRM_SQLITE_PRODUCTION_PRAGMAS
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
@@ -0,0 +1,144 @@
+"""
+Static cost and depth analysis of GraphQL operations.
+
+Runs on the validated document before execution. Every object a field
+materializes costs 1, scalars are free unless listed in ``FIELD_COSTS``,
+and list fields multiply the cost of their selection by the number of
+items they can return: the ``first``/``last`` argument of a connection, or
+``CRM_QUERY_COST_LIST_SIZE`` for lists without a page size. Variables are
+coerced as execution will see them, defaults included. Operations
+deeper than ``CRM_QUERY_MAX_DEPTH`` or costlier than ``CRM_QUERY_MAX_COST``
+are rejected with a ``QUERY_TOO_COMPLEX`` error.
+"""
+from django.conf import settings
+from graphql import (
+    GraphQLError, GraphQLList, IntValueNode, VariableNode, get_named_type,
+    get_nullable_type, get_operation_ast, get_variable_values, is_composite_type,
+)
+
+from crm.pagination import get_default_page_size
+from crm.selections import flatten_fields, fragments_of
+
+# Fields whose resolver does more work than reading an attribute.
+FIELD_COSTS = {
+    'Query.totalCustomers': 1,
+    'Query.totalOrders': 1,
+    'Query.totalRevenue': 1,
+    'Query.averageOrderValue': 1,
+    'Query.revenueBetween': 1,
+    'Query.ordersCount': 1,
+    'Query.searchCustomers': 1,
+    'Query.searchProducts': 1,
+}
+
+
+class QueryCost:
+    def __init__(self, cost, depth):
+        self.cost = cost
+        self.depth = depth
+        self.max_cost = getattr(settings, 'CRM_QUERY_MAX_COST', None)
+        self.max_depth = getattr(settings, 'CRM_QUERY_MAX_DEPTH', None)
+
+    @property
+    def error(self):
+        if self.max_depth is not None and self.depth > self.max_depth:
+            message = (
+                f"Query depth {self.depth} exceeds the maximum depth of "
+                f"{self.max_depth}."
+            )
+        elif self.max_cost is not None and self.cost > self.max_cost:
+            message = (
+                f"Query cost {self.cost} exceeds the maximum cost of "
+                f"{self.max_cost}."
+            )
+        else:
+            return None
+        return GraphQLError(
+            message, extensions={'code': 'QUERY_TOO_COMPLEX', **self.as_dict()}
+        )
+
+    def as_dict(self):
+        return {
+            'cost': self.cost,
+            'maxCost': self.max_cost,
+            'depth': self.depth,
+            'maxDepth': self.max_depth,
+        }
+
+
+class CostAnalyzer:
+    def __init__(self, schema, document, variables=None):
+        self.schema = schema
+        self.variables = variables or {}
+        self.fragments = fragments_of(document)
+
+    def page_size(self, node):
+        """Value of a ``first``/``last`` argument, or None if absent."""
+        for argument in node.arguments or ():
+            if argument.name.value not in ('first', 'last'):
+                continue
+            value = argument.value
+            if isinstance(value, VariableNode):
+                value = self.variables.get(value.name.value)
+            elif isinstance(value, IntValueNode):
+                value = int(value.value)
+            else:
+                value = None
+            if isinstance(value, int) and value >= 0:
+                return value
+            return get_default_page_size()
+        return None
+
+    def fields(self, parent_type, selection_set):
+        """Yield ``(parent_type, field_node)`` with fragments flattened."""
+        return flatten_fields(self.schema, self.fragments, parent_type, selection_set)
+
+    def selection_cost(self, parent_type, selection_set, depth, list_size=None):
+        """Return ``(cost, depth)`` of a selection set at ``depth``."""
+        total, max_depth = 0, depth
+        for field_parent, node in self.fields(parent_type, selection_set):
+            name = node.name.value
+            if name.startswith('__'):
+                continue
+            field_def = getattr(field_parent, 'fields', {}).get(name)
+            if field_def is None:
+                continue
+
+            key = f'{field_parent.name}.{name}'
+            field_type = get_nullable_type(field_def.type)
+            named_type = get_named_type(field_type)
+            if not is_composite_type(named_type) or node.selection_set is None:
+                total += FIELD_COSTS.get(key, 0)
+                continue
+
+            page_size = self.page_size(node)
+            child_cost, child_depth = self.selection_cost(
+                named_type, node.selection_set, depth + 1, list_size=page_size
+            )
+            max_depth = max(max_depth, child_depth)
+            if isinstance(field_type, GraphQLList):
+                size = list_size if list_size is not None else page_size
+                if size is None:
+                    size = getattr(settings, 'CRM_QUERY_COST_LIST_SIZE', 50)
+                total += FIELD_COSTS.get(key, 1) + size * (1 + child_cost)
+            else:
+                total += FIELD_COSTS.get(key, 1) + child_cost
+        return total, max_depth
+
+    def analyze(self, operation):
+        root_type = self.schema.get_root_type(operation.operation)
+        cost, depth = self.selection_cost(root_type, operation.selection_set, 1)
+        return QueryCost(cost, depth)
+
+
+def analyze_query(schema, document, operation_name=None, variables=None):
+    """Cost of the operation ``operation_name`` selects from ``document``."""
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return QueryCost(0, 0)
+    if operation.variable_definitions:
+        coerced = get_variable_values(schema, operation.variable_definitions, variables or {})
+        # Invalid variables fail execution anyway; cost them as sent.
+        if not isinstance(coerced, list):
+            variables = coerced
+    return CostAnalyzer(schema, document, variables).analyze(operation)
@@ -1,28 +1,22 @@
-import os
-import tempfile
-from datetime import datetime
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+import logging
+import time
+from django.conf import settings
+
+from crm import joblog
+from crm.executor import execute
+
 def log_crm_heartbeat():
     """Log CRM heartbeat and optionally verify GraphQL endpoint"""
-    timestamp = datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
-    
-    # Log basic heartbeat to the exact required path
-    with open('/tmp/crm_heartbeat_log.txt', 'a') as f:
-        f.write(f"{timestamp} CRM is alive\n")
+    # Log basic heartbeat to the job log (/tmp/crm_heartbeat_log.txt by default)
+    joblog.get_logger('heartbeat').event("CRM is alive")
     
-    # Optionally query the GraphQL hello field to verify endpoint is responsive
+    # Optionally query the GraphQL hello field to verify the schema is responsive
     try:
-        transport = RequestsHTTPTransport(url="http://localhost:8000/graphql")
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-        
-        query = gql("""
+        result = execute("""
             query {
                 hello
             }
         """)
-        
-        result = client.execute(query)
         print(f"GraphQL hello response: {result}")
         
     except Exception as e:
@@ -30,13 +24,12 @@ def log_crm_heartbeat():
 
 def update_low_stock():
     """Update low stock products using GraphQL mutation"""
+    log = joblog.get_logger('low_stock')
+    start = time.perf_counter()
     try:
-        transport = RequestsHTTPTransport(url="http://localhost:8000/graphql")
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-        
-        mutation = gql("""
-            mutation {
-                updateLowStockProducts {
+        mutation = """
+            mutation ($threshold: Int, $increment: Int) {
+                updateLowStockProducts(threshold: $threshold, increment: $increment) {
                     success
                     message
                     updatedProducts {
@@ -46,24 +39,23 @@ def update_low_stock():
                     }
                 }
             }
-        """)
-        
-        result = client.execute(mutation)
-        
-        # Log the updates
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_dir = tempfile.gettempdir()
-        # log_file = os.path.join(log_dir, 'low_stock_updates_log.txt')
+        """
         
-        log_file = '/tmp/low_stock_updates_log.txt'
+        result = execute(mutation, {
+            'threshold': settings.CRM_LOW_STOCK_THRESHOLD,
+            'increment': settings.CRM_LOW_STOCK_INCREMENT,
+        })
         
-        with open(log_file, 'a') as f:
-            f.write(f"{timestamp} - Low stock update executed\n")
-            if result.get('updateLowStockProducts', {}).get('updatedProducts'):
-                for product in result['updateLowStockProducts']['updatedProducts']:
-                    f.write(f"  Updated {product['name']} - New stock: {product['stock']}\n")
+        # Log the updates, one record for the whole run
+        products = (result.get('updateLowStockProducts') or {}).get('updatedProducts') or []
+        lines = ["Low stock update executed"]
+        for product in products:
+            lines.append(f"  Updated {product['name']} - New stock: {product['stock']}")
+        log.event("\n".join(lines), rows=len(products), duration_ms=joblog.elapsed_ms(start))
         
         print("Low stock products updated successfully")
         
     except Exception as e:
+        log.event(f"Low stock update failed: {e}", level=logging.ERROR,
+                  duration_ms=joblog.elapsed_ms(start))
         print(f"Failed to update low stock products: {e}")
\ No newline at end of file
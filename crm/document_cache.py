@@ -0,0 +1,71 @@
+"""
+Bounded LRU cache of parsed and validated GraphQL documents.
+
+Clients of ``/graphql`` send a small, fixed set of operations, so parsing
+and validating the same text on every request is wasted work. Documents
+are keyed by the sha256 of their query text, which is also the key used by
+Automatic Persisted Queries: a client that sends only
+``extensions.persistedQuery.sha256Hash`` is served straight from here.
+Only documents that parsed and validated cleanly are stored.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+class DocumentCache:
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_maxsize(self):
+        if self.maxsize is not None:
+            return self.maxsize
+        return getattr(settings, 'CRM_DOCUMENT_CACHE_SIZE', 256)
+
+    def get(self, key):
+        with self._lock:
+            document = self._documents.get(key)
+            if document is None:
+                self.misses += 1
+                return None
+            self._documents.move_to_end(key)
+            self.hits += 1
+            return document
+
+    def put(self, key, document):
+        maxsize = self.get_maxsize()
+        if maxsize <= 0:
+            return
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > maxsize:
+                self._documents.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._documents),
+                'maxsize': self.get_maxsize(),
+            }
+
+
+document_cache = DocumentCache()
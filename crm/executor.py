@@ -0,0 +1,104 @@
+"""
+Run GraphQL operations for cron jobs, Celery tasks and scripts.
+
+By default operations execute in-process against ``crm.schema.schema``, so
+jobs neither need the web server to be up nor compete with user traffic
+for its workers. Documents are parsed and validated once and kept in the
+shared document cache. Set ``CRM_JOBS_GRAPHQL_URL`` to run jobs against a
+remote ``/graphql`` instead; requests then reuse one keep-alive session per
+process. Either way ``execute`` returns the ``data`` dict of the result and
+raises ``GraphQLExecutionError`` if the operation reported errors. Local
+queries of lag-tolerant fields read the replica, like on ``/graphql``.
+"""
+import threading
+from types import SimpleNamespace
+
+import requests
+from django.conf import settings
+from graphql import execute as execute_document, get_operation_ast, parse, validate
+
+from crm import routers
+from crm.document_cache import document_cache, query_hash
+
+
+class GraphQLExecutionError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        messages = [
+            error['message'] if isinstance(error, dict) else str(error)
+            for error in errors
+        ]
+        super().__init__('; '.join(messages))
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """The process-wide HTTP session used in remote mode."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers['Content-Type'] = 'application/json'
+        return _session
+
+
+def get_document(schema, query):
+    key = query_hash(query)
+    document = document_cache.get(key)
+    if document is not None:
+        return document
+    document = parse(query)
+    errors = validate(schema.graphql_schema, document)
+    if errors:
+        raise GraphQLExecutionError(errors)
+    document_cache.put(key, document)
+    return document
+
+
+def execute_local(query, variables=None, operation_name=None):
+    from crm.schema import schema
+
+    document = get_document(schema, query)
+    operation_ast = get_operation_ast(document, operation_name)
+    with routers.use_database(
+        routers.database_for(schema.graphql_schema, document, operation_ast)
+    ):
+        result = execute_document(
+            schema.graphql_schema,
+            document,
+            variable_values=variables,
+            operation_name=operation_name,
+            # Resolvers keep their per-operation loaders on the context.
+            context_value=SimpleNamespace(),
+        )
+    if result.errors:
+        raise GraphQLExecutionError(result.errors)
+    return result.data
+
+
+def execute_remote(url, query, variables=None, operation_name=None):
+    payload = {'query': query}
+    if variables:
+        payload['variables'] = variables
+    if operation_name:
+        payload['operationName'] = operation_name
+    response = get_session().post(
+        url, json=payload,
+        timeout=getattr(settings, 'CRM_JOBS_GRAPHQL_TIMEOUT', 30),
+    )
+    response.raise_for_status()
+    body = response.json()
+    if body.get('errors'):
+        raise GraphQLExecutionError(body['errors'])
+    return body.get('data')
+
+
+def execute(query, variables=None, operation_name=None):
+    """Run ``query`` and return its ``data``, in-process unless configured."""
+    url = getattr(settings, 'CRM_JOBS_GRAPHQL_URL', None)
+    if url:
+        return execute_remote(url, query, variables, operation_name)
+    return execute_local(query, variables, operation_name)
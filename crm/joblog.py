@@ -0,0 +1,274 @@
+"""
+Buffered, rotating log files for the cron and Celery jobs.
+
+Jobs log through ``get_logger(job)``. Records go onto one in-memory queue
+(a ``QueueHandler``), so logging a line never waits on the disk. A single
+background thread drains the queue. It collects up to
+``CRM_JOB_LOG_BATCH_SIZE`` records, or what arrives within
+``CRM_JOB_LOG_FLUSH_INTERVAL`` seconds, and writes them with one flush per
+file.
+
+Each job writes to ``CRM_JOB_LOG_DIR`` under the file name it has always
+used (``JOBS``). A file rotates to ``<name>.1`` .. ``<name>.N``
+(``CRM_JOB_LOG_BACKUP_COUNT``) when it would grow past
+``CRM_JOB_LOG_MAX_BYTES``, or when it was last written in an earlier
+``CRM_JOB_LOG_ROTATE_SECONDS`` interval. Intervals count from the epoch,
+so ``86400`` rotates at midnight UTC.
+
+``CRM_JOB_LOG_FORMAT`` picks the line format:
+
+* ``text``: the human-readable lines the jobs have always written.
+* ``json``: one object per record, holding the time, job, level and
+  message plus the fields passed to ``JobLog.event``. Those fields include
+  row counts and ``duration_ms``.
+
+``flush()`` blocks until everything logged so far is on disk. Jobs that
+checkpoint their progress call it first. Whatever is still queued is
+written at interpreter exit.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+from django.conf import settings
+
+TEXT_FORMAT = '%(asctime)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# job -> (file name, text line format, text date format)
+JOBS = {
+    'heartbeat': ('crm_heartbeat_log.txt', '%(asctime)s %(message)s', '%d/%m/%Y-%H:%M:%S'),
+    'low_stock': ('low_stock_updates_log.txt', TEXT_FORMAT, DATE_FORMAT),
+    'reminders': ('order_reminders_log.txt', TEXT_FORMAT, DATE_FORMAT),
+    'cleanup': ('customer_cleanup_log.txt', TEXT_FORMAT, DATE_FORMAT),
+    'report': ('crm_report_log.txt', TEXT_FORMAT, DATE_FORMAT),
+}
+FORMATS = ('text', 'json')
+
+
+def get_log_dir():
+    return getattr(settings, 'CRM_JOB_LOG_DIR', '/tmp')
+
+
+def get_format():
+    return getattr(settings, 'CRM_JOB_LOG_FORMAT', 'text')
+
+
+def get_path(job):
+    return os.path.join(get_log_dir(), JOBS[job][0])
+
+
+def elapsed_ms(start):
+    """Milliseconds since ``start``, a ``time.perf_counter()`` value."""
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).astimezone().isoformat(
+                timespec='milliseconds'
+            ),
+            'job': record.job,
+            'level': record.levelname,
+            'message': record.getMessage(),
+            **record.fields,
+        }
+        return json.dumps(entry, default=str)
+
+
+def make_formatter(job, fmt=None):
+    fmt = fmt or get_format()
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown job log format {fmt!r}.')
+    if fmt == 'json':
+        return JsonFormatter()
+    _, line_format, date_format = JOBS[job]
+    return logging.Formatter(line_format, date_format)
+
+
+class JobFileHandler(RotatingFileHandler):
+    """A job's log file, written a batch of records at a time."""
+
+    def __init__(self, path, formatter, max_bytes=None, backup_count=None, rotate_seconds=None):
+        super().__init__(
+            path, encoding='utf-8', delay=True,
+            maxBytes=getattr(settings, 'CRM_JOB_LOG_MAX_BYTES', 10 * 1024 * 1024)
+            if max_bytes is None else max_bytes,
+            backupCount=getattr(settings, 'CRM_JOB_LOG_BACKUP_COUNT', 8)
+            if backup_count is None else backup_count,
+        )
+        self.setFormatter(formatter)
+        self.rotate_seconds = (
+            getattr(settings, 'CRM_JOB_LOG_ROTATE_SECONDS', 7 * 86400)
+            if rotate_seconds is None else rotate_seconds
+        )
+
+    def is_stale(self, now):
+        """True if the file was last written in an earlier rotation interval."""
+        if not self.rotate_seconds or not os.path.exists(self.baseFilename):
+            return False
+        written = os.path.getmtime(self.baseFilename)
+        return written // self.rotate_seconds < now // self.rotate_seconds
+
+    def write_batch(self, records):
+        self.acquire()
+        try:
+            if self.is_stale(records[0].created):
+                self.doRollover()
+            for record in records:
+                line = self.format(record) + self.terminator
+                if self.stream is None:
+                    self.stream = self._open()
+                position = self.stream.tell()
+                if self.maxBytes and position and position + len(line) > self.maxBytes:
+                    self.doRollover()
+                    self.stream = self._open()
+                self.stream.write(line)
+            self.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
+
+    def emit(self, record):
+        self.write_batch([record])
+
+
+class Writer(threading.Thread):
+    """The background thread writing queued records to their files."""
+
+    def __init__(self, records):
+        super().__init__(name='crm-job-log', daemon=True)
+        self.records = records
+        self.batch_size = getattr(settings, 'CRM_JOB_LOG_BATCH_SIZE', 500)
+        self.interval = getattr(settings, 'CRM_JOB_LOG_FLUSH_INTERVAL', 0.5)
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            batch, flushed = [], []
+            item = self.records.get()
+            deadline = time.monotonic() + self.interval
+            while True:
+                if item is None:
+                    stopping = True
+                    break
+                if isinstance(item, threading.Event):
+                    flushed.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.records.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            self.write(batch)
+            for event in flushed:
+                event.set()
+
+    def write(self, batch):
+        by_path = {}
+        for record in batch:
+            by_path.setdefault(record.job_path, []).append(record)
+        for path, records in by_path.items():
+            handler = _handlers.get(path)
+            if handler is None:
+                # Logged through a JobLog created before the last shutdown().
+                handler = _handlers.setdefault(
+                    path, JobFileHandler(path, make_formatter(records[0].job))
+                )
+            handler.write_batch(records)
+
+
+class JobQueueHandler(QueueHandler):
+    def __init__(self):
+        super().__init__(None)
+
+    def enqueue(self, record):
+        _records.put_nowait(record)
+
+
+class JobLog(logging.LoggerAdapter):
+    """Logger for one job's file; ``event`` attaches structured fields."""
+
+    def process(self, msg, kwargs):
+        kwargs['extra'] = {'fields': {}, **self.extra, **kwargs.get('extra', {})}
+        return msg, kwargs
+
+    def event(self, message, level=logging.INFO, **fields):
+        self.log(level, message, extra={'fields': fields})
+
+
+_records = queue.Queue()
+_lock = threading.Lock()
+_handlers = {}
+_writer = None
+_queue_handler = JobQueueHandler()
+
+
+def _start():
+    global _writer
+    if _writer is None or not _writer.is_alive():
+        _writer = Writer(_records)
+        _writer.start()
+
+
+def get_logger(job, path=None, fmt=None):
+    """A ``JobLog`` writing ``job``'s lines to ``path`` (its usual file by default)."""
+    path = path or get_path(job)
+    logger = logging.getLogger(f'crm.jobs.{job}')
+    with _lock:
+        if _queue_handler not in logger.handlers:
+            logger.addHandler(_queue_handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        if path not in _handlers:
+            _handlers[path] = JobFileHandler(path, make_formatter(job, fmt))
+        _start()
+    return JobLog(logger, {'job': job, 'job_path': path})
+
+
+def flush(timeout=None):
+    """Wait until every record logged so far has been written."""
+    if _writer is None or not _writer.is_alive():
+        return
+    written = threading.Event()
+    _records.put(written)
+    written.wait(timeout)
+
+
+def shutdown():
+    """Write what is queued, stop the writer and close the files."""
+    global _writer
+    with _lock:
+        if _writer is not None and _writer.is_alive():
+            _records.put(None)
+            _writer.join()
+        _writer = None
+        for handler in _handlers.values():
+            handler.close()
+        _handlers.clear()
+
+
+def _reset_after_fork():
+    # The writer thread does not survive a fork (Celery and gunicorn
+    # workers); the child starts its own on first use.
+    global _records, _lock, _writer
+    _records = queue.Queue()
+    _lock = threading.Lock()
+    _writer = None
+    for handler in _handlers.values():
+        handler.createLock()
+        handler.stream = None
+
+
+atexit.register(shutdown)
+os.register_at_fork(after_in_child=_reset_after_fork)
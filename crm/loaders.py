@@ -0,0 +1,186 @@
+"""
+Per-request batching loaders for GraphQL relation fields.
+
+Graphene resolves ``OrderType.customer`` and ``CustomerType.order_set`` once
+per parent object, which turns a list of N orders into N extra queries.
+List resolvers prime the loaders with the keys their children are going to
+ask for, and the first child that actually asks fetches every pending key
+with a single ``IN (...)`` query. Nothing is fetched for relations the
+operation never selects, or that the list resolver already joined or
+prefetched (``crm.projection``).
+"""
+import asyncio
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from graphene.utils.dataloader import DataLoader
+
+from crm_app import stats
+from crm_app.models import Customer, Order
+from crm.projection import prefetched_attr
+
+
+def complete(instances):
+    """``{id: instance}`` of the instances with no deferred columns.
+
+    Only those may be shared through a loader cache: a projected instance
+    (``crm.projection``) would load a missing column with one query each
+    when another field reads it.
+    """
+    return {
+        instance.id: instance for instance in instances if not instance.get_deferred_fields()
+    }
+
+
+def prefetched_orders(customer):
+    """The customer's orders if the list resolver prefetched them, else None."""
+    return getattr(customer, prefetched_attr('order_set'), None)
+
+
+class BatchLoader:
+    """Cache of key -> value filled in batches by ``batch_load_fn``.
+
+    ``batch_load_fn`` receives a list of keys and returns a dict of the
+    values it found; keys it did not return resolve to ``default()``.
+    """
+
+    def __init__(self, batch_load_fn, default=lambda: None):
+        self.batch_load_fn = batch_load_fn
+        self.default = default
+        self._cache = {}
+        self._pending = {}
+
+    def prime(self, keys):
+        """Queue keys so the next dispatch fetches them together."""
+        for key in keys:
+            if key not in self._cache:
+                self._pending[key] = None
+
+    def prime_values(self, values):
+        """Store already-known values without querying for them."""
+        for key, value in values.items():
+            self._cache[key] = value
+            self._pending.pop(key, None)
+
+    def load(self, key):
+        if key not in self._cache:
+            self._pending[key] = None
+            self.dispatch()
+        return self._cache[key]
+
+    def dispatch(self):
+        keys = list(self._pending)
+        self._pending.clear()
+        if not keys:
+            return
+        found = self.batch_load_fn(keys)
+        for key in keys:
+            self._cache[key] = found[key] if key in found else self.default()
+
+
+class Loaders:
+    """The set of loaders shared by every resolver of one GraphQL request."""
+
+    def __init__(self):
+        self.customer = BatchLoader(self._load_customers)
+        self.orders_by_customer = BatchLoader(
+            self._load_orders_by_customer, default=list
+        )
+        self._totals = None
+
+    def totals(self):
+        """Dashboard totals, fetched once for all the fields that need them."""
+        if self._totals is None:
+            self._totals = stats.get_totals()
+        return self._totals
+
+    def prime_orders(self, orders):
+        """Queue the customers of ``orders`` and return the orders unchanged."""
+        self.customer.prime(
+            order.customer_id for order in orders
+            # A deferred customer_id means the customer was not selected.
+            if 'customer_id' not in order.get_deferred_fields()
+            and not Order.customer.is_cached(order)
+        )
+        return orders
+
+    def prime_customers(self, customers):
+        """Queue the orders of ``customers`` and return the customers unchanged."""
+        self.customer.prime_values(complete(customers))
+        self.orders_by_customer.prime(
+            customer.id for customer in customers if prefetched_orders(customer) is None
+        )
+        return customers
+
+    def _load_customers(self, ids):
+        customers = Customer.objects.filter(id__in=ids)
+        found = {customer.id: customer for customer in customers}
+        # Customers loaded one level down may ask for their orders next.
+        self.orders_by_customer.prime(found)
+        return found
+
+    def _load_orders_by_customer(self, customer_ids):
+        grouped = defaultdict(list)
+        for order in Order.objects.filter(customer_id__in=customer_ids).order_by('id'):
+            grouped[order.customer_id].append(order)
+        self.customer.prime(grouped)
+        return grouped
+
+
+class AsyncLoaders:
+    """``Loaders`` for the async schema, built on graphene's ``DataLoader``.
+
+    The event loop batches every ``load`` made while resolving one level,
+    so no priming is needed; the ``prime_*`` methods only seed the cache.
+    """
+
+    def __init__(self):
+        self.customer = DataLoader(self._load_customers)
+        self.orders_by_customer = DataLoader(self._load_orders_by_customer)
+        self._totals = None
+
+    def totals(self):
+        """A shared future, so all total fields wait on one query."""
+        if self._totals is None:
+            self._totals = asyncio.ensure_future(sync_to_async(stats.get_totals)())
+        return self._totals
+
+    def prime_orders(self, orders):
+        return orders
+
+    def prime_customers(self, customers):
+        for id, customer in complete(customers).items():
+            self.customer.prime(id, customer)
+        return customers
+
+    async def _load_customers(self, ids):
+        found = {
+            customer.id: customer
+            async for customer in Customer.objects.filter(id__in=ids)
+        }
+        return [found.get(id) for id in ids]
+
+    async def _load_orders_by_customer(self, customer_ids):
+        grouped = defaultdict(list)
+        orders = Order.objects.filter(customer_id__in=customer_ids).order_by('id')
+        async for order in orders:
+            grouped[order.customer_id].append(order)
+        return [grouped[customer_id] for customer_id in customer_ids]
+
+
+def get_loaders(info):
+    """Return the loaders attached to the request context, creating them once.
+
+    Executions without a context object (``schema.execute`` with no
+    ``context_value``) still work, they just do not share a cache.
+    """
+    context = info.context
+    if context is None:
+        return Loaders()
+    if isinstance(context, dict):
+        return context.setdefault('loaders', Loaders())
+    loaders = getattr(context, 'loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        context.loaders = loaders
+    return loaders
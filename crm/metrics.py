@@ -0,0 +1,343 @@
+"""
+In-process GraphQL metrics served in the Prometheus text format.
+
+Enabled with ``CRM_METRICS_ENABLED``. ``CRMGraphQLView`` then records for
+every operation its latency, error count, response size, and the number
+and total duration of its SQL queries on every configured database (via
+``execute_wrapper``, so reads routed to the replica count too).
+``MetricsMiddleware`` adds per-field latency histograms. To keep its
+overhead low it only times root fields and fields with their own resolver
+(the ones backed by loaders or queries), not attribute reads or Relay
+edges; turn it off with ``CRM_METRICS_FIELDS = False``. ``/metrics`` renders everything plus
+the document cache counters.
+
+Metrics are aggregated per process: with several workers, scrape each one
+or run the metrics endpoint on a single-process deployment. SQL metrics
+cover the sync view only, since the async ORM runs queries on other
+threads.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from inspect import isawaitable
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from graphene.types.resolver import attr_resolver, dict_or_attr_resolver, dict_resolver
+from graphene_django import DjangoObjectType
+
+from crm.document_cache import document_cache
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FIELD_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+OTHER = 'other'
+# Resolvers that only read an attribute or key of the parent.
+TRIVIAL_RESOLVERS = {
+    attr_resolver, dict_resolver, dict_or_attr_resolver, DjangoObjectType.resolve_id,
+}
+
+
+def enabled():
+    return getattr(settings, 'CRM_METRICS_ENABLED', False)
+
+
+def fields_enabled():
+    return enabled() and getattr(settings, 'CRM_METRICS_FIELDS', True)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(labels)
+            if data is None:
+                # Per-bucket (not cumulative) counts, then sum and count.
+                data = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {labels: list(data) for labels, data in self._values.items()}
+        for labels, data in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float('inf')), data):
+                cumulative += count
+                le = (('le', _format_value(float(bound))),)
+                yield (f'{self.name}_bucket',
+                       _format_labels(self.labelnames, labels, le), cumulative)
+            yield f'{self.name}_sum', _format_labels(self.labelnames, labels), data[-2]
+            yield f'{self.name}_count', _format_labels(self.labelnames, labels), data[-1]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        """Register ``func() -> [(name, kind, documentation, value)]``, read per scrape."""
+        self.collectors.append(func)
+        return func
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        for collector in self.collectors:
+            for name, kind, documentation, value in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                lines.append(f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+operations = registry.counter(
+    'crm_graphql_operations_total', 'GraphQL operations executed.', ('operation', 'status'))
+operation_duration = registry.histogram(
+    'crm_graphql_operation_duration_seconds', 'Time to answer a GraphQL operation.',
+    ('operation',))
+operation_errors = registry.counter(
+    'crm_graphql_errors_total', 'Errors returned by GraphQL operations.', ('operation',))
+response_size = registry.histogram(
+    'crm_graphql_response_bytes', 'Size of GraphQL response bodies.', ('operation',),
+    buckets=SIZE_BUCKETS)
+sql_queries = registry.histogram(
+    'crm_graphql_sql_queries', 'SQL queries issued per GraphQL operation.', ('operation',),
+    buckets=COUNT_BUCKETS)
+sql_duration = registry.histogram(
+    'crm_graphql_sql_duration_seconds', 'Time spent in SQL per GraphQL operation.',
+    ('operation',))
+field_duration = registry.histogram(
+    'crm_graphql_field_duration_seconds', 'Time to resolve a GraphQL field.', ('field',),
+    buckets=FIELD_BUCKETS)
+field_errors = registry.counter(
+    'crm_graphql_field_errors_total', 'Errors raised while resolving a GraphQL field.',
+    ('field',))
+
+
+@registry.collector
+def document_cache_metrics():
+    info = document_cache.info()
+    return [
+        ('crm_graphql_document_cache_hits_total', 'counter',
+         'Parsed GraphQL document cache hits.', info['hits']),
+        ('crm_graphql_document_cache_misses_total', 'counter',
+         'Parsed GraphQL document cache misses.', info['misses']),
+        ('crm_graphql_document_cache_size', 'gauge',
+         'Parsed GraphQL documents cached.', info['size']),
+    ]
+
+
+@contextmanager
+def wrap_connections(wrapper):
+    """Install ``wrapper`` as an execute wrapper on every configured database."""
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(wrapper))
+        yield
+
+
+_operation_names = set()
+_operation_names_lock = threading.Lock()
+
+
+def operation_label(operation_name):
+    """Bound label cardinality: names past ``CRM_METRICS_MAX_OPERATIONS`` share one."""
+    name = operation_name or 'anonymous'
+    if name in _operation_names:
+        return name
+    with _operation_names_lock:
+        if len(_operation_names) >= getattr(settings, 'CRM_METRICS_MAX_OPERATIONS', 100):
+            return OTHER
+        _operation_names.add(name)
+    return name
+
+
+class OperationTracker:
+    """Times one operation and counts its SQL while used as a context manager."""
+
+    def __init__(self, operation_name, track_sql=True):
+        self.label = (operation_label(operation_name),)
+        self.track_sql = track_sql
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        if self.track_sql:
+            self._wrapper = wrap_connections(self)
+            self._wrapper.__enter__()
+        return self
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_seconds += time.perf_counter() - start
+
+    def finish(self, execution_result, body):
+        errors = len(execution_result.errors or ()) if execution_result else 0
+        operations.inc((self.label[0], 'error' if errors else 'ok'))
+        if errors:
+            operation_errors.inc(self.label, errors)
+        if body is not None:
+            response_size.observe(len(body), self.label)
+
+    def __exit__(self, *exc_info):
+        if self.track_sql:
+            self._wrapper.__exit__(*exc_info)
+            sql_queries.observe(self.queries, self.label)
+            sql_duration.observe(self.sql_seconds, self.label)
+        operation_duration.observe(time.perf_counter() - self.start, self.label)
+        return False
+
+
+class NullTracker:
+    def __enter__(self):
+        return self
+
+    def finish(self, execution_result, body):
+        pass
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_TRACKER = NullTracker()
+
+
+def track_operation(operation_name, track_sql=True):
+    if not enabled():
+        return NULL_TRACKER
+    return OperationTracker(operation_name, track_sql)
+
+
+class MetricsMiddleware:
+    """Graphene middleware recording per-field latency and errors."""
+
+    def __init__(self):
+        self._labels = {}
+
+    def label(self, info):
+        key = (info.parent_type.name, info.field_name)
+        label = self._labels.get(key, False)
+        if label is False:
+            is_root = info.parent_type in (
+                info.schema.query_type, info.schema.mutation_type
+            )
+            resolve = info.parent_type.fields[info.field_name].resolve
+            trivial = getattr(resolve, 'func', resolve) in TRIVIAL_RESOLVERS
+            if is_root or (resolve is not None and not trivial):
+                label = (f'{key[0]}.{key[1]}',)
+            else:
+                label = None
+            self._labels[key] = label
+        return label
+
+    def resolve(self, next, root, info, **args):
+        label = self.label(info)
+        if label is None:
+            return next(root, info, **args)
+        start = time.perf_counter()
+        try:
+            result = next(root, info, **args)
+        except Exception:
+            field_errors.inc(label)
+            raise
+        if isawaitable(result):
+            return self._await(result, label, start)
+        field_duration.observe(time.perf_counter() - start, label)
+        return result
+
+    async def _await(self, result, label, start):
+        try:
+            value = await result
+        except Exception:
+            field_errors.inc(label)
+            raise
+        field_duration.observe(time.perf_counter() - start, label)
+        return value
+
+
+field_middleware = MetricsMiddleware()
+
+
+def metrics_view(request):
+    if not enabled():
+        raise Http404('Metrics are disabled.')
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
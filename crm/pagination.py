@@ -0,0 +1,184 @@
+"""
+Keyset (cursor) pagination for the connection fields of the CRM schema.
+
+Pages are selected with ``WHERE (a, b) > (cursor_a, cursor_b) ORDER BY a, b
+LIMIT n`` instead of ``OFFSET``, so fetching page 10,000 costs the same as
+fetching the first one as long as the ordering columns are indexed. Cursors
+are opaque base64 strings holding the ordering values of the edge.
+"""
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from graphene import relay
+from graphql import GraphQLError
+
+
+def get_max_page_size():
+    return getattr(settings, 'CRM_MAX_PAGE_SIZE', 500)
+
+
+def get_default_page_size():
+    return getattr(settings, 'CRM_DEFAULT_PAGE_SIZE', 50)
+
+
+def _cursor_value(value):
+    # DjangoJSONEncoder truncates datetimes to milliseconds, which would
+    # make the cursor skip or repeat rows sharing a millisecond.
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    return str(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps([_cursor_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _key_to_python(model, key, value):
+    try:
+        field = model._meta.get_field(key)
+    except FieldDoesNotExist:
+        # An annotation (e.g. a search rank); cursors hold it as JSON.
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+        raise ValueError(key)
+    return field.to_python(value)
+
+
+def decode_cursor(cursor, model, keys):
+    """Turn a cursor back into typed ordering values for ``keys``."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise GraphQLError(f"Invalid cursor: {cursor!r}")
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise GraphQLError(f"Invalid cursor: {cursor!r}")
+    try:
+        return [_key_to_python(model, key, value) for key, value in zip(keys, values)]
+    except Exception:
+        raise GraphQLError(f"Invalid cursor: {cursor!r}")
+
+
+def keyset_filter(keys, values, lookup):
+    """Row-value comparison ``(k1, k2, ...) <lookup> (v1, v2, ...)`` as a Q.
+
+    ``lookup`` is ``'gt'`` or ``'lt'``. Expanded to
+    ``k1 >= v1 AND (k1 > v1 OR (k1 = v1 AND k2 > v2) OR ...)``; the leading
+    ``k1 >= v1`` lets SQLite and every other backend start with a range seek
+    on a ``(k1, k2)`` index instead of walking it from the first entry.
+    """
+    condition = Q()
+    for i, key in enumerate(keys):
+        term = Q(**{f'{key}__{lookup}': values[i]})
+        for prev_key, prev_value in zip(keys[:i], values[:i]):
+            term &= Q(**{prev_key: prev_value})
+        condition |= term
+    if len(keys) > 1:
+        condition &= Q(**{f'{keys[0]}__{lookup}e': values[0]})
+    return condition
+
+
+def cursor_for(node, keys):
+    return encode_cursor(getattr(node, key) for key in keys)
+
+
+class KeysetPage:
+    """One keyset page of ``queryset`` ordered by ``keys``.
+
+    ``keys`` must end with a unique column so the ordering is total.
+    ``queryset`` is the sliced query to evaluate (synchronously or with
+    ``async for``); ``result`` turns the rows it returned into the page.
+    """
+
+    def __init__(self, queryset, keys, first=None, after=None, last=None, before=None):
+        if first is not None and last is not None:
+            raise GraphQLError("Pass either 'first' or 'last', not both.")
+        size = first if last is None else last
+        if size is None:
+            size = get_default_page_size()
+        if size < 1:
+            # An empty page has no cursor to continue from.
+            raise GraphQLError("Page size must be at least 1.")
+        if size > get_max_page_size():
+            raise GraphQLError(
+                f"Page size {size} exceeds the maximum of {get_max_page_size()}."
+            )
+
+        model = queryset.model
+        if after is not None:
+            queryset = queryset.filter(
+                keyset_filter(keys, decode_cursor(after, model, keys), 'gt')
+            )
+        if before is not None:
+            queryset = queryset.filter(
+                keyset_filter(keys, decode_cursor(before, model, keys), 'lt')
+            )
+
+        self.keys = keys
+        self.size = size
+        self.after = after
+        self.before = before
+        self.backwards = last is not None
+        ordering = [f'-{key}' for key in keys] if self.backwards else list(keys)
+        self.queryset = queryset.order_by(*ordering)[:size + 1]
+
+    def result(self, nodes):
+        """Return ``(nodes, page_info)`` from the rows of ``self.queryset``."""
+        has_more = len(nodes) > self.size
+        nodes = nodes[:self.size]
+        if self.backwards:
+            nodes.reverse()
+
+        page_info = relay.PageInfo(
+            start_cursor=cursor_for(nodes[0], self.keys) if nodes else None,
+            end_cursor=cursor_for(nodes[-1], self.keys) if nodes else None,
+            has_next_page=has_more if not self.backwards else self.before is not None,
+            has_previous_page=has_more if self.backwards else self.after is not None,
+        )
+        return nodes, page_info
+
+
+def paginate(queryset, keys, **args):
+    """Return ``(nodes, page_info)`` for one keyset page of ``queryset``."""
+    page = KeysetPage(queryset, keys, **args)
+    return page.result(list(page.queryset))
+
+
+async def apaginate(queryset, keys, **args):
+    """``paginate`` using the async ORM."""
+    page = KeysetPage(queryset, keys, **args)
+    return page.result([node async for node in page.queryset])
+
+
+def build_connection(connection_type, nodes, page_info, keys):
+    return connection_type(
+        edges=[
+            connection_type.Edge(node=node, cursor=cursor_for(node, keys))
+            for node in nodes
+        ],
+        page_info=page_info,
+    )
+
+
+def connection_from_queryset(connection_type, queryset, keys, prime=None, **args):
+    """Build a ``connection_type`` instance for one keyset page.
+
+    ``prime`` is called with the page's nodes before they are returned, so
+    relation loaders can queue the keys the nested fields will ask for.
+    """
+    nodes, page_info = paginate(queryset, keys, **args)
+    if prime is not None:
+        prime(nodes)
+    return build_connection(connection_type, nodes, page_info, keys)
+
+
+async def aconnection_from_queryset(connection_type, queryset, keys, **args):
+    """``connection_from_queryset`` using the async ORM."""
+    nodes, page_info = await apaginate(queryset, keys, **args)
+    return build_connection(connection_type, nodes, page_info, keys)
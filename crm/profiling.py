@@ -0,0 +1,216 @@
+"""
+On-demand profiling of single ``/graphql`` operations.
+
+A request carrying ``X-CRM-Profile: <CRM_PROFILE_TOKEN>`` is executed with
+a ``Profiler`` attached, and the response's ``extensions.profile`` holds:
+
+* ``sql``: every statement with its parameters, start offset and duration,
+  plus the backend's ``EXPLAIN`` (``EXPLAIN QUERY PLAN`` on SQLite) for
+  reads. The plans are taken after the operation finishes, so they do not
+  distort its timings.
+* ``resolvers``: the call tree of root fields and fields with their own
+  resolver, with start offsets and durations.
+* ``samples`` (only with ``X-CRM-Profile-Sample: 1``): stacks of the
+  request thread sampled every ``CRM_PROFILE_SAMPLE_INTERVAL`` seconds, in
+  folded flame-graph format, plus the functions most often on top.
+
+Nothing is installed unless the header matches a configured token, so
+ordinary requests only pay for one header lookup. Profiled requests bypass
+the response cache. Only the sync view supports profiling.
+"""
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+from graphql import ExecutionResult
+
+from crm.metrics import TRIVIAL_RESOLVERS, wrap_connections
+
+PROFILE_HEADER = 'HTTP_X_CRM_PROFILE'
+SAMPLE_HEADER = 'HTTP_X_CRM_PROFILE_SAMPLE'
+
+
+def profiler_for(request):
+    """A ``Profiler`` if the request asked for one with a valid token, else None."""
+    supplied = request.META.get(PROFILE_HEADER)
+    if not supplied:
+        return None
+    token = getattr(settings, 'CRM_PROFILE_TOKEN', None)
+    if not token or not hmac.compare_digest(supplied.encode(), token.encode()):
+        return None
+    profiler = Profiler(sample=request.META.get(SAMPLE_HEADER) == '1')
+    request.crm_profiler = profiler
+    return profiler
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def _path(path):
+    keys = []
+    while path is not None:
+        keys.append(path.key)
+        path = path.prev
+    return tuple(reversed(keys))
+
+
+class Sampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='crm-profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})'
+                )
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def summary(self, limit=25):
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return {
+            'intervalMs': _ms(self.interval),
+            'total': sum(self.stacks.values()),
+            'folded': [f'{stack} {count}' for stack, count in self.stacks.most_common(limit)],
+            'top': [{'frame': frame, 'samples': count}
+                    for frame, count in leaves.most_common(limit)],
+        }
+
+
+class Profiler:
+    def __init__(self, sample=False):
+        self.sample = sample
+        self.statements = []
+        self.calls = []
+        self.sampler = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self._wrapper = wrap_connections(self.record_sql)
+        self._wrapper.__enter__()
+        if self.sample:
+            self.sampler = Sampler(
+                threading.get_ident(),
+                getattr(settings, 'CRM_PROFILE_SAMPLE_INTERVAL', 0.001),
+            )
+            self.sampler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.duration = time.perf_counter() - self.start
+        if self.sampler is not None:
+            self.sampler.stop()
+        self._wrapper.__exit__(*exc_info)
+        return False
+
+    def record_sql(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.statements.append((context['connection'].alias, sql, params, many,
+                                    start - self.start, time.perf_counter() - start))
+
+    def resolve(self, next, root, info, **args):
+        """Graphene middleware recording the resolver call tree."""
+        field = info.parent_type.fields[info.field_name]
+        is_root = info.parent_type in (info.schema.query_type, info.schema.mutation_type)
+        if not is_root and getattr(field.resolve, 'func', field.resolve) in TRIVIAL_RESOLVERS:
+            return next(root, info, **args)
+        start = time.perf_counter()
+        result = next(root, info, **args)
+        self.calls.append((
+            _path(info.path), f'{info.parent_type.name}.{info.field_name}',
+            start - self.start, time.perf_counter() - start,
+        ))
+        return result
+
+    def explain(self, alias, sql, params):
+        """The plan of ``sql`` on the database that ran it."""
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return None
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+                rows = cursor.fetchall()
+        except Exception as e:
+            return [f'EXPLAIN failed: {e}']
+        # SQLite rows are (id, parent, notused, detail).
+        return [row[-1] if connection.vendor == 'sqlite' else ' '.join(map(str, row))
+                for row in rows]
+
+    def sql_trace(self):
+        return [
+            {
+                'database': alias,
+                'sql': sql,
+                'params': [repr(param) for param in params] if params and not many else [],
+                'startMs': _ms(start),
+                'durationMs': _ms(duration),
+                'plan': None if many else self.explain(alias, sql, params),
+            }
+            for alias, sql, params, many, start, duration in self.statements
+        ]
+
+    def resolver_tree(self):
+        nodes = {}
+        roots = []
+        for path, field, start, duration in sorted(self.calls, key=lambda call: call[2]):
+            node = {
+                'path': '.'.join(map(str, path)),
+                'field': field,
+                'startMs': _ms(start),
+                'durationMs': _ms(duration),
+                'children': [],
+            }
+            nodes[path] = node
+            parent = next(
+                (nodes[path[:i]] for i in range(len(path) - 1, 0, -1) if path[:i] in nodes),
+                None,
+            )
+            (parent['children'] if parent else roots).append(node)
+        return roots
+
+    def trace(self):
+        trace = {
+            'durationMs': _ms(self.duration),
+            'sqlCount': len(self.statements),
+            'sqlMs': _ms(sum(statement[-1] for statement in self.statements)),
+            'sql': self.sql_trace(),
+            'resolvers': self.resolver_tree(),
+        }
+        if self.sampler is not None:
+            trace['samples'] = self.sampler.summary()
+        return trace
+
+    def attach(self, result):
+        if result is None:
+            return None
+        if not isinstance(result, ExecutionResult):
+            return result
+        result.extensions = {**(result.extensions or {}), 'profile': self.trace()}
+        return result
@@ -0,0 +1,174 @@
+"""
+Querysets shaped by the selection set of the GraphQL field resolving them.
+
+``project(queryset, info, *path)`` reads the selection under ``path`` (for
+example ``'edges', 'node'`` for a connection) and narrows the queryset:
+
+* ``only()`` the selected columns, plus the primary key and any ``keys``
+  the caller orders or pages by;
+* ``select_related`` for selected foreign keys (``Order.customer``), with
+  their own columns projected the same way;
+* ``prefetch_related`` with a projected inner queryset for selected
+  reverse relations (``Customer.orderSet``), stored as a list in
+  ``prefetched_attr(accessor)``.
+
+Relation resolvers return what was joined or prefetched and only fall
+back to the loaders (``crm.loaders``) when it was not, for example below
+``topCustomers``. A selected field that is not a model column (a computed
+field) disables ``only()`` for its type, since its resolver may read any
+column.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_camel_case
+from graphql import get_named_type
+
+from crm.selections import flatten_fields
+
+
+def prefetched_attr(accessor):
+    """The attribute a prefetched reverse relation's list is stored in."""
+    return f'projected_{accessor}'
+
+
+def _fields(info, parent_type, selection_set):
+    """Yield the field nodes of ``selection_set`` with fragments flattened."""
+    return flatten_fields(info.schema, info.fragments, parent_type, selection_set)
+
+
+def _model_fields(graphene_type):
+    """``{graphql name: python name}`` of a ``DjangoObjectType``'s fields."""
+    return {
+        getattr(field, 'name', None) or to_camel_case(name): name
+        for name, field in graphene_type._meta.fields.items()
+    }
+
+
+class Projection:
+    """The columns and relations of ``model`` one selection set reads."""
+
+    def __init__(self, model):
+        self.model = model
+        self.columns = {model._meta.pk.name}
+        self.complete = True
+        self.joined = {}      # foreign key name -> Projection
+        self.prefetched = {}  # reverse accessor -> Projection
+
+    @classmethod
+    def build(cls, info, graphql_type, selections):
+        """Projection of ``selections`` (field nodes) on ``graphql_type``, or None."""
+        graphene_type = getattr(graphql_type, 'graphene_type', None)
+        model = getattr(getattr(graphene_type, '_meta', None), 'model', None)
+        if model is None:
+            return None
+        projection = cls(model)
+        names = _model_fields(graphene_type)
+        reverse = {rel.get_accessor_name(): rel for rel in model._meta.related_objects}
+        for node in selections:
+            for parent_type, field in _fields(info, graphql_type, node.selection_set):
+                projection.add(info, parent_type, field, names, reverse)
+        return projection
+
+    def add(self, info, parent_type, node, names, reverse):
+        graphql_name = node.name.value
+        if graphql_name.startswith('__'):
+            return
+        name = names.get(graphql_name)
+        field_def = parent_type.fields.get(graphql_name)
+        child_type = get_named_type(field_def.type) if field_def else None
+        if name in reverse:
+            rel = reverse[name]
+            child = Projection.build(info, child_type, [node])
+            if child is not None:
+                # prefetch_related matches the rows on their foreign key.
+                child.columns.add(rel.field.name)
+                self.prefetched[name] = child
+            return
+        try:
+            field = self.model._meta.get_field(name) if name else None
+        except FieldDoesNotExist:
+            field = None
+        if field is None or not field.concrete:
+            self.complete = False
+            return
+        self.columns.add(field.name)
+        if field.many_to_one and node.selection_set is not None:
+            child = Projection.build(info, child_type, [node])
+            if child is not None:
+                self.joined[field.name] = child
+
+    def only(self, prefix=''):
+        if not self.complete:
+            return None
+        columns = [prefix + column for column in self.columns]
+        for name, child in self.joined.items():
+            nested = child.only(f'{prefix}{name}__')
+            if nested is None:
+                # Django loads every column of a joined model none of whose
+                # columns are listed.
+                continue
+            columns.extend(nested)
+        return columns
+
+    def select_related(self, prefix=''):
+        for name, child in self.joined.items():
+            yield prefix + name
+            yield from child.select_related(f'{prefix}{name}__')
+
+    def prefetches(self, prefix=''):
+        for accessor, child in self.prefetched.items():
+            # The loaders return orders by id; keep that order. A plain list
+            # attribute is cheaper than filling each related manager's cache.
+            inner = child.apply(child.model.objects.order_by('id'))
+            yield Prefetch(prefix + accessor, queryset=inner, to_attr=prefetched_attr(accessor))
+        for name, child in self.joined.items():
+            yield from child.prefetches(f'{prefix}{name}__')
+
+    def apply(self, queryset, keys=()):
+        columns = self.only()
+        if columns is not None:
+            queryset = queryset.only(*columns, *keys)
+        related = list(self.select_related())
+        if related:
+            queryset = queryset.select_related(*related)
+        prefetches = list(self.prefetches())
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        return queryset
+
+
+def selection(info, *path):
+    """``(graphql_type, field_nodes)`` found under ``path`` in ``info``'s field."""
+    graphql_type = get_named_type(info.return_type)
+    nodes = list(info.field_nodes)
+    for name in path:
+        found, child_type = [], None
+        for node in nodes:
+            if node.selection_set is None:
+                continue
+            for parent_type, field in _fields(info, graphql_type, node.selection_set):
+                if field.name.value == name:
+                    found.append(field)
+                    child_type = get_named_type(parent_type.fields[name].type)
+        if not found:
+            return None, []
+        graphql_type, nodes = child_type, found
+    return graphql_type, nodes
+
+
+def project(queryset, info, *path, keys=()):
+    """``queryset`` narrowed to what the selection under ``path`` reads.
+
+    ``keys`` are columns the caller needs whatever is selected, such as
+    the keyset ordering; names that are not columns are ignored.
+    """
+    meta = queryset.model._meta
+    keys = [key for key in keys if key in {field.name for field in meta.concrete_fields}]
+    graphql_type, nodes = selection(info, *path)
+    if not nodes:
+        # Nothing selected below path (e.g. only pageInfo).
+        return queryset.only(meta.pk.name, *keys)
+    projection = Projection.build(info, graphql_type, nodes)
+    if projection is None or projection.model is not queryset.model:
+        return queryset
+    return projection.apply(queryset, keys)
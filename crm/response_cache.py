@@ -0,0 +1,156 @@
+"""
+Read-through cache of GraphQL query results.
+
+Entries are keyed on the normalized operation (``print_ast`` of the
+document), the operation name, the variables and the database the request
+reads (``crm.routers``), and carry the current version tag of every model
+the operation reads (see ``crm_app.cache_tags``). A write to any of those
+models therefore makes the entry unreachable. Only query operations whose fields can all be mapped to
+models are cached; anything else bypasses the cache.
+
+Enabled with ``CRM_RESPONSE_CACHE_ENABLED``. TTL, size limits and eviction
+come from the ``CACHES`` entry named by ``CRM_RESPONSE_CACHE_ALIAS``; use a
+shared backend (file, redis) when writers run in other processes, since
+tag bumps only reach processes that share the cache.
+"""
+import hashlib
+import json
+import pickle
+
+from django.conf import settings
+from graphene import relay
+from graphql import OperationType, get_named_type, get_operation_ast, print_ast
+
+from crm.cost import CostAnalyzer
+from crm.document_cache import DocumentCache
+from crm_app import cache_tags
+from crm_app.models import Customer, Order
+
+# Root fields computed from whole tables rather than returning model rows.
+ROOT_FIELD_MODELS = {
+    'hello': (),
+    'totalCustomers': (Customer,),
+    'totalOrders': (Order,),
+    'totalRevenue': (Order,),
+    'averageOrderValue': (Order,),
+    'revenueBetween': (Order,),
+    'ordersCount': (Order,),
+    'revenueSeries': (Order,),
+    'topCustomers': (Customer, Order),
+}
+
+
+def is_relay_plumbing(graphene_type):
+    """Connection, edge and page-info types only carry their nodes' data."""
+    if not isinstance(graphene_type, type):
+        return False
+    if issubclass(graphene_type, (relay.Connection, relay.PageInfo)):
+        return True
+    # Edge classes are generated inside Connection and not importable.
+    return {'node', 'cursor'} <= set(getattr(graphene_type._meta, 'fields', ()))
+
+
+class CachePlan:
+    def __init__(self, digest, models):
+        self.digest = digest
+        self.models = models
+
+
+class ResponseCache:
+    def __init__(self):
+        # Plans are derived from the document only, so they are memoized
+        # under the same key as the document itself.
+        self.plans = DocumentCache()
+
+    def enabled(self):
+        return cache_tags.enabled()
+
+    def models_for(self, schema, document, operation):
+        """Models an operation reads, or None if it cannot be cached."""
+        analyzer = CostAnalyzer(schema, document)
+        models = set()
+
+        def visit(parent_type, selection_set, is_root):
+            for field_parent, node in analyzer.fields(parent_type, selection_set):
+                name = node.name.value
+                if name.startswith('__'):
+                    return False
+                if is_root and name in ROOT_FIELD_MODELS:
+                    models.update(ROOT_FIELD_MODELS[name])
+                    continue
+                field_def = field_parent.fields.get(name)
+                if field_def is None:
+                    return False
+                named_type = get_named_type(field_def.type)
+                graphene_type = getattr(named_type, 'graphene_type', None)
+                model = getattr(getattr(graphene_type, '_meta', None), 'model', None)
+                if model is not None:
+                    models.add(model)
+                if node.selection_set is None:
+                    if is_root:
+                        return False
+                    continue
+                if model is None and not is_relay_plumbing(graphene_type):
+                    return False
+                if not visit(named_type, node.selection_set, False):
+                    return False
+            return True
+
+        root_type = schema.get_root_type(operation.operation)
+        if not visit(root_type, operation.selection_set, True):
+            return None
+        return sorted(models, key=lambda model: model._meta.label_lower)
+
+    def plan(self, key, schema, document, operation_name):
+        cached = self.plans.get(key)
+        if cached is not None:
+            return cached.get(operation_name)
+        plans = {}
+        for definition in document.definitions:
+            if definition.kind != 'operation_definition':
+                continue
+            name = definition.name.value if definition.name else None
+            plans[name] = self._make_plan(schema, document, name)
+        if len(plans) == 1:
+            plans[None] = next(iter(plans.values()))
+        self.plans.put(key, plans)
+        return plans.get(operation_name)
+
+    def _make_plan(self, schema, document, operation_name):
+        operation = get_operation_ast(document, operation_name)
+        if operation is None or operation.operation != OperationType.QUERY:
+            return False
+        models = self.models_for(schema, document, operation)
+        if models is None:
+            return False
+        digest = hashlib.sha256(print_ast(document).encode()).hexdigest()
+        return CachePlan(digest, models)
+
+    def entry_key(self, plan, operation_name, variables, database):
+        versions = cache_tags.versions(plan.models)
+        parts = [
+            plan.digest,
+            operation_name or '',
+            json.dumps(variables or {}, sort_keys=True, default=str),
+            # A replica answer stored after a write must not reach the
+            # clients pinned to the primary to read that write.
+            database,
+            json.dumps(versions, sort_keys=True),
+        ]
+        return 'crm:resp:' + hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+    def get(self, entry_key):
+        return cache_tags.get_cache().get(entry_key)
+
+    def set(self, entry_key, data):
+        max_bytes = getattr(settings, 'CRM_RESPONSE_CACHE_MAX_ENTRY_BYTES', None)
+        if max_bytes is not None and len(pickle.dumps(data)) > max_bytes:
+            return
+        timeout = getattr(settings, 'CRM_RESPONSE_CACHE_TIMEOUT', None)
+        if timeout is None:
+            cache_tags.get_cache().set(entry_key, data)
+        else:
+            cache_tags.get_cache().set(entry_key, data, timeout)
+
+
+response_cache = ResponseCache()
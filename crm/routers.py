@@ -0,0 +1,157 @@
+"""
+Read/write routing between ``default`` and a read replica.
+
+When a ``replica`` database is configured (``CRM_REPLICA_DB``, see
+``crm.settings``), ``ReplicaRouter`` sends ORM reads made inside
+``use_replica()`` to it. Everything else, writes included, stays on
+``default``. Outside such a block, routing is the same as with a single
+database.
+
+The GraphQL views and ``crm.executor`` pick the database per operation with
+``database_for``. A query goes to the replica only when every root field it
+selects is listed in ``LAG_TOLERANT_FIELDS``, i.e. may be up to one replica
+sync behind. After a client runs a mutation, its responses carry a cookie
+that pins its queries to ``default`` for ``CRM_READ_YOUR_WRITES_SECONDS``,
+so it reads its own writes. Other code can wrap its reads in
+``use_replica()`` itself.
+
+The replica is a copy of the SQLite file. ``sync_replica`` refreshes it in
+one step with SQLite's online backup API; run it from cron at least as
+often as the read-your-writes window.
+"""
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from graphql import OperationType
+
+from crm.cost import CostAnalyzer
+
+PRIMARY = 'primary'
+REPLICA = 'replica'
+PIN_COOKIE = 'crm_primary_until'
+
+# Root fields whose answer may lag the primary by one replica sync:
+# aggregates for dashboards and reports, never rows a client edits.
+LAG_TOLERANT_FIELDS = {
+    'Query.hello',
+    'Query.totalCustomers',
+    'Query.totalOrders',
+    'Query.totalRevenue',
+    'Query.averageOrderValue',
+    'Query.revenueBetween',
+    'Query.ordersCount',
+    'Query.revenueSeries',
+    'Query.topCustomers',
+}
+
+_target = ContextVar('crm_db_target', default=PRIMARY)
+
+
+def replica_alias():
+    """The configured replica alias, or None when there is no replica."""
+    alias = getattr(settings, 'CRM_REPLICA_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def get_read_your_writes_seconds():
+    return getattr(settings, 'CRM_READ_YOUR_WRITES_SECONDS', 60)
+
+
+@contextmanager
+def use_database(target):
+    """Route the reads made in this block (and its threads) to ``target``."""
+    token = _target.set(target)
+    try:
+        yield
+    finally:
+        _target.reset(token)
+
+
+def use_replica():
+    return use_database(REPLICA)
+
+
+def use_primary():
+    return use_database(PRIMARY)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _target.get() == REPLICA:
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of default, schema included.
+        if db == replica_alias():
+            return False
+        return None
+
+
+def is_lag_tolerant(schema, document, operation_ast):
+    """True if every root field of a query operation may read the replica."""
+    if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+        return False
+    root_type = schema.query_type
+    for parent_type, node in CostAnalyzer(schema, document).fields(
+        root_type, operation_ast.selection_set
+    ):
+        name = node.name.value
+        if name != '__typename' and f'{parent_type.name}.{name}' not in LAG_TOLERANT_FIELDS:
+            return False
+    return True
+
+
+def pinned(request):
+    """True while ``request``'s client is in its read-your-writes window."""
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def pin(response):
+    """Pin the client that gets ``response`` to ``default`` for a while."""
+    window = get_read_your_writes_seconds()
+    if window > 0 and replica_alias():
+        response.set_cookie(PIN_COOKIE, f'{time.time() + window:.0f}',
+                            max_age=window, httponly=True, samesite='Lax')
+    return response
+
+
+def database_for(schema, document, operation_ast, request=None):
+    """``PRIMARY`` or ``REPLICA`` for one GraphQL operation."""
+    if replica_alias() is None:
+        return PRIMARY
+    if request is not None and pinned(request):
+        return PRIMARY
+    return REPLICA if is_lag_tolerant(schema, document, operation_ast) else PRIMARY
+
+
+def sync_replica(source_alias=DEFAULT_DB_ALIAS, target_alias=None):
+    """Copy ``source_alias`` over the replica file with the SQLite backup API."""
+    target_alias = target_alias or replica_alias()
+    if target_alias is None:
+        raise ValueError('No replica database is configured (set CRM_REPLICA_DB).')
+    source = connections[source_alias]
+    if source.vendor != 'sqlite' or connections[target_alias].vendor != 'sqlite':
+        raise ValueError('sync_replica copies SQLite databases only.')
+    source.ensure_connection()
+    target = sqlite3.connect(connections[target_alias].settings_dict['NAME'])
+    try:
+        start = time.perf_counter()
+        # All pages in one step, so replica readers see one consistent copy.
+        source.connection.backup(target)
+        return time.perf_counter() - start
+    finally:
+        target.close()
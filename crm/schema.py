@@ -1,9 +1,14 @@
 import graphene
+from graphene.utils.str_converters import to_camel_case
 from graphene_django import DjangoObjectType
 from django.utils import timezone
 from datetime import timedelta
+from crm_app import analytics, bulk, search, stats
+from crm_app.inventory import restock_low_stock
 from crm_app.models import Customer, Product, Order
-from crm.models import Product
+from crm.loaders import get_loaders, prefetched_orders
+from crm.pagination import connection_from_queryset
+from crm.projection import project
 
 
 class CustomerType(DjangoObjectType):
@@ -11,6 +16,12 @@ class CustomerType(DjangoObjectType):
         model = Customer
         fields = '__all__'
 
+    def resolve_order_set(self, info):
+        orders = prefetched_orders(self)
+        if orders is not None:
+            return orders
+        return get_loaders(info).orders_by_customer.load(self.id)
+
 
 class ProductType(DjangoObjectType):
     class Meta:
@@ -23,71 +34,300 @@ class OrderType(DjangoObjectType):
         model = Order
         fields = '__all__'
 
+    def resolve_customer(self, info):
+        if Order.customer.is_cached(self):
+            return self.customer
+        return get_loaders(info).customer.load(self.customer_id)
+
+
+class CustomerConnection(graphene.relay.Connection):
+    class Meta:
+        node = CustomerType
+
+
+class ProductConnection(graphene.relay.Connection):
+    class Meta:
+        node = ProductType
+
+
+class OrderConnection(graphene.relay.Connection):
+    class Meta:
+        node = OrderType
+
+
+class Granularity(graphene.Enum):
+    DAY = 'day'
+    WEEK = 'week'
+    MONTH = 'month'
+
+
+class CustomerRanking(graphene.Enum):
+    REVENUE = 'revenue'
+    ORDERS = 'orders'
+
+
+class SeriesPoint(graphene.ObjectType):
+    start = graphene.Date()
+    orders = graphene.Int()
+    revenue = graphene.Float()
+
+    def resolve_revenue(self, info):
+        return float(self['revenue'])
+
+
+class TopCustomer(graphene.ObjectType):
+    customer = graphene.Field(CustomerType)
+    orders = graphene.Int()
+    revenue = graphene.Float()
+
+    def resolve_customer(self, info):
+        return get_loaders(info).customer.load(self['customer_id'])
+
+    def resolve_revenue(self, info):
+        return float(self['revenue'])
+
 
 class Query(graphene.ObjectType):
     hello = graphene.String(default_value="Hello from GraphQL CRM!")
-    customers = graphene.List(CustomerType)
-    products = graphene.List(ProductType)
-    orders = graphene.List(OrderType)
+    customers = graphene.relay.ConnectionField(CustomerConnection)
+    products = graphene.relay.ConnectionField(ProductConnection)
+    orders = graphene.relay.ConnectionField(OrderConnection)
+    search_customers = graphene.relay.ConnectionField(
+        CustomerConnection, q=graphene.String(required=True),
+        description='Customers whose name or email words match q; the last word as a prefix.',
+    )
+    search_products = graphene.relay.ConnectionField(
+        ProductConnection, q=graphene.String(required=True),
+        description='Products whose name words match q; the last word as a prefix.',
+    )
     orders_last_week = graphene.List(OrderType)
     low_stock_products = graphene.List(ProductType)
     total_customers = graphene.Int()
     total_orders = graphene.Int()
     total_revenue = graphene.Float()
+    average_order_value = graphene.Float()
+    revenue_between = graphene.Float(
+        from_=graphene.DateTime(name='from', required=True),
+        to=graphene.DateTime(required=True),
+    )
+    orders_count = graphene.Int(
+        from_=graphene.DateTime(name='from', required=True),
+        to=graphene.DateTime(required=True),
+    )
+    revenue_series = graphene.List(
+        SeriesPoint,
+        from_=graphene.Date(name='from', required=True),
+        to=graphene.Date(required=True),
+        granularity=Granularity(default_value='day'),
+    )
+    top_customers = graphene.List(
+        TopCustomer,
+        by=CustomerRanking(default_value='revenue'),
+        limit=graphene.Int(default_value=10),
+        window=graphene.Int(default_value=30, description='Days back from now; null for all time.'),
+    )
 
-    def resolve_customers(self, info):
-        return Customer.objects.all()
+    def resolve_customers(self, info, **args):
+        keys = ('created_at', 'id')
+        customers = project(Customer.objects.all(), info, 'edges', 'node', keys=keys)
+        return connection_from_queryset(
+            CustomerConnection, customers, keys,
+            prime=get_loaders(info).prime_customers, **args
+        )
+
+    def resolve_products(self, info, **args):
+        return connection_from_queryset(
+            ProductConnection, project(Product.objects.all(), info, 'edges', 'node'),
+            ('id',), **args
+        )
+
+    def resolve_orders(self, info, **args):
+        keys = ('order_date', 'id')
+        orders = project(Order.objects.all(), info, 'edges', 'node', keys=keys)
+        return connection_from_queryset(
+            OrderConnection, orders, keys, prime=get_loaders(info).prime_orders, **args
+        )
 
-    def resolve_products(self, info):
-        return Product.objects.all()
+    def resolve_search_customers(self, info, q, **args):
+        return connection_from_queryset(
+            CustomerConnection, project(search.search(Customer, q), info, 'edges', 'node'),
+            search.RANK_KEYS, prime=get_loaders(info).prime_customers, **args
+        )
 
-    def resolve_orders(self, info):
-        return Order.objects.all()
+    def resolve_search_products(self, info, q, **args):
+        return connection_from_queryset(
+            ProductConnection, project(search.search(Product, q), info, 'edges', 'node'),
+            search.RANK_KEYS, **args
+        )
 
     def resolve_orders_last_week(self, info):
         week_ago = timezone.now() - timedelta(days=7)
-        return Order.objects.filter(order_date__gte=week_ago)
+        orders = project(Order.objects.filter(order_date__gte=week_ago), info)
+        return get_loaders(info).prime_orders(list(orders))
 
     def resolve_low_stock_products(self, info):
-        return Product.objects.filter(stock__lt=10)
+        return project(Product.objects.filter(stock__lt=10), info)
 
     def resolve_total_customers(self, info):
-        return Customer.objects.count()
+        return get_loaders(info).totals()['customers']
 
     def resolve_total_orders(self, info):
-        return Order.objects.count()
+        return get_loaders(info).totals()['orders']
 
     def resolve_total_revenue(self, info):
-        total = sum(order.total_amount for order in Order.objects.all())
-        return float(total) if total else 0.0
+        return float(get_loaders(info).totals()['revenue'])
+
+    def resolve_average_order_value(self, info):
+        return float(get_loaders(info).totals()['average_order_value'])
+
+    def resolve_revenue_between(self, info, from_, to):
+        return float(stats.revenue_between(from_, to))
+
+    def resolve_orders_count(self, info, from_, to):
+        return analytics.orders_between(from_, to)['orders']
+
+    def resolve_revenue_series(self, info, from_, to, granularity='day'):
+        return analytics.revenue_series(from_, to, getattr(granularity, 'value', granularity))
+
+    def resolve_top_customers(self, info, by='revenue', limit=10, window=30):
+        rows = analytics.top_customers(getattr(by, 'value', by), limit, window)
+        get_loaders(info).customer.prime(row['customer_id'] for row in rows)
+        return rows
 
 
 class UpdateLowStockProducts(graphene.Mutation):
     class Arguments:
-        pass
+        threshold = graphene.Int(default_value=10)
+        increment = graphene.Int(default_value=10)
+        ids = graphene.List(graphene.NonNull(graphene.ID))
 
     success = graphene.Boolean()
     message = graphene.String()
     updated_products = graphene.List(ProductType)
 
-    def mutate(self, info):
-        low_stock_products = Product.objects.filter(stock__lt=10)
-        updated_products = []
-        
-        for product in low_stock_products:
-            product.stock += 10
-            product.save()
-            updated_products.append(product)
-        
+    def mutate(self, info, threshold=10, increment=10, ids=None):
+        if increment <= 0:
+            return UpdateLowStockProducts(
+                success=False,
+                message="increment must be a positive number",
+                updated_products=[]
+            )
+
+        products = project(Product.objects.all(), info, 'updatedProducts')
+        updated_count, updated_products = restock_low_stock(
+            threshold, increment, ids, queryset=products
+        )
+
         return UpdateLowStockProducts(
             success=True,
-            message=f"Updated {len(updated_products)} products",
+            message=f"Updated {updated_count} products",
             updated_products=updated_products
         )
 
 
+class CustomerInput(graphene.InputObjectType):
+    name = graphene.String(required=True)
+    email = graphene.String(required=True)
+    created_at = graphene.DateTime(description='For a new customer; now if omitted.')
+
+
+class ProductInput(graphene.InputObjectType):
+    name = graphene.String(required=True)
+    price = graphene.Decimal(description='Required for a new product.')
+    stock = graphene.Int(description='0 for a new product if omitted.')
+
+
+class OrderInput(graphene.InputObjectType):
+    customer_id = graphene.ID(description='Give this or customerEmail.')
+    customer_email = graphene.String()
+    total_amount = graphene.Decimal(required=True)
+    order_date = graphene.DateTime(description='Now if omitted.')
+
+
+class BulkRowError(graphene.ObjectType):
+    index = graphene.Int(required=True, description='Position of the row in rows.')
+    field = graphene.String(description='Null for errors raised by the database.')
+    messages = graphene.List(graphene.NonNull(graphene.String), required=True)
+
+    def resolve_field(self, info):
+        return self.field and to_camel_case(self.field)
+
+
+class BulkMutation(graphene.Mutation):
+    """Writes ``rows`` with ``write`` (from ``crm_app.bulk``).
+
+    Rows with errors are skipped and listed in ``errors``; the rest are
+    written. ``rows_field`` returns the saved objects in input order.
+    """
+
+    class Meta:
+        abstract = True
+
+    success = graphene.Boolean(description='Whether every row was written.')
+    message = graphene.String()
+    created = graphene.Int()
+    updated = graphene.Int()
+    errors = graphene.List(graphene.NonNull(BulkRowError))
+
+    @classmethod
+    def run(cls, rows):
+        try:
+            result = cls.write(rows)
+        except ValueError as error:
+            return cls(
+                success=False, message=str(error), created=0, updated=0, errors=[],
+                **{cls.rows_field: []}
+            )
+        failed = len({error.index for error in result.errors})
+        return cls(
+            success=not failed,
+            message=f"Created {result.created}, updated {result.updated}, {failed} rows failed",
+            created=result.created,
+            updated=result.updated,
+            errors=result.errors,
+            **{cls.rows_field: result.rows}
+        )
+
+    @classmethod
+    def mutate(cls, root, info, rows):
+        return cls.run(rows)
+
+
+class BulkUpsertCustomers(BulkMutation):
+    class Arguments:
+        rows = graphene.List(graphene.NonNull(CustomerInput), required=True)
+
+    customers = graphene.List(CustomerType, description='Null where a row failed.')
+
+    rows_field = 'customers'
+    write = staticmethod(bulk.upsert_customers)
+
+
+class BulkUpsertProducts(BulkMutation):
+    class Arguments:
+        rows = graphene.List(graphene.NonNull(ProductInput), required=True)
+
+    products = graphene.List(ProductType, description='Null where a row failed.')
+
+    rows_field = 'products'
+    write = staticmethod(bulk.upsert_products)
+
+
+class BulkCreateOrders(BulkMutation):
+    class Arguments:
+        rows = graphene.List(graphene.NonNull(OrderInput), required=True)
+
+    orders = graphene.List(OrderType, description='Null where a row failed.')
+
+    rows_field = 'orders'
+    write = staticmethod(bulk.create_orders)
+
+
 class Mutation(graphene.ObjectType):
     update_low_stock_products = UpdateLowStockProducts.Field()
+    bulk_upsert_customers = BulkUpsertCustomers.Field()
+    bulk_upsert_products = BulkUpsertProducts.Field()
+    bulk_create_orders = BulkCreateOrders.Field()
 
 
 schema = graphene.Schema(query=Query, mutation=Mutation)
@@ -0,0 +1,156 @@
+"""
+Async variant of ``crm.schema`` served by ``/graphql/async``.
+
+Same types and fields as the sync schema; the root resolvers use Django's
+async ORM API and relation fields go through ``AsyncLoaders``. Top-level
+fields run concurrently: the total fields share a single aggregate query
+and the list fields overlap their I/O. Mutations use ``sync_to_async``
+around the transactional parts, which the async ORM does not support.
+"""
+import graphene
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from datetime import timedelta
+
+from crm_app import analytics, search, stats
+from crm_app.inventory import restock_low_stock
+from crm_app.models import Customer, Product, Order
+from crm.loaders import get_loaders
+from crm.pagination import aconnection_from_queryset
+from crm.projection import project
+from crm.schema import (
+    BulkCreateOrders, BulkUpsertCustomers, BulkUpsertProducts, CustomerConnection,
+    OrderConnection, ProductConnection, Query, UpdateLowStockProducts,
+)
+
+
+class AsyncQuery(Query):
+    class Meta:
+        name = 'Query'
+
+    async def resolve_customers(self, info, **args):
+        keys = ('created_at', 'id')
+        customers = project(Customer.objects.all(), info, 'edges', 'node', keys=keys)
+        return await aconnection_from_queryset(CustomerConnection, customers, keys, **args)
+
+    async def resolve_products(self, info, **args):
+        return await aconnection_from_queryset(
+            ProductConnection, project(Product.objects.all(), info, 'edges', 'node'),
+            ('id',), **args
+        )
+
+    async def resolve_orders(self, info, **args):
+        keys = ('order_date', 'id')
+        orders = project(Order.objects.all(), info, 'edges', 'node', keys=keys)
+        return await aconnection_from_queryset(OrderConnection, orders, keys, **args)
+
+    async def resolve_search_customers(self, info, q, **args):
+        customers = await sync_to_async(search.search)(Customer, q)
+        return await aconnection_from_queryset(
+            CustomerConnection, project(customers, info, 'edges', 'node'), search.RANK_KEYS,
+            **args
+        )
+
+    async def resolve_search_products(self, info, q, **args):
+        products = await sync_to_async(search.search)(Product, q)
+        return await aconnection_from_queryset(
+            ProductConnection, project(products, info, 'edges', 'node'), search.RANK_KEYS,
+            **args
+        )
+
+    async def resolve_orders_last_week(self, info):
+        week_ago = timezone.now() - timedelta(days=7)
+        orders = project(Order.objects.filter(order_date__gte=week_ago), info)
+        return [order async for order in orders]
+
+    async def resolve_low_stock_products(self, info):
+        products = project(Product.objects.filter(stock__lt=10), info)
+        return [product async for product in products]
+
+    async def resolve_total_customers(self, info):
+        return (await get_loaders(info).totals())['customers']
+
+    async def resolve_total_orders(self, info):
+        return (await get_loaders(info).totals())['orders']
+
+    async def resolve_total_revenue(self, info):
+        return float((await get_loaders(info).totals())['revenue'])
+
+    async def resolve_average_order_value(self, info):
+        return float((await get_loaders(info).totals())['average_order_value'])
+
+    async def resolve_revenue_between(self, info, from_, to):
+        return float(await stats.arevenue_between(from_, to))
+
+    async def resolve_orders_count(self, info, from_, to):
+        return (await sync_to_async(analytics.orders_between)(from_, to))['orders']
+
+    async def resolve_revenue_series(self, info, from_, to, granularity='day'):
+        return await sync_to_async(analytics.revenue_series)(
+            from_, to, getattr(granularity, 'value', granularity)
+        )
+
+    async def resolve_top_customers(self, info, by='revenue', limit=10, window=30):
+        return await sync_to_async(analytics.top_customers)(
+            getattr(by, 'value', by), limit, window
+        )
+
+
+class AsyncUpdateLowStockProducts(UpdateLowStockProducts):
+    class Meta:
+        name = 'UpdateLowStockProducts'
+
+    async def mutate(self, info, threshold=10, increment=10, ids=None):
+        if increment <= 0:
+            return AsyncUpdateLowStockProducts(
+                success=False,
+                message="increment must be a positive number",
+                updated_products=[]
+            )
+
+        products = project(Product.objects.all(), info, 'updatedProducts')
+        updated_count, updated_products = await sync_to_async(restock_low_stock)(
+            threshold, increment, ids, queryset=products
+        )
+
+        return AsyncUpdateLowStockProducts(
+            success=True,
+            message=f"Updated {updated_count} products",
+            updated_products=updated_products
+        )
+
+
+class AsyncBulkMutation:
+    """Runs a ``BulkMutation``'s transaction in a worker thread."""
+
+    @classmethod
+    async def mutate(cls, root, info, rows):
+        return await sync_to_async(cls.run)(rows)
+
+
+class AsyncBulkUpsertCustomers(AsyncBulkMutation, BulkUpsertCustomers):
+    class Meta:
+        name = 'BulkUpsertCustomers'
+
+
+class AsyncBulkUpsertProducts(AsyncBulkMutation, BulkUpsertProducts):
+    class Meta:
+        name = 'BulkUpsertProducts'
+
+
+class AsyncBulkCreateOrders(AsyncBulkMutation, BulkCreateOrders):
+    class Meta:
+        name = 'BulkCreateOrders'
+
+
+class AsyncMutation(graphene.ObjectType):
+    class Meta:
+        name = 'Mutation'
+
+    update_low_stock_products = AsyncUpdateLowStockProducts.Field()
+    bulk_upsert_customers = AsyncBulkUpsertCustomers.Field()
+    bulk_upsert_products = AsyncBulkUpsertProducts.Field()
+    bulk_create_orders = AsyncBulkCreateOrders.Field()
+
+
+schema = graphene.Schema(query=AsyncQuery, mutation=AsyncMutation)
@@ -0,0 +1,45 @@
+"""
+Walking GraphQL selection sets with fragments flattened.
+
+Shared by the cost analysis (``crm.cost``), replica routing and the
+response cache, which walk a whole document, and by ``crm.projection``,
+which walks the selection of the field being resolved.
+"""
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+def fragments_of(document):
+    """``{name: FragmentDefinitionNode}`` of ``document``'s fragments."""
+    return {
+        definition.name.value: definition
+        for definition in document.definitions
+        if definition.kind == 'fragment_definition'
+    }
+
+
+def flatten_fields(schema, fragments, parent_type, selection_set, seen_fragments=()):
+    """Yield ``(parent_type, field_node)`` of ``selection_set``, fragments flattened.
+
+    ``fragments`` maps fragment names to their definitions; spreads of
+    unknown fragments, and of fragments already being expanded, are skipped.
+    """
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield parent_type, selection
+        elif isinstance(selection, InlineFragmentNode):
+            fragment_type = parent_type
+            if selection.type_condition is not None:
+                fragment_type = schema.get_type(selection.type_condition.name.value)
+            yield from flatten_fields(
+                schema, fragments, fragment_type, selection.selection_set, seen_fragments
+            )
+        elif isinstance(selection, FragmentSpreadNode):
+            name = selection.name.value
+            fragment = fragments.get(name)
+            if fragment is None or name in seen_fragments:
+                continue
+            fragment_type = schema.get_type(fragment.type_condition.name.value)
+            yield from flatten_fields(
+                schema, fragments, fragment_type, fragment.selection_set,
+                seen_fragments + (name,)
+            )
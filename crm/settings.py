@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -83,6 +84,69 @@ DATABASES = {
     }
 }
 
+# Production SQLite profile (crm_app.db), on with CRM_SQLITE_PROFILE=production.
+# Off by default: under IMMEDIATE every atomic() block holds the write lock
+# until it ends, so long-running transactions block all writers.
+CRM_SQLITE_PROFILE = os.environ.get('CRM_SQLITE_PROFILE', 'default')
+CRM_SQLITE_PRODUCTION_DATABASE = {
+    # Keep connections (and their page caches) across requests.
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        # transaction.atomic() takes the write lock at BEGIN, so writers
+        # queue on busy_timeout instead of failing on lock upgrade.
+        # Needs Django 5.1 or later.
+        'transaction_mode': 'IMMEDIATE',
+    },
+}
+# Applied to every new SQLite connection by crm_app.db, in this order.
+CRM_SQLITE_PRODUCTION_PRAGMAS = {
+    'busy_timeout': 5000,           # ms to wait for a lock before "database is locked"
+    'journal_mode': 'WAL',          # readers do not block on writers (persists in the file)
+    'synchronous': 'NORMAL',        # fsync at checkpoints only; safe with WAL
+    'cache_size': -65536,           # 64 MiB page cache per connection
+    'mmap_size': 268435456,         # read through a 256 MiB memory map
+    'temp_store': 'MEMORY',         # sorts and temp b-trees in memory
+}
+CRM_SQLITE_PRAGMAS = {}
+if CRM_SQLITE_PROFILE == 'production':
+    DATABASES['default'].update(CRM_SQLITE_PRODUCTION_DATABASE)
+    CRM_SQLITE_PRAGMAS = CRM_SQLITE_PRODUCTION_PRAGMAS
+
+# Read replica (crm.routers): a copy of the database file that lag-tolerant
+# GraphQL queries read from, refreshed by
+# `python manage.py sync_replica`. Off unless CRM_REPLICA_DB names the file.
+DATABASE_ROUTERS = ['crm.routers.ReplicaRouter']
+CRM_REPLICA_ALIAS = 'replica'
+if os.environ.get('CRM_REPLICA_DB'):
+    DATABASES[CRM_REPLICA_ALIAS] = {
+        **DATABASES['default'],
+        'NAME': os.environ['CRM_REPLICA_DB'],
+        'TEST': {'MIRROR': 'default'},
+    }
+# After a mutation, the client's queries read default for this many seconds.
+# Keep it longer than the sync_replica interval.
+CRM_READ_YOUR_WRITES_SECONDS = 60
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'graphql': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'crm-graphql',
+        'TIMEOUT': 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+            'CULL_FREQUENCY': 3,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -130,6 +194,108 @@ GRAPHENE = {
     'SCHEMA': 'crm.schema.schema'
 }
 
+# Keyset pagination for the customers/products/orders connections
+CRM_DEFAULT_PAGE_SIZE = 50
+CRM_MAX_PAGE_SIZE = 500
+
+# Parsed/validated documents kept per process, and whether clients may send
+# only the sha256 of a query (Automatic Persisted Queries)
+CRM_DOCUMENT_CACHE_SIZE = 256
+CRM_PERSISTED_QUERIES = True
+
+# Static query budget checked before execution (see crm/cost.py). List
+# fields without a page size are costed as CRM_QUERY_COST_LIST_SIZE items.
+CRM_QUERY_MAX_DEPTH = 10
+CRM_QUERY_MAX_COST = 20000
+CRM_QUERY_COST_LIST_SIZE = 50
+
+# Opt-in cache of GraphQL query results, invalidated per model on writes
+# (crm/response_cache.py). TTL, size and eviction come from the cache alias;
+# use a file or redis backend when cron/Celery writers run in other
+# processes. None keeps the alias's own TIMEOUT.
+CRM_RESPONSE_CACHE_ENABLED = False
+CRM_RESPONSE_CACHE_ALIAS = 'graphql'
+CRM_RESPONSE_CACHE_TIMEOUT = None
+CRM_RESPONSE_CACHE_MAX_ENTRY_BYTES = 1024 * 1024
+
+# Prometheus metrics for /graphql, served from /metrics (crm.metrics).
+# CRM_METRICS_FIELDS adds per-field latency histograms; operation names
+# beyond CRM_METRICS_MAX_OPERATIONS are reported as "other".
+CRM_METRICS_ENABLED = False
+CRM_METRICS_FIELDS = True
+CRM_METRICS_MAX_OPERATIONS = 100
+
+# Requests to /graphql with an `X-CRM-Profile: <token>` header get a SQL,
+# EXPLAIN and resolver trace in extensions.profile (crm.profiling); add
+# `X-CRM-Profile-Sample: 1` for a sampled stack profile. Disabled when unset.
+CRM_PROFILE_TOKEN = os.environ.get('CRM_PROFILE_TOKEN')
+CRM_PROFILE_SAMPLE_INTERVAL = 0.001
+
+# Serve totalCustomers/totalOrders/totalRevenue from the CRMStats row kept
+# current by crm_app.signals instead of aggregating on every request.
+# Run `python manage.py refresh_crm_stats` after turning this on.
+CRM_PRECOMPUTED_STATS = False
+
+# Low stock restocking done by crm.cron.update_low_stock
+CRM_LOW_STOCK_THRESHOLD = 10
+CRM_LOW_STOCK_INCREMENT = 10
+
+# crm_app.reminders: orders reminded per run window and per chunk, and how
+# old an order must be before it is reminded (transactions still committing
+# are left for the next run).
+CRM_REMINDER_WINDOW_DAYS = 7
+CRM_REMINDER_CHUNK_SIZE = 500
+CRM_REMINDER_SETTLE_SECONDS = 60
+
+# crm_app.cleanup: inactive customers deleted per transaction, and the pause
+# between transactions that lets web requests take the write lock.
+CRM_CLEANUP_BATCH_SIZE = 500
+CRM_CLEANUP_PAUSE = 0.1
+
+# crm_app.rollups: rows rolled up per transaction, and how old a row must be
+# before it is rolled up (transactions still committing are left for later).
+CRM_ROLLUP_CHUNK_SIZE = 5000
+CRM_ROLLUP_SETTLE_SECONDS = 60
+
+# crm_app.analytics: longest revenueSeries range in days, and the largest
+# topCustomers limit.
+CRM_ANALYTICS_MAX_DAYS = 3660
+CRM_ANALYTICS_MAX_LIMIT = 100
+
+# crm_app.search: matches read from the full-text index and ranked per
+# searchCustomers/searchProducts query (the newest ones).
+CRM_SEARCH_MAX_CANDIDATES = 1000
+
+# crm_app.bulk: most rows one bulkUpsertCustomers/bulkUpsertProducts/
+# bulkCreateOrders call accepts, and rows per bulk_create/bulk_update.
+CRM_BULK_MAX_ROWS = 5000
+CRM_BULK_CHUNK_SIZE = 500
+
+# crm_app.transfer: rows fetched per cursor read by export_crm and /export,
+# and records per transaction in import_crm. /export streams to staff users
+# or to requests with `Authorization: Bearer <CRM_EXPORT_TOKEN>`.
+CRM_EXPORT_CHUNK_SIZE = 2000
+CRM_IMPORT_CHUNK_SIZE = 1000
+CRM_EXPORT_TOKEN = os.environ.get('CRM_EXPORT_TOKEN')
+
+# crm.joblog: where the cron and Celery jobs log, as "text" lines or "json"
+# objects. One background thread writes up to CRM_JOB_LOG_BATCH_SIZE records
+# per flush, at least every CRM_JOB_LOG_FLUSH_INTERVAL seconds. Files rotate
+# past CRM_JOB_LOG_MAX_BYTES or every CRM_JOB_LOG_ROTATE_SECONDS, keeping
+# CRM_JOB_LOG_BACKUP_COUNT old files.
+CRM_JOB_LOG_DIR = os.environ.get('CRM_JOB_LOG_DIR', '/tmp')
+CRM_JOB_LOG_FORMAT = os.environ.get('CRM_JOB_LOG_FORMAT', 'text')
+CRM_JOB_LOG_BATCH_SIZE = 500
+CRM_JOB_LOG_FLUSH_INTERVAL = 0.5
+CRM_JOB_LOG_MAX_BYTES = 10 * 1024 * 1024
+CRM_JOB_LOG_ROTATE_SECONDS = 7 * 86400
+CRM_JOB_LOG_BACKUP_COUNT = 8
+
+# Cron and Celery jobs run their GraphQL operations in-process (crm.executor).
+# Set a URL to send them to a running server instead.
+CRM_JOBS_GRAPHQL_URL = None
+CRM_JOBS_GRAPHQL_TIMEOUT = 30
+
 # Celery settings
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
@@ -1,59 +1,54 @@
-import datetime
-import requests
+import logging
+import time
 from celery import shared_task
-from datetime import datetime
+
+from crm import joblog
+from crm_app import rollups
+
+
+def format_delta(delta):
+    return 'n/a' if delta is None else f'{delta:+.1%}'
 
 
 @shared_task
 def generate_crm_report():
     """
-    Celery task to generate a weekly CRM report using GraphQL queries.
+    Celery task to generate a weekly CRM report from the daily rollups.
     Runs every Monday at 6:00 AM.
+
+    The rollups are first brought up to date incrementally, so the cost of
+    the report depends on the rows added since the last run, not on the
+    size of the Order table. The report is then read from the few rollup
+    rows just written on default; the replica is synced on its own schedule
+    and would lag behind them.
     """
+    log = joblog.get_logger('report')
+    start = time.perf_counter()
     try:
-        # GraphQL query to get CRM statistics
-        query = {
-            "query": """
-                query {
-                    totalCustomers
-                    totalOrders
-                    totalRevenue
-                }
-            """
-        }
-        
-        response = requests.post(
-            'http://localhost:8000/graphql',
-            json=query,
-            timeout=30
+        rollups.update()
+        report = rollups.weekly_report()
+
+        total_customers = report['customers']
+        total_orders = report['orders']
+        total_revenue = report['revenue']
+        deltas = report['deltas']
+        this_week = report['this_week']
+
+        # Log the report
+        log.event(
+            f"Report: {total_customers} customers, {total_orders} orders, "
+            f"{total_revenue} revenue; last 7 days: {this_week['new_customers']} new customers "
+            f"({format_delta(deltas['new_customers'])}), {this_week['orders']} orders "
+            f"({format_delta(deltas['orders'])}), {this_week['revenue']} revenue "
+            f"({format_delta(deltas['revenue'])})",
+            customers=total_customers, orders=total_orders, revenue=total_revenue,
+            this_week=this_week, deltas=deltas, duration_ms=joblog.elapsed_ms(start),
         )
-        
-        if response.status_code == 200:
-            data = response.json()
-            query_data = data.get('data', {})
-            
-            total_customers = query_data.get('totalCustomers', 0)
-            total_orders = query_data.get('totalOrders', 0)
-            total_revenue = query_data.get('totalRevenue', 0.0)
-            
-            # Generate timestamp in YYYY-MM-DD HH:MM:SS format
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Log the report
-            with open('/tmp/crm_report_log.txt', 'a') as f:
-                f.write(f"{timestamp} - Report: {total_customers} customers, {total_orders} orders, {total_revenue} revenue\n")
-            
-            return f"Report generated: {total_customers} customers, {total_orders} orders, {total_revenue} revenue"
-        else:
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            error_msg = f"GraphQL request failed with status: {response.status_code}"
-            with open('/tmp/crm_report_log.txt', 'a') as f:
-                f.write(f"{timestamp} - Error: {error_msg}\n")
-            return error_msg
-            
+
+        return f"Report generated: {total_customers} customers, {total_orders} orders, {total_revenue} revenue"
+
     except Exception as e:
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         error_msg = f"Error generating CRM report: {str(e)}"
-        with open('/tmp/crm_report_log.txt', 'a') as f:
-            f.write(f"{timestamp} - Error: {error_msg}\n")
+        log.event(f"Error: {error_msg}", level=logging.ERROR,
+                  duration_ms=joblog.elapsed_ms(start))
         return error_msg
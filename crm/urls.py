@@ -16,10 +16,16 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
+from crm.metrics import metrics_view
+from crm.views import AsyncCRMGraphQLView, CRMGraphQLView, document_cache_stats
+from crm_app.views import export_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('graphql', csrf_exempt(CRMGraphQLView.as_view(graphiql=True))),
+    path('graphql/async', csrf_exempt(AsyncCRMGraphQLView.as_view())),
+    path('graphql/document-cache', document_cache_stats),
+    path('metrics', metrics_view),
+    path('export', export_view),
 ]
@@ -0,0 +1,408 @@
+"""
+GraphQL view for ``/graphql``.
+
+Extends graphene-django's ``GraphQLView`` with a parsed-document cache,
+Automatic Persisted Queries, a static cost/depth budget, an opt-in
+result cache, opt-in Prometheus metrics, token-gated profiling and
+replica routing of lag-tolerant queries (``crm.routers``), and returns
+``ExecutionResult.extensions`` (including the computed cost) in the
+response body.
+"""
+import json
+from inspect import isawaitable
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import (
+    HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse,
+)
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import (
+    ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast,
+    parse, validate, validate_schema,
+)
+
+from crm import metrics, profiling, routers
+from crm.cost import analyze_query
+from crm.loaders import AsyncLoaders
+from crm.document_cache import document_cache, query_hash
+from crm.response_cache import response_cache
+from crm.schema_async import schema as async_schema
+
+
+class PersistedQueryNotFound(GraphQLError):
+    def __init__(self):
+        super().__init__(
+            'PersistedQueryNotFound',
+            extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'},
+        )
+
+
+class PreparedOperation:
+    """A validated, costed document ready to execute (or already answered)."""
+
+    def __init__(self, document=None, operation_ast=None, extensions=None):
+        self.document = document
+        self.operation_ast = operation_ast
+        self.extensions = extensions or {}
+        self.cache_key = None
+        self.done = False
+        self.result = None
+
+    @classmethod
+    def finished(cls, result):
+        return cls().finish(result)
+
+    def finish(self, result):
+        if result is not None and self.extensions:
+            result.extensions = {**(result.extensions or {}), **self.extensions}
+        self.result = result
+        self.done = True
+        return self
+
+
+class CRMGraphQLView(GraphQLView):
+    document_cache = document_cache
+
+    def get_persisted_query_hash(self, request, data):
+        """Return the APQ sha256 sent with the request, if any."""
+        if not getattr(settings, 'CRM_PERSISTED_QUERIES', True):
+            return None
+        extensions = request.GET.get('extensions') or data.get('extensions')
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest('Extensions are invalid JSON.'))
+        if not isinstance(extensions, dict):
+            return None
+        persisted = extensions.get('persistedQuery')
+        if not isinstance(persisted, dict):
+            return None
+        return persisted.get('sha256Hash')
+
+    def get_document(self, query, key):
+        """Parse and validate ``query``, reusing a cached document when possible.
+
+        Returns ``(document, errors)``.
+        """
+        document = self.document_cache.get(key)
+        if document is not None:
+            return document, None
+
+        try:
+            document = parse(query)
+        except Exception as e:
+            return None, [e]
+
+        validation_errors = validate(
+            self.schema.graphql_schema,
+            document,
+            self.validation_rules,
+            graphene_settings.MAX_VALIDATION_ERRORS,
+        )
+        if validation_errors:
+            return None, validation_errors
+
+        self.document_cache.put(key, document)
+        return document, None
+
+    def prepare_operation(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        """Everything that happens before execution, shared with the async view.
+
+        Returns a ``PreparedOperation``; when ``done`` is set its ``result``
+        is the response and the operation must not be executed.
+        """
+        persisted_hash = self.get_persisted_query_hash(request, data)
+
+        if not query and not persisted_hash:
+            if show_graphiql:
+                return PreparedOperation.finished(None)
+            raise HttpError(HttpResponseBadRequest('Must provide query string.'))
+
+        if query and persisted_hash and query_hash(query) != persisted_hash:
+            return PreparedOperation.finished(ExecutionResult(errors=[GraphQLError(
+                'provided sha does not match query',
+                extensions={'code': 'PERSISTED_QUERY_HASH_MISMATCH'},
+            )]))
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return PreparedOperation.finished(
+                ExecutionResult(data=None, errors=schema_validation_errors)
+            )
+
+        key = persisted_hash or query_hash(query)
+        if query:
+            document, errors = self.get_document(query, key)
+            if errors:
+                return PreparedOperation.finished(ExecutionResult(data=None, errors=errors))
+        else:
+            # Hash-only APQ request: the client resends the full text when
+            # it gets PersistedQueryNotFound back.
+            document = self.document_cache.get(key)
+            if document is None:
+                return PreparedOperation.finished(
+                    ExecutionResult(errors=[PersistedQueryNotFound()])
+                )
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == 'get'
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return PreparedOperation.finished(None)
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ['POST'],
+                    'Can only perform a {} operation from a POST request.'.format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        query_cost = analyze_query(schema, document, operation_name, variables)
+        prepared = PreparedOperation(document, operation_ast, {'cost': query_cost.as_dict()})
+        if query_cost.error is not None:
+            return prepared.finish(ExecutionResult(errors=[query_cost.error]))
+
+        if response_cache.enabled() and not getattr(request, 'crm_profiler', None):
+            plan = response_cache.plan(key, schema, document, operation_name)
+            if plan:
+                database = self.database_for(request, document, operation_ast)
+                prepared.cache_key = response_cache.entry_key(
+                    plan, operation_name, variables, database
+                )
+                data = response_cache.get(prepared.cache_key)
+                if data is not None:
+                    prepared.extensions['responseCache'] = 'HIT'
+                    return prepared.finish(ExecutionResult(data=data))
+                prepared.extensions['responseCache'] = 'MISS'
+
+        return prepared
+
+    def finish_operation(self, prepared, result):
+        if prepared.cache_key is not None and not result.errors:
+            response_cache.set(prepared.cache_key, result.data)
+        return prepared.finish(result).result
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        prepared = self.prepare_operation(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        if prepared.done:
+            return prepared.result
+
+        try:
+            result = self.execute_document(
+                request, prepared.document, prepared.operation_ast, variables,
+                operation_name
+            )
+        except Exception as e:
+            result = ExecutionResult(errors=[e])
+        return self.finish_operation(prepared, result)
+
+    def get_middleware(self, request):
+        middleware = super().get_middleware(request)
+        if metrics.fields_enabled():
+            middleware = [*(middleware or ()), metrics.field_middleware]
+        profiler = getattr(request, 'crm_profiler', None)
+        if profiler is not None:
+            middleware = [*(middleware or ()), profiler]
+        return middleware
+
+    def get_execute_options(self, request, variables, operation_name):
+        execute_options = {
+            'root_value': self.get_root_value(request),
+            'context_value': self.get_context(request),
+            'variable_values': variables,
+            'operation_name': operation_name,
+            'middleware': self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            execute_options['execution_context_class'] = self.execution_context_class
+        return execute_options
+
+    def database_for(self, request, document, operation_ast):
+        if operation_ast is not None and operation_ast.operation == OperationType.MUTATION:
+            request.crm_wrote = True
+        return routers.database_for(
+            self.schema.graphql_schema, document, operation_ast, request
+        )
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        if getattr(request, 'crm_wrote', False):
+            routers.pin(response)
+        return response
+
+    def execute_document(self, request, document, operation_ast, variables, operation_name):
+        with routers.use_database(self.database_for(request, document, operation_ast)):
+            return self._execute_document(
+                request, document, operation_ast, variables, operation_name
+            )
+
+    def _execute_document(self, request, document, operation_ast, variables, operation_name):
+        execute_options = self.get_execute_options(request, variables, operation_name)
+
+        if (
+            operation_ast is not None
+            and operation_ast.operation == OperationType.MUTATION
+            and (
+                graphene_settings.ATOMIC_MUTATIONS is True
+                or connection.settings_dict.get('ATOMIC_MUTATIONS', False) is True
+            )
+        ):
+            with transaction.atomic():
+                result = execute(self.schema.graphql_schema, document, **execute_options)
+                if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                    transaction.set_rollback(True)
+            return result
+
+        return execute(self.schema.graphql_schema, document, **execute_options)
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        profiler = profiling.profiler_for(request)
+        with metrics.track_operation(operation_name) as tracker:
+            if profiler is None:
+                execution_result = self.execute_graphql_request(
+                    request, data, query, variables, operation_name, show_graphiql
+                )
+            else:
+                with profiler:
+                    execution_result = self.execute_graphql_request(
+                        request, data, query, variables, operation_name, show_graphiql
+                    )
+                execution_result = profiler.attach(execution_result)
+            result, status_code = self.format_response(
+                request, execution_result, id, show_graphiql
+            )
+            tracker.finish(execution_result, result)
+        return result, status_code
+
+    def format_response(self, request, execution_result, id=None, show_graphiql=False):
+        """Return ``(json, status_code)`` for an execution result."""
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        if execution_result:
+            response = {}
+
+            if execution_result.errors:
+                set_rollback()
+                response['errors'] = [
+                    self.format_error(e) for e in execution_result.errors
+                ]
+
+            if execution_result.errors and any(
+                not getattr(e, 'path', None) for e in execution_result.errors
+            ):
+                status_code = 400
+            else:
+                response['data'] = execution_result.data
+
+            if execution_result.extensions:
+                response['extensions'] = execution_result.extensions
+
+            if self.batch:
+                response['id'] = id
+                response['status'] = status_code
+
+            result = self.json_encode(request, response, pretty=show_graphiql)
+        else:
+            result = None
+
+        return result, status_code
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """``/graphql/async``: the async schema executed on the event loop.
+
+    Shares the document cache, persisted queries, cost budget and response
+    cache with ``CRMGraphQLView``. GraphiQL, batching and
+    ``ATOMIC_MUTATIONS`` are not supported here.
+    """
+    schema = async_schema
+    view_is_async = True
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('schema', async_schema)
+        super().__init__(**kwargs)
+
+    def get_context(self, request):
+        request.loaders = AsyncLoaders()
+        return request
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ('get', 'post'):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ['GET', 'POST'], 'GraphQL only supports GET and POST requests.'
+                    )
+                )
+            data = self.parse_body(request)
+            result, status_code = await self.get_response_async(request, data)
+            response = HttpResponse(
+                status=status_code, content=result, content_type='application/json'
+            )
+            if getattr(request, 'crm_wrote', False):
+                routers.pin(response)
+            return response
+        except HttpError as e:
+            response = e.response
+            response['Content-Type'] = 'application/json'
+            response.content = self.json_encode(
+                request, {'errors': [self.format_error(e)]}
+            )
+            return response
+
+    async def get_response_async(self, request, data):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        with metrics.track_operation(operation_name, track_sql=False) as tracker:
+            result = await self.execute_graphql_request_async(
+                request, data, query, variables, operation_name
+            )
+            body, status_code = self.format_response(request, result, id)
+            tracker.finish(result, body)
+        return body, status_code
+
+    async def execute_graphql_request_async(self, request, data, query, variables,
+                                            operation_name):
+        prepared = self.prepare_operation(request, data, query, variables, operation_name)
+        if prepared.done:
+            return prepared.result
+
+        target = self.database_for(request, prepared.document, prepared.operation_ast)
+        try:
+            with routers.use_database(target):
+                result = execute(
+                    self.schema.graphql_schema, prepared.document,
+                    **self.get_execute_options(request, variables, operation_name)
+                )
+                if isawaitable(result):
+                    result = await result
+        except Exception as e:
+            result = ExecutionResult(errors=[e])
+        return self.finish_operation(prepared, result)
+
+
+def document_cache_stats(request):
+    """Hit/miss counters of this process's GraphQL document cache."""
+    return JsonResponse(document_cache.info())
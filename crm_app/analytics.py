@@ -0,0 +1,176 @@
+"""
+Time-series and ranking queries for the dashboard.
+
+Order counts and revenue over a time range are split where the rollups
+stop. Whole days before the day of the ``orders`` high-water mark come from
+``DailyRollup``, one row per day however many orders it had. The rest comes
+from a query on ``Order`` grouped by day, which only reads a range of the
+covering ``order_analytics_idx``. That rest is the partial days at the edges
+of the range plus the days not rolled up yet. With the rollups kept current
+by the weekly report or ``backfill_rollups``, it is a few days at most, so
+the cost does not grow with the order history.
+
+``top_customers`` has no precomputed form: it groups the orders of its
+window by customer, reading the same index range.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import rollups
+from .models import DailyRollup, Order
+
+CENTS = Decimal('0.01')
+GRANULARITIES = ('day', 'week', 'month')
+RANKINGS = ('revenue', 'orders')
+
+
+def get_max_days():
+    return getattr(settings, 'CRM_ANALYTICS_MAX_DAYS', 3660)
+
+
+def get_max_limit():
+    return getattr(settings, 'CRM_ANALYTICS_MAX_LIMIT', 100)
+
+
+def rollup_end():
+    """First day the rollups do not fully cover, or None before the first run."""
+    mark = rollups.get_marks().get('orders')
+    return rollups.day_of(mark[0]) if mark else None
+
+
+def _covered_days(first, last):
+    """``(first, end)``: the days in ``[first, last)`` to read from rollups."""
+    end = rollup_end()
+    if end is None or end <= first:
+        return first, first
+    return first, min(end, last)
+
+
+def _sql_days(start, end):
+    """``{day: (orders, revenue)}`` for orders placed in ``[start, end)``."""
+    rows = (
+        Order.objects.filter(order_date__gte=start, order_date__lt=end)
+        .annotate(day=TruncDate('order_date')).values('day')
+        .annotate(orders=Count('id'), revenue=Sum('total_amount')).order_by()
+    )
+    return {row['day']: (row['orders'], row['revenue']) for row in rows}
+
+
+def daily_totals(first_day, last_day):
+    """``{day: (orders, revenue)}`` for the days ``first_day..last_day``."""
+    first, end = _covered_days(first_day, last_day + timedelta(days=1))
+    days = {
+        row.day: (row.order_count, row.revenue)
+        for row in DailyRollup.objects.filter(day__gte=first, day__lt=end)
+    }
+    if end <= last_day:
+        days.update(_sql_days(rollups.day_bounds(end)[0], rollups.day_bounds(last_day)[1]))
+    return days
+
+
+def orders_between(start, end):
+    """``{'orders', 'revenue'}`` of orders placed in ``[start, end)``."""
+    first = rollups.day_of(start)
+    if rollups.day_bounds(first)[0] < start:
+        first += timedelta(days=1)
+    first, covered_end = _covered_days(first, max(first, rollups.day_of(end)))
+
+    orders, revenue = 0, Decimal('0')
+    if covered_end > first:
+        totals = DailyRollup.objects.filter(day__gte=first, day__lt=covered_end).aggregate(
+            orders=Sum('order_count'), revenue=Sum('revenue'),
+        )
+        orders, revenue = totals['orders'] or 0, totals['revenue'] or Decimal('0')
+        ranges = [(start, rollups.day_bounds(first)[0]),
+                  (rollups.day_bounds(covered_end)[0], end)]
+    else:
+        ranges = [(start, end)]
+    for range_start, range_end in ranges:
+        if range_start >= range_end:
+            continue
+        totals = Order.objects.filter(
+            order_date__gte=range_start, order_date__lt=range_end
+        ).aggregate(orders=Count('id'), revenue=Sum('total_amount'))
+        orders += totals['orders']
+        revenue += totals['revenue'] or Decimal('0')
+    return {'orders': orders, 'revenue': Decimal(revenue).quantize(CENTS)}
+
+
+def bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(start, granularity):
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def revenue_series(first_day, last_day, granularity='day'):
+    """Orders and revenue per day, week (from Monday) or month, zero-filled.
+
+    Both ends are inclusive; the first and last buckets only count the days
+    inside the range.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity {granularity!r}.")
+    if last_day < first_day:
+        raise ValueError('The range ends before it starts.')
+    if (last_day - first_day).days >= get_max_days():
+        raise ValueError(f'The range is longer than {get_max_days()} days.')
+
+    buckets = {}
+    start = bucket_start(first_day, granularity)
+    while start <= last_day:
+        buckets[start] = [0, Decimal('0')]
+        start = _next_bucket(start, granularity)
+    for day, (orders, revenue) in daily_totals(first_day, last_day).items():
+        bucket = buckets[bucket_start(day, granularity)]
+        bucket[0] += orders
+        bucket[1] += revenue or Decimal('0')
+    return [
+        {'start': start, 'orders': orders, 'revenue': Decimal(revenue).quantize(CENTS)}
+        for start, (orders, revenue) in buckets.items()
+    ]
+
+
+def top_customers(by='revenue', limit=10, window_days=30, now=None):
+    """Customers with the most revenue or orders in the last ``window_days``.
+
+    ``window_days=None`` ranks over all orders, which reads the whole index.
+    Rows are ``{'customer_id', 'orders', 'revenue'}``.
+    """
+    if by not in RANKINGS:
+        raise ValueError(f"Unknown ranking {by!r}.")
+    if not 0 < limit <= get_max_limit():
+        raise ValueError(f'limit must be between 1 and {get_max_limit()}.')
+    orders = Order.objects.all()
+    if window_days is not None:
+        if window_days <= 0:
+            raise ValueError('window must be a positive number of days.')
+        now = now or timezone.now()
+        # Bounded on both sides so SQLite picks the date range over a
+        # customer index walk that would avoid sorting the groups.
+        orders = orders.filter(
+            order_date__gte=now - timedelta(days=window_days), order_date__lte=now
+        )
+    other = 'orders' if by == 'revenue' else 'revenue'
+    rows = (
+        orders.values('customer_id')
+        .annotate(orders=Count('id'), revenue=Sum('total_amount'))
+        .order_by(f'-{by}', f'-{other}', 'customer_id')[:limit]
+    )
+    return [
+        {**row, 'revenue': Decimal(row['revenue']).quantize(CENTS)} for row in rows
+    ]
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CrmAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crm_app'
+
+    def ready(self):
+        from . import db, signals  # noqa: F401
+        signals.connect_optional_receivers()
@@ -0,0 +1,362 @@
+"""
+Bulk upserts of customers and products and bulk creation of orders.
+
+Each call takes up to ``CRM_BULK_MAX_ROWS`` rows (dicts of model field
+values) and writes them in one transaction, ``CRM_BULK_CHUNK_SIZE`` rows
+per ``bulk_create``/``bulk_update``:
+
+* customers are matched on ``email``; a match gets its name updated, a
+  new customer the given ``created_at`` (or now);
+* products are matched on ``name``; a match gets the given ``price`` and
+  ``stock`` (a new product needs a ``price``);
+* orders are always created, for the customer given by ``customer_id``
+  or ``customer_email``.
+
+A row that fails validation is reported in ``BulkResult.errors`` with its
+index and is skipped; the other rows are still written. Each chunk runs in
+a savepoint, and a chunk that hits a database error (a customer created
+concurrently with the same email, say) is retried row by row, so only the
+failing rows are reported. ``bulk_create`` and ``bulk_update`` bypass model
+signals, so the dashboard totals, cache tags and daily rollups are updated
+here; the search index triggers fire on their own.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import DatabaseError, connections, router, transaction
+from django.utils import timezone
+
+from . import cache_tags, rollups, stats
+from .models import Customer, Order, Product
+
+
+def get_max_rows():
+    return getattr(settings, 'CRM_BULK_MAX_ROWS', 5000)
+
+
+def get_chunk_size():
+    return getattr(settings, 'CRM_BULK_CHUNK_SIZE', 500)
+
+
+class RowError:
+    def __init__(self, index, field, messages):
+        self.index = index
+        self.field = field
+        self.messages = messages
+
+
+class BulkResult:
+    def __init__(self, size):
+        self.size = size
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.objects = {}  # row index -> saved instance
+        self.new = []      # the instances created
+
+    @property
+    def rows(self):
+        """The saved instance of every row in input order, None where it failed."""
+        return [self.objects.get(index) for index in range(self.size)]
+
+
+class Chunk:
+    """What writing one chunk did, merged into the result once it commits."""
+
+    def __init__(self):
+        self.created = {}
+        self.updated = {}
+        self.errors = []
+
+
+def _check_size(rows):
+    if len(rows) > get_max_rows():
+        raise ValueError(f"At most {get_max_rows()} rows per call; got {len(rows)}.")
+
+
+def _clean(instance, index, errors, exclude=()):
+    """Validate ``instance``'s fields, recording failures for row ``index``."""
+    try:
+        instance.clean_fields(exclude=exclude)
+    except ValidationError as error:
+        errors.extend(
+            RowError(index, field, messages) for field, messages in error.message_dict.items()
+        )
+        return False
+    return True
+
+
+def _chunks(items, chunk_size):
+    for start in range(0, len(items), chunk_size):
+        yield items[start:start + chunk_size]
+
+
+def _write(items, write, result):
+    """Run ``write(items)`` in a savepoint and merge its ``Chunk`` into ``result``.
+
+    After a database error the rows are retried one at a time, and a row
+    that still fails is reported with the database's message.
+    """
+    try:
+        with transaction.atomic():
+            chunk = write(items)
+    except DatabaseError as error:
+        if len(items) == 1:
+            result.errors.append(RowError(items[0][0], None, [str(error)]))
+            return
+        for item in items:
+            _write([item], write, result)
+        return
+    result.created += len(chunk.created)
+    result.updated += len(chunk.updated)
+    result.errors.extend(chunk.errors)
+    result.objects.update(chunk.created)
+    result.objects.update(chunk.updated)
+    result.new.extend(chunk.created.values())
+
+
+def _run(valid, write, result, chunk_size):
+    for items in _chunks(valid, chunk_size or get_chunk_size()):
+        _write(items, write, result)
+    result.errors.sort(key=lambda error: error.index)
+    return result
+
+
+def _update(model, instances, fields):
+    """Write ``fields`` of ``instances`` back to their rows.
+
+    On SQLite this is one ``UPDATE ... FROM (VALUES ...)`` statement:
+    ``bulk_update`` builds a ``CASE WHEN`` expression per row and column,
+    which costs several times the update itself.
+    """
+    instances = list(instances)
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor != 'sqlite' or connection.Database.sqlite_version_info < (3, 33):
+        model.objects.bulk_update(instances, fields)
+        return
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = [model._meta.get_field(name) for name in fields]
+    assignments = ', '.join(
+        f'{quote(column.column)} = v.column{i + 2}' for i, column in enumerate(columns)
+    )
+    row = '(' + ', '.join(['%s'] * (len(columns) + 1)) + ')'
+    size = max(connection.features.max_query_params // (len(columns) + 1), 1)
+    with connection.cursor() as cursor:
+        for start in range(0, len(instances), size):
+            batch = instances[start:start + size]
+            params = []
+            for instance in batch:
+                params.append(instance.pk)
+                params.extend(
+                    column.get_db_prep_save(getattr(instance, column.attname), connection)
+                    for column in columns
+                )
+            cursor.execute(
+                f"UPDATE {table} SET {assignments} FROM (VALUES {', '.join([row] * len(batch))})"
+                f" AS v WHERE {table}.{quote(model._meta.pk.column)} = v.column1",
+                params,
+            )
+
+
+def _settled_days(values):
+    """Days of ``values`` the rollups may already cover (see ``rollups.row_changed``)."""
+    cutoff = rollups.settle_cutoff()
+    return {rollups.day_of(value) for value in values if value < cutoff}
+
+
+def _first_of_key(index, key, field, seen, errors):
+    """Whether row ``index`` is the first with ``key``; later ones are errors."""
+    if key in seen:
+        errors.append(RowError(index, field, [f"Same {field} as row {seen[key]}."]))
+        return False
+    seen[key] = index
+    return True
+
+
+def upsert_customers(rows, chunk_size=None):
+    """Create or update customers by email; return a ``BulkResult``."""
+    _check_size(rows)
+    result = BulkResult(len(rows))
+    valid, seen = [], {}
+    for index, row in enumerate(rows):
+        customer = Customer(
+            name=(row.get('name') or '').strip(),
+            email=(row.get('email') or '').strip(),
+            created_at=row.get('created_at') or timezone.now(),
+        )
+        if not _clean(customer, index, result.errors):
+            continue
+        try:
+            validate_email(customer.email)
+        except ValidationError as error:
+            result.errors.append(RowError(index, 'email', error.messages))
+            continue
+        if _first_of_key(index, customer.email, 'email', seen, result.errors):
+            valid.append((index, customer))
+
+    def write(items):
+        chunk = Chunk()
+        existing = Customer.objects.in_bulk([c.email for _, c in items], field_name='email')
+        new, changed = [], []
+        for index, customer in items:
+            current = existing.get(customer.email)
+            if current is None:
+                new.append(customer)
+                chunk.created[index] = customer
+                continue
+            if current.name != customer.name:
+                current.name = customer.name
+                changed.append(current)
+            chunk.updated[index] = current
+        if new:
+            Customer.objects.bulk_create(new)
+            stats.apply_customer_delta(len(new))
+        if changed:
+            _update(Customer, changed, ['name'])
+        return chunk
+
+    with transaction.atomic():
+        _run(valid, write, result, chunk_size)
+        if result.created or result.updated:
+            cache_tags.invalidate(Customer)
+        rollups.refresh_days(customer_days=_settled_days(
+            customer.created_at for customer in result.new
+        ))
+    return result
+
+
+def upsert_products(rows, chunk_size=None):
+    """Create or update products by name; return a ``BulkResult``."""
+    _check_size(rows)
+    result = BulkResult(len(rows))
+    valid, seen = [], {}
+    for index, row in enumerate(rows):
+        product = Product(
+            name=(row.get('name') or '').strip(),
+            price=row.get('price'),
+            stock=row.get('stock'),
+        )
+        given = [field for field in ('price', 'stock') if row.get(field) is not None]
+        missing = {'price', 'stock'} - set(given)
+        if not _clean(product, index, result.errors, exclude=missing):
+            continue
+        if _first_of_key(index, product.name, 'name', seen, result.errors):
+            valid.append((index, (product, given)))
+
+    def write(items):
+        chunk = Chunk()
+        existing = defaultdict(list)
+        for product in Product.objects.filter(name__in=[p.name for _, (p, _) in items]):
+            existing[product.name].append(product)
+        new, changed, fields = [], {}, set()
+        for index, (product, given) in items:
+            matches = existing.get(product.name, [])
+            if len(matches) > 1:
+                chunk.errors.append(RowError(index, 'name', [
+                    f"{len(matches)} products are named {product.name!r}."
+                ]))
+            elif matches:
+                current = matches[0]
+                for field in given:
+                    if getattr(current, field) != getattr(product, field):
+                        setattr(current, field, getattr(product, field))
+                        fields.add(field)
+                        changed[current.pk] = current
+                chunk.updated[index] = current
+            elif 'price' not in given:
+                chunk.errors.append(RowError(index, 'price', ["A new product needs a price."]))
+            else:
+                if product.stock is None:
+                    product.stock = 0
+                new.append(product)
+                chunk.created[index] = product
+        if new:
+            Product.objects.bulk_create(new)
+        if changed:
+            _update(Product, changed.values(), sorted(fields))
+        return chunk
+
+    with transaction.atomic():
+        _run(valid, write, result, chunk_size)
+        if result.created or result.updated:
+            cache_tags.invalidate(Product)
+    return result
+
+
+def create_orders(rows, chunk_size=None):
+    """Create orders for existing customers; return a ``BulkResult``."""
+    _check_size(rows)
+    result = BulkResult(len(rows))
+    valid = []
+    for index, row in enumerate(rows):
+        customer_id, email = row.get('customer_id'), row.get('customer_email')
+        if (customer_id is None) == (email is None):
+            result.errors.append(RowError(
+                index, 'customer_id', ["Give a customer id or a customer email, not both."]
+            ))
+            continue
+        order = Order(
+            total_amount=row.get('total_amount'),
+            order_date=row.get('order_date') or timezone.now(),
+        )
+        if not _clean(order, index, result.errors, exclude=['customer']):
+            continue
+        if order.total_amount < 0:
+            result.errors.append(RowError(
+                index, 'total_amount', ["Ensure this value is greater than or equal to 0."]
+            ))
+            continue
+        if customer_id is not None:
+            try:
+                customer_id = int(customer_id)
+            except (TypeError, ValueError):
+                result.errors.append(RowError(
+                    index, 'customer_id', [f"{customer_id!r} is not a customer id."]
+                ))
+                continue
+        valid.append((index, (order, customer_id, email and email.strip())))
+
+    def write(items):
+        chunk = Chunk()
+        ids = set(Customer.objects.filter(
+            id__in=[customer_id for _, (_, customer_id, _) in items if customer_id is not None]
+        ).values_list('id', flat=True))
+        by_email = dict(Customer.objects.filter(
+            email__in=[email for _, (_, _, email) in items if email is not None]
+        ).values_list('email', 'id'))
+        new = []
+        for index, (order, customer_id, email) in items:
+            if email is not None:
+                customer_id = by_email.get(email)
+                if customer_id is None:
+                    chunk.errors.append(RowError(
+                        index, 'customer_email', [f"No customer with email {email!r}."]
+                    ))
+                    continue
+            elif customer_id not in ids:
+                chunk.errors.append(RowError(
+                    index, 'customer_id', [f"No customer with id {customer_id}."]
+                ))
+                continue
+            order.customer_id = customer_id
+            new.append(order)
+            chunk.created[index] = order
+        if new:
+            Order.objects.bulk_create(new)
+            stats.apply_order_delta(
+                len(new), sum((order.total_amount for order in new), Decimal('0'))
+            )
+        return chunk
+
+    with transaction.atomic():
+        _run(valid, write, result, chunk_size)
+        if result.created:
+            cache_tags.invalidate(Order)
+        rollups.refresh_days(order_days=_settled_days(
+            order.order_date for order in result.new
+        ))
+    return result
@@ -0,0 +1,59 @@
+"""
+Per-model version tags for caches that hold data read from ``crm_app``.
+
+Cached entries embed the current version of every model they were built
+from; bumping a model's version makes all of those entries unreachable at
+once, without having to find them. Versions live in the same cache alias as
+the entries, so any backend shared between processes (file, redis, ...)
+invalidates across processes too. ``crm_app.signals`` bumps the tags on
+model saves and deletes; code that writes with ``QuerySet.update``,
+``bulk_create`` or raw SQL must call ``invalidate`` itself.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+def enabled():
+    return getattr(settings, 'CRM_RESPONSE_CACHE_ENABLED', False)
+
+
+def get_cache():
+    return caches[getattr(settings, 'CRM_RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def tag_key(model):
+    return f'crm:tag:{model._meta.label_lower}'
+
+
+def versions(models):
+    """Current version of each model's tag, creating missing tags."""
+    cache = get_cache()
+    keys = {tag_key(model): model for model in models}
+    found = cache.get_many(list(keys))
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        # A tag that was evicted must not come back as an old version.
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return {keys[key]._meta.label_lower: found[key] for key in keys}
+
+
+def _bump(models):
+    get_cache().set_many(
+        {tag_key(model): time.time_ns() for model in models}, timeout=None
+    )
+
+
+def invalidate(*models):
+    """Drop every cached entry built from any of ``models``.
+
+    Bumped again on commit, so a reader that repopulates the cache from the
+    pre-commit state in between does not leave a stale entry behind.
+    """
+    if not enabled() or not models:
+        return
+    _bump(models)
+    transaction.on_commit(lambda: _bump(models))
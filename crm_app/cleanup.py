@@ -0,0 +1,170 @@
+"""
+Batched deletion of inactive customers (no orders since a cutoff).
+
+Customers are deleted ``CRM_CLEANUP_BATCH_SIZE`` at a time in ascending id
+order, each batch in its own short transaction, sleeping
+``CRM_CLEANUP_PAUSE`` seconds in between so other writers get the SQLite
+lock. Each batch deletes its customers' orders and then the customers with
+two raw ``DELETE ... WHERE id IN`` statements instead of letting Django
+collect every cascaded row in memory. Model signals do not fire on this
+path, so the batch applies their effects itself: dashboard totals, cache
+tags and the daily rollups of the days it deleted from.
+
+The ``customer_cleanup`` ``JobCheckpoint`` stores the cutoff, the ``days``
+it was computed from, the last id handled and the running count. An
+interrupted run resumes with the same cutoff where it stopped; resuming
+with a different ``days`` is refused rather than silently ignored.
+"""
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import cache_tags, rollups, stats
+from .models import Customer, JobCheckpoint, Order
+
+CHECKPOINT_NAME = 'customer_cleanup'
+
+
+def get_batch_size():
+    return getattr(settings, 'CRM_CLEANUP_BATCH_SIZE', 500)
+
+
+def get_pause():
+    return getattr(settings, 'CRM_CLEANUP_PAUSE', 0.1)
+
+
+def inactive_customers(cutoff, using=DEFAULT_DB_ALIAS):
+    recent = Order.objects.using(using).filter(order_date__gte=cutoff).values('customer_id')
+    return Customer.objects.using(using).exclude(id__in=recent)
+
+
+class CleanupResult:
+    def __init__(self, cutoff, customers=0, orders=0, batches=0, dry_run=False,
+                 resumed=False):
+        self.cutoff = cutoff
+        self.customers = customers
+        self.orders = orders
+        self.batches = batches
+        self.dry_run = dry_run
+        self.resumed = resumed
+
+
+def _delete_where_in(model, column, ids, using):
+    """``DELETE FROM model WHERE column IN ids``; return the rows deleted."""
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(model._meta.db_table)} "
+            f"WHERE {quote(column)} IN ({placeholders})",
+            ids,
+        )
+        return cursor.rowcount
+
+
+def delete_batch(ids, cutoff, using=DEFAULT_DB_ALIAS):
+    """Delete the still-inactive customers among ``ids``; return counts."""
+    with transaction.atomic(using=using):
+        # A customer may have ordered since the batch was selected.
+        ids = list(
+            inactive_customers(cutoff, using).filter(id__in=ids)
+            .values_list('id', flat=True)
+        )
+        if not ids:
+            return 0, 0
+        orders = Order.objects.using(using).filter(customer_id__in=ids)
+        totals = orders.aggregate(count=Count('id'), revenue=Sum('total_amount'))
+        order_days = {rollups.day_of(at) for at in orders.values_list('order_date', flat=True)}
+        customer_days = {
+            rollups.day_of(at) for at in
+            Customer.objects.using(using).filter(id__in=ids).values_list('created_at', flat=True)
+        }
+        order_count = _delete_where_in(Order, 'customer_id', ids, using)
+        customer_count = _delete_where_in(Customer, 'id', ids, using)
+
+        if order_count:
+            stats.apply_order_delta(
+                -order_count, -(totals['revenue'] or Decimal('0')), using=using
+            )
+        stats.apply_customer_delta(-customer_count, using=using)
+        cache_tags.invalidate(Customer, Order)
+        rollups.refresh_days(order_days, customer_days)
+    return customer_count, order_count
+
+
+def cleanup_inactive_customers(days=365, batch_size=None, pause=None, dry_run=False,
+                               restart=False, progress=None, using=DEFAULT_DB_ALIAS):
+    """Delete customers without orders in the last ``days`` days.
+
+    ``progress(result, remaining)`` is called after every batch. Raises
+    ``ValueError`` if an interrupted run with another ``days`` is pending.
+    """
+    batch_size = batch_size or get_batch_size()
+    pause = get_pause() if pause is None else pause
+
+    if dry_run:
+        cutoff = timezone.now() - timedelta(days=days)
+        candidates = inactive_customers(cutoff, using)
+        return CleanupResult(
+            cutoff,
+            customers=candidates.count(),
+            orders=Order.objects.using(using).filter(customer__in=candidates).count(),
+            dry_run=True,
+        )
+
+    checkpoint, _ = JobCheckpoint.objects.using(using).get_or_create(name=CHECKPOINT_NAME)
+    position = {} if restart else checkpoint.position or {}
+    cutoff = parse_datetime(position.get('cutoff') or '')
+    if cutoff is None:
+        cutoff = timezone.now() - timedelta(days=days)
+        position = {}
+    elif position.get('days', days) != days:
+        raise ValueError(
+            f"An interrupted cleanup with days={position['days']} (cutoff "
+            f"{cutoff.isoformat()}) is pending."
+        )
+    last_id = position.get('last_id', 0)
+    result = CleanupResult(
+        cutoff, customers=position.get('customers', 0), orders=position.get('orders', 0),
+        resumed=bool(position),
+    )
+    remaining = inactive_customers(cutoff, using).filter(id__gt=last_id).count()
+
+    while True:
+        ids = list(
+            inactive_customers(cutoff, using).filter(id__gt=last_id)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        customers, orders = delete_batch(ids, cutoff, using)
+        last_id = ids[-1]
+        result.customers += customers
+        result.orders += orders
+        result.batches += 1
+        remaining = max(remaining - len(ids), 0)
+        checkpoint.position = {
+            'cutoff': cutoff.isoformat(),
+            'days': days,
+            'last_id': last_id,
+            'customers': result.customers,
+            'orders': result.orders,
+        }
+        checkpoint.save(using=using, update_fields=['position', 'updated_at'])
+        if progress is not None:
+            progress(result, remaining)
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    checkpoint.position = {}
+    checkpoint.save(using=using, update_fields=['position', 'updated_at'])
+    return result
@@ -0,0 +1,48 @@
+"""
+SQLite connection tuning.
+
+Every new SQLite connection runs ``PRAGMA name = value`` for each entry of
+``CRM_SQLITE_PRAGMAS``, in order. The production profile in
+``crm.settings`` (``CRM_SQLITE_PROFILE=production``; off by default) puts
+the database in WAL mode, so readers keep reading the last committed
+snapshot while a cron job writes, and commits only fsync at checkpoints
+(``synchronous = NORMAL``). It also gives each connection a larger page
+cache and memory-mapped reads, and makes lock waits block for
+``busy_timeout`` milliseconds instead of failing at once.
+
+The profile reuses connections across requests (``CONN_MAX_AGE``), so the
+pragmas run once per connection, not once per request. The
+``transaction_mode = IMMEDIATE`` database option makes every
+``transaction.atomic`` block take the write lock at ``BEGIN``. A transaction
+that reads and then writes then waits its turn up front, instead of failing
+with "database is locked" when it tries to upgrade its lock.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def get_pragmas():
+    return getattr(settings, 'CRM_SQLITE_PRAGMAS', {})
+
+
+def read_pragmas(connection, names):
+    """Current values of the pragmas ``names`` on ``connection``."""
+    values = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = get_pragmas()
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
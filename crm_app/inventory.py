@@ -0,0 +1,37 @@
+"""Stock maintenance shared by the GraphQL mutations and the cron jobs."""
+from django.db import transaction
+from django.db.models import F
+
+from . import cache_tags
+from .models import Product
+
+
+def restock_low_stock(threshold=10, increment=10, ids=None, queryset=None):
+    """Add ``increment`` to the stock of every product below ``threshold``.
+
+    Returns ``(updated_count, products)`` with the products' new stock.
+    ``queryset`` (all products by default) shapes the products returned,
+    e.g. to load only the columns the caller reads.
+    """
+    low_stock_products = Product.objects.filter(stock__lt=threshold)
+    if ids is not None:
+        low_stock_products = low_stock_products.filter(id__in=ids)
+    if queryset is None:
+        queryset = Product.objects.all()
+
+    # One UPDATE ... SET stock = stock + n for the whole set, so a
+    # concurrent stock change is never overwritten by a stale value.
+    # The rows are read (and locked where the backend supports it) in the
+    # same transaction, so the reported rows are the ones updated.
+    with transaction.atomic():
+        products = list(
+            (queryset & low_stock_products).select_for_update().order_by('id')
+        )
+        updated_count = low_stock_products.update(stock=F('stock') + increment)
+        if updated_count:
+            cache_tags.invalidate(Product)
+
+    for product in products:
+        if 'stock' not in product.get_deferred_fields():
+            product.stock += increment
+    return updated_count, products
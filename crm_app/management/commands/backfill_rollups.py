@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from crm_app import rollups
+
+
+class Command(BaseCommand):
+    help = 'Roll up orders and new customers per day from the high-water marks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int,
+                            help='Rows rolled up per transaction (CRM_ROLLUP_CHUNK_SIZE)')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Drop the rollups and the marks and start from the first row')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            rollups.rebuild()
+
+        def progress(source, rows):
+            if options['verbosity'] >= 1:
+                self.stdout.write(f'{source}: {rows} rows rolled up')
+
+        counted = rollups.update(chunk_size=options['chunk_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rollups updated: {counted['orders']} orders, "
+            f"{counted['customers']} customers"
+        ))
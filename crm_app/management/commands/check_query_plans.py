@@ -0,0 +1,88 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from crm.pagination import KeysetPage, encode_cursor
+from crm_app.cleanup import inactive_customers
+from crm_app.search import RANK_KEYS, search
+from crm_app.models import Customer, Order, Product
+
+# "SCAN <table>" reads every row of the table, or of one of its indexes
+# ("SCAN <table> USING INDEX ..."); "SEARCH" seeks into an index. FTS5
+# tables show up as "SCAN <table> VIRTUAL TABLE INDEX ..." even when the
+# lookup is a MATCH.
+FULL_SCAN = re.compile(r'\bSCAN (\w+)\b(?! VIRTUAL TABLE)')
+
+
+def query_plans():
+    """``(label, queryset)`` for the queries behind each resolver and job."""
+    now = timezone.now()
+    week_ago = now - timedelta(days=7)
+    deep = {'after': encode_cursor([now.isoformat(), 1000000])}
+    return [
+        ('ordersLastWeek', Order.objects.filter(order_date__gte=week_ago)),
+        ('lowStockProducts', Product.objects.filter(stock__lt=10)),
+        ('customers(first, after)', KeysetPage(
+            Customer.objects.all(), ('created_at', 'id'), first=50, **deep).queryset),
+        ('customers(last, before)', KeysetPage(
+            Customer.objects.all(), ('created_at', 'id'), last=50,
+            before=deep['after']).queryset),
+        ('products(first, after)', KeysetPage(
+            Product.objects.all(), ('id',), first=50,
+            after=encode_cursor([1000000])).queryset),
+        ('orders(first, after)', KeysetPage(
+            Order.objects.all(), ('order_date', 'id'), first=50, **deep).queryset),
+        ('searchCustomers(q, first)', KeysetPage(
+            search(Customer, 'john smi'), RANK_KEYS, first=50).queryset),
+        ('searchProducts(q, first)', KeysetPage(
+            search(Product, 'lap'), RANK_KEYS, first=50).queryset),
+        ('Order.customer loader', Customer.objects.filter(id__in=[1, 2, 3])),
+        ('Customer.orderSet loader',
+         Order.objects.filter(customer_id__in=[1, 2, 3]).order_by('id')),
+        ('revenueBetween', Order.objects.filter(
+            order_date__gte=week_ago, order_date__lt=now).values('total_amount')),
+        ('ordersCount / revenueSeries (past rollups)',
+         Order.objects.filter(order_date__gte=week_ago, order_date__lt=now)
+         .annotate(day=TruncDate('order_date')).values('day')
+         .annotate(orders=Count('id'), revenue=Sum('total_amount')).order_by()),
+        ('topCustomers(window)', Order.objects.filter(
+            order_date__gte=week_ago, order_date__lte=now)
+         .values('customer_id').annotate(orders=Count('id'), revenue=Sum('total_amount'))
+         .order_by('-revenue', '-orders', 'customer_id')[:10]),
+        ('order reminders chunk', Order.objects.filter(
+            order_date__gte=week_ago, order_date__lte=now).order_by('order_date', 'id')
+         .values_list('id', 'order_date', 'customer__email')[:500]),
+        ('cleanup batch', inactive_customers(now - timedelta(days=365))
+         .filter(id__gt=0).order_by('id').values_list('id', flat=True)[:500]),
+        ('customer by email', Customer.objects.filter(email='john@example.com')),
+        ('product by name', Product.objects.filter(name='Laptop')),
+        ('bulk customer upsert lookup',
+         Customer.objects.filter(email__in=['a@example.com', 'b@example.com'])),
+        ('bulk product upsert lookup', Product.objects.filter(name__in=['Laptop', 'Mouse'])),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Print EXPLAIN QUERY PLAN for the hot queries and fail on full scans'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('check_query_plans reads SQLite query plans only.')
+
+        regressions = []
+        for label, queryset in query_plans():
+            plan = queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(plan)
+            scanned = FULL_SCAN.findall(plan)
+            if scanned:
+                regressions.append(f"{label}: full scan of {', '.join(scanned)}")
+
+        if regressions:
+            raise CommandError('Query plan regressions:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No full scans.'))
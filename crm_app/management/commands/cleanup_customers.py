@@ -1,32 +1,64 @@
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
-from crm_app.models import Customer, Order
-import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from crm import joblog
+from crm_app import cleanup
 
 
 class Command(BaseCommand):
     help = 'Clean up inactive customers (customers with no orders in the last year)'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365,
+                            help='Delete customers without orders in this many days')
+        parser.add_argument('--batch-size', type=int,
+                            help='Customers deleted per transaction (CRM_CLEANUP_BATCH_SIZE)')
+        parser.add_argument('--sleep', type=float,
+                            help='Seconds to pause between batches (CRM_CLEANUP_PAUSE)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be deleted')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore the checkpoint of an interrupted run')
+
     def handle(self, *args, **options):
-        # Find customers with no orders in the last year
-        one_year_ago = timezone.now() - timedelta(days=365)
-        customers_with_recent_orders = Order.objects.filter(
-            order_date__gte=one_year_ago
-        ).values_list('customer_id', flat=True).distinct()
-
-        inactive_customers = Customer.objects.exclude(
-            id__in=customers_with_recent_orders
-        )
+        if options['dry_run']:
+            result = cleanup.cleanup_inactive_customers(days=options['days'], dry_run=True)
+            self.stdout.write(
+                f'Would delete {result.customers} inactive customers '
+                f'and {result.orders} orders'
+            )
+            return
 
-        # Count and delete inactive customers
-        count = inactive_customers.count()
-        inactive_customers.delete()
+        def progress(result, remaining):
+            if options['verbosity'] >= 1:
+                self.stdout.write(
+                    f'Batch {result.batches}: deleted {result.customers} customers '
+                    f'and {result.orders} orders, {remaining} remaining'
+                )
+
+        start = time.perf_counter()
+        try:
+            result = cleanup.cleanup_inactive_customers(
+                days=options['days'],
+                batch_size=options['batch_size'],
+                pause=options['sleep'],
+                restart=options['restart'],
+                progress=progress,
+            )
+        except ValueError as e:
+            raise CommandError(f'{e} Pass the same --days to resume it, or --restart.')
+        count = result.customers
+        if result.resumed:
+            self.stdout.write(
+                f'Resumed the interrupted run with cutoff {result.cutoff.isoformat()}'
+            )
 
         # Log the result
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with open('/tmp/customer_cleanup_log.txt', 'a') as f:
-            f.write(f"{timestamp} - Deleted {count} inactive customers\n")
+        joblog.get_logger('cleanup').event(
+            f"Deleted {count} inactive customers",
+            rows=count, orders=result.orders, batches=result.batches,
+            duration_ms=joblog.elapsed_ms(start),
+        )
 
         self.stdout.write(
             self.style.SUCCESS(f'Successfully deleted {count} inactive customers')
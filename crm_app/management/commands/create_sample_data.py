@@ -1,5 +1,7 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
 from crm_app.models import Customer, Product, Order
+from crm_app.synthetic import PROFILES, SyntheticGenerator
 from decimal import Decimal
 from django.utils import timezone
 from datetime import timedelta
@@ -9,7 +11,28 @@ import random
 class Command(BaseCommand):
     help = 'Create sample data for testing the CRM system'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=0,
+                            help='Generate this many synthetic customers')
+        parser.add_argument('--products', type=int, default=0,
+                            help='Generate this many synthetic products')
+        parser.add_argument('--orders', type=int, default=0,
+                            help='Generate this many synthetic orders')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed; the same seed gives the same data')
+        parser.add_argument('--profile', choices=sorted(PROFILES), default='sample',
+                            help='Distribution of order dates')
+        parser.add_argument('--anchor',
+                            help='ISO datetime the dates count back from (default: today 00:00 UTC)')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Rows per bulk insert and transaction')
+
     def handle(self, *args, **options):
+        if options['customers'] or options['products'] or options['orders']:
+            return self.generate(options)
+
+        rng = random.Random(options['seed'])
+
         # Create customers
         customers_data = [
             {'name': 'John Doe', 'email': 'john@example.com'},
@@ -53,19 +76,19 @@ class Command(BaseCommand):
 
         # Create orders
         for i in range(10):
-            customer = random.choice(customers)
+            customer = rng.choice(customers)
             # Create orders from different time periods
             if i < 3:
                 # Recent orders (last week)
-                order_date = timezone.now() - timedelta(days=random.randint(1, 7))
+                order_date = timezone.now() - timedelta(days=rng.randint(1, 7))
             elif i < 6:
                 # Older orders (last month)
-                order_date = timezone.now() - timedelta(days=random.randint(8, 30))
+                order_date = timezone.now() - timedelta(days=rng.randint(8, 30))
             else:
                 # Very old orders (more than a year)
-                order_date = timezone.now() - timedelta(days=random.randint(365, 500))
+                order_date = timezone.now() - timedelta(days=rng.randint(365, 500))
 
-            total_amount = Decimal(str(random.uniform(50, 500)))
+            total_amount = Decimal(str(round(rng.uniform(50, 500), 2)))
             
             order, created = Order.objects.get_or_create(
                 customer=customer,
@@ -79,3 +102,48 @@ class Command(BaseCommand):
         self.stdout.write(
             self.style.SUCCESS('Successfully created sample data')
         )
+
+
+    def generate(self, options):
+        anchor = None
+        if options['anchor']:
+            anchor = parse_datetime(options['anchor'])
+            if anchor is None:
+                raise CommandError(f"Invalid --anchor {options['anchor']!r}")
+            if timezone.is_naive(anchor):
+                anchor = timezone.make_aware(anchor)
+
+        generator = SyntheticGenerator(
+            seed=options['seed'],
+            profile=options['profile'],
+            anchor=anchor,
+            chunk_size=options['chunk_size'],
+        )
+
+        def progress(label, report):
+            if options['verbosity'] >= 2:
+                self.stdout.write(
+                    f"{label}: {report.counts[label]} rows, {report.rate(label):,.0f} rows/s"
+                )
+
+        try:
+            report = generator.generate(
+                customers=options['customers'],
+                products=options['products'],
+                orders=options['orders'],
+                progress=progress,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for label in ('customers', 'products', 'orders'):
+            if report.counts.get(label):
+                self.stdout.write(
+                    f"Created {report.counts[label]} {label} "
+                    f"in {report.seconds[label]:.2f}s ({report.rate(label):,.0f} rows/s)"
+                )
+        rate = report.total / report.total_seconds if report.total_seconds else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully generated {report.total} rows "
+            f"in {report.total_seconds:.2f}s ({rate:,.0f} rows/s)"
+        ))
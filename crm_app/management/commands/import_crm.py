@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm_app import transfer
+
+
+class Command(BaseCommand):
+    help = 'Import customers, products and orders from an NDJSON or CSV export'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to read, or - for standard input')
+        parser.add_argument('--format', choices=tuple(transfer.FORMATS),
+                            help='Defaults to csv for a .csv file, else ndjson')
+        parser.add_argument('--chunk-size', type=int,
+                            help='Records per transaction (CRM_IMPORT_CHUNK_SIZE)')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore the checkpoint of an interrupted import')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        start = time.perf_counter()
+
+        def progress(result):
+            if options['verbosity'] >= 1:
+                rate = (result.records - result.resumed_from) / (time.perf_counter() - start)
+                self.stdout.write(
+                    f'{result.records} records: {result.created} created, '
+                    f'{result.updated} updated, {result.errors} failed ({rate:.0f}/s)'
+                )
+
+        if path == '-':
+            # Standard input cannot be reread, so it is not checkpointed.
+            result = transfer.import_records(sys.stdin, fmt, chunk_size=options['chunk_size'],
+                                             progress=progress)
+        else:
+            if not os.path.exists(path):
+                raise CommandError(f'{path} does not exist.')
+            # A file that changed size since the checkpoint starts over.
+            source = f'{os.path.abspath(path)}:{os.path.getsize(path)}'
+            with open(path, newline='', encoding='utf-8') as stream:
+                result = transfer.import_records(
+                    stream, fmt, source=source, chunk_size=options['chunk_size'],
+                    restart=options['restart'], progress=progress,
+                )
+
+        if result.resumed_from:
+            self.stdout.write(f'Resumed after record {result.resumed_from}')
+        for message in result.messages:
+            self.stderr.write(message)
+        if result.errors > len(result.messages):
+            self.stderr.write(
+                f'{result.errors - len(result.messages)} more failed records not shown'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.records} records: {result.created} created, '
+            f'{result.updated} updated, {result.errors} failed'
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from crm_app import search
+from crm_app.models import Customer, Product
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the customer and product full-text search indexes from their tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', choices=('customers', 'products'),
+                            help='Rebuild one index only')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The search indexes are SQLite FTS5 tables.')
+        models = {'customers': [Customer], 'products': [Product]}.get(options['only'])
+        for table, seconds in search.rebuild(models).items():
+            self.stdout.write(self.style.SUCCESS(f'{table} rebuilt in {seconds:.2f}s'))
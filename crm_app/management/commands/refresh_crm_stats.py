@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from crm_app import stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed dashboard totals from the tables'
+
+    def handle(self, *args, **options):
+        totals = stats.recompute()
+        self.stdout.write(self.style.SUCCESS(
+            f"Stats refreshed: {totals['customers']} customers, "
+            f"{totals['orders']} orders, {totals['revenue']} revenue"
+        ))
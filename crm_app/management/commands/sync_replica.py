@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm import routers
+
+
+class Command(BaseCommand):
+    help = 'Copy the default database over the read replica with the SQLite backup API'
+
+    def handle(self, *args, **options):
+        try:
+            seconds = routers.sync_replica()
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'Replica {routers.replica_alias()} synced in {seconds:.2f}s'
+        ))
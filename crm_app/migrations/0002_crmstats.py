@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CRMStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_count', models.BigIntegerField(default=0)),
+                ('order_count', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'CRM stats',
+            },
+        ),
+    ]
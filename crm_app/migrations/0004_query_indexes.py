@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:30
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_emails(apps, schema_editor):
+    Customer = apps.get_model('crm_app', 'Customer')
+    duplicates = list(
+        Customer.objects.using(schema_editor.connection.alias)
+        .values('email').annotate(n=Count('id')).filter(n__gt=1)
+        .values_list('email', flat=True)[:10]
+    )
+    if duplicates:
+        raise RuntimeError(
+            'Customer.email is becoming unique; merge or remove the customers '
+            'sharing these emails first: ' + ', '.join(duplicates)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm_app', '0003_jobcheckpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customer',
+            name='email',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['created_at', 'id'], name='customer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_date', 'id'], name='order_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'order_date'], name='order_customer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name'], name='product_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__lt', 10)), fields=['stock'], name='product_low_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm_app', '0004_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customer',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='order_date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
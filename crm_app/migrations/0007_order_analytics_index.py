@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm_app', '0006_dailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_date', 'customer', 'total_amount'], name='order_analytics_idx'),
+        ),
+    ]
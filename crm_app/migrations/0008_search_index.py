@@ -0,0 +1,52 @@
+from django.db import migrations
+
+# table -> (FTS5 index, indexed columns); see crm_app.search.
+INDEXES = {
+    'crm_app_customer': ('crm_app_customer_search', ('name', 'email')),
+    'crm_app_product': ('crm_app_product_search', ('name',)),
+}
+
+
+def index_sql(table, index, columns):
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    delete = f"INSERT INTO {index}({index}, rowid, {names}) VALUES ('delete', old.id, {old});"
+    insert = f"INSERT INTO {index}(rowid, {names}) VALUES (new.id, {new});"
+    return [
+        f"CREATE VIRTUAL TABLE {index} USING fts5({names}, content='{table}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')",
+        f"CREATE TRIGGER {index}_insert AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER {index}_delete AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER {index}_update AFTER UPDATE OF {names} ON {table} "
+        f"BEGIN {delete} {insert} END",
+        f"INSERT INTO {index}({index}) VALUES ('rebuild')",
+    ]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, (index, columns) in INDEXES.items():
+        for sql in index_sql(table, index, columns):
+            schema_editor.execute(sql)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for index, _ in INDEXES.values():
+        for suffix in ('insert', 'delete', 'update'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {index}_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm_app', '0007_order_analytics_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
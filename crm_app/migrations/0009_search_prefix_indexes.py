@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:12
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm_app', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='customer_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='customer_email_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='product_name_lower_idx'),
+        ),
+    ]
@@ -1,11 +1,22 @@
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 
 class Customer(models.Model):
     name = models.CharField(max_length=100)
-    email = models.CharField(max_length=100)
-    created_at = models.DateTimeField(auto_now_add=True)
+    email = models.CharField(max_length=100, unique=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Keyset order of the `customers` connection.
+            models.Index(fields=['created_at', 'id'], name='customer_created_idx'),
+            # Name and email prefix candidates of searchCustomers.
+            models.Index(Lower('name'), name='customer_name_lower_idx'),
+            models.Index(Lower('email'), name='customer_email_lower_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -15,6 +26,19 @@ class Product(models.Model):
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name'], name='product_name_idx'),
+            # Name prefix candidates of searchProducts.
+            models.Index(Lower('name'), name='product_name_lower_idx'),
+            # Only low-stock rows (lowStockProducts, the default restock
+            # threshold) are indexed by stock.
+            models.Index(
+                fields=['stock'], name='product_low_stock_idx',
+                condition=models.Q(stock__lt=10),
+            ),
+        ]
     
     def __str__(self):
         return self.name
@@ -22,8 +46,71 @@ class Product(models.Model):
 
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
-    order_date = models.DateTimeField(auto_now_add=True)
+    order_date = models.DateTimeField(default=timezone.now)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order_date', 'id'], name='order_date_idx'),
+            models.Index(fields=['customer', 'order_date'], name='order_customer_date_idx'),
+            # Covers the analytics range scans (crm_app.analytics) without
+            # reading the table.
+            models.Index(fields=['order_date', 'customer', 'total_amount'],
+                         name='order_analytics_idx'),
+        ]
     
     def __str__(self):
         return f"Order {self.id} - {self.customer.name}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What a later save changes, for crm_app.signals, without re-reading.
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values)
+            if name in ('total_amount', 'order_date')
+        }
+        return instance
+
+
+class CRMStats(models.Model):
+    """Single-row running totals for the dashboard.
+
+    Only maintained when ``CRM_PRECOMPUTED_STATS`` is enabled; see
+    ``crm_app.stats``.
+    """
+    customer_count = models.BigIntegerField(default=0)
+    order_count = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'CRM stats'
+
+    def __str__(self):
+        return f"{self.customer_count} customers, {self.order_count} orders"
+
+
+class JobCheckpoint(models.Model):
+    """Where a resumable background job left off, keyed by job name."""
+    name = models.CharField(max_length=100, unique=True)
+    position = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class DailyRollup(models.Model):
+    """Orders, revenue and new customers per day; see ``crm_app.rollups``."""
+    day = models.DateField(unique=True)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    new_customers = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['day']
+
+    def __str__(self):
+        return f"{self.day}: {self.order_count} orders, {self.revenue} revenue"
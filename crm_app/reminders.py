@@ -0,0 +1,103 @@
+"""
+Order reminders for recent orders, streamed in keyset-ordered chunks.
+
+Orders placed in the last ``CRM_REMINDER_WINDOW_DAYS`` days are read
+``CRM_REMINDER_CHUNK_SIZE`` at a time, ordered by ``(order_date, id)``,
+with the customer's email joined in, so memory stays bounded however many
+orders there are. Each chunk is logged to the ``reminders`` job log and
+flushed to disk (``crm.joblog.flush``), and then the ``order_reminders``
+``JobCheckpoint`` records the last order sent. A run
+that is interrupted resumes after that order, and a rerun over the same
+window skips the orders that were already reminded. If the process dies
+between the write and the checkpoint, the chunk is sent again; reminders
+are never lost. Orders younger than ``CRM_REMINDER_SETTLE_SECONDS`` are
+left for the next run, so an order whose transaction commits late cannot
+land behind the checkpoint.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from crm import joblog
+
+from .models import JobCheckpoint, Order
+
+CHECKPOINT_NAME = 'order_reminders'
+
+
+def get_chunk_size():
+    return getattr(settings, 'CRM_REMINDER_CHUNK_SIZE', 500)
+
+
+def get_window():
+    return timedelta(days=getattr(settings, 'CRM_REMINDER_WINDOW_DAYS', 7))
+
+
+def get_settle_time():
+    return timedelta(seconds=getattr(settings, 'CRM_REMINDER_SETTLE_SECONDS', 60))
+
+
+def iter_chunks(since, until, after=None, chunk_size=None):
+    """Yield lists of ``(id, order_date, email)`` placed in ``[since, until]``.
+
+    ``after`` is the ``(order_date, id)`` of the last order already handled.
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    queryset = (
+        Order.objects.filter(order_date__gte=since, order_date__lte=until)
+        .order_by('order_date', 'id')
+        .values_list('id', 'order_date', 'customer__email')
+    )
+    while True:
+        page = queryset
+        if after is not None:
+            order_date, pk = after
+            page = page.filter(
+                Q(order_date__gt=order_date) | Q(order_date=order_date, id__gt=pk)
+            )
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        after = chunk[-1][1], chunk[-1][0]
+
+
+def load_position(checkpoint, since):
+    """The checkpoint's ``(order_date, id)`` if it falls inside the window."""
+    position = checkpoint.position or {}
+    order_date = parse_datetime(position.get('order_date') or '')
+    if order_date is None or order_date < since:
+        return None
+    return order_date, position['id']
+
+
+def format_reminder(order_id, email):
+    return f"Order reminder: Order ID {order_id}, Customer: {email}"
+
+
+def send_order_reminders(log_path=None, now=None, chunk_size=None, reset=False):
+    """Log reminders for orders not yet reminded; return how many were sent.
+
+    ``log_path`` overrides the ``reminders`` job log file.
+    """
+    now = now or timezone.now()
+    since = now - get_window()
+    checkpoint, _ = JobCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+    after = None if reset else load_position(checkpoint, since)
+
+    log = joblog.get_logger('reminders', log_path)
+    sent = 0
+    for chunk in iter_chunks(since, now - get_settle_time(), after, chunk_size):
+        for order_id, _, email in chunk:
+            log.event(format_reminder(order_id, email), order_id=order_id, email=email)
+        joblog.flush()
+        order_id, order_date, _ = chunk[-1]
+        checkpoint.position = {'order_date': order_date.isoformat(), 'id': order_id}
+        checkpoint.save(update_fields=['position', 'updated_at'])
+        sent += len(chunk)
+    return sent
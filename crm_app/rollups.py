@@ -0,0 +1,243 @@
+"""
+Daily rollups of orders, revenue and new customers.
+
+``update`` walks ``Order`` by ``(order_date, id)`` and ``Customer`` by
+``(created_at, id)`` from the high-water marks stored in the
+``daily_rollups`` ``JobCheckpoint``, ``CRM_ROLLUP_CHUNK_SIZE`` rows at a
+time. It adds each chunk to its days' ``DailyRollup`` rows and advances
+the mark in the same transaction, so every row is counted exactly once
+however often the job is interrupted. Rows newer than
+``CRM_ROLLUP_SETTLE_SECONDS`` are left for the next run, so a transaction
+that commits late cannot slip in behind the mark.
+
+Rows written behind the mark are handled by recomputing their days, but
+only up to the mark. Such rows are backdated inserts, edits, deletes,
+cleanup batches and bulk loads. Model signals cover ORM saves and
+deletes through ``row_changed``, which collects the days and recomputes
+them once when the transaction commits, so a cascade over many orders
+costs one refresh. Bulk paths call ``refresh_days`` themselves.
+"""
+from collections import defaultdict
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+from threading import local
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Customer, DailyRollup, JobCheckpoint, Order
+
+CHECKPOINT_NAME = 'daily_rollups'
+CENTS = Decimal('0.01')
+
+# Days changed by this thread's writes and not refreshed yet.
+_pending = local()
+
+# source -> (model, the date field it is rolled up by)
+SOURCES = {
+    'orders': (Order, 'order_date'),
+    'customers': (Customer, 'created_at'),
+}
+
+
+def get_chunk_size():
+    return getattr(settings, 'CRM_ROLLUP_CHUNK_SIZE', 5000)
+
+
+def settle_cutoff():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'CRM_ROLLUP_SETTLE_SECONDS', 60))
+
+
+def day_of(value):
+    return timezone.localtime(value).date()
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, dt_time.min))
+    return start, start + timedelta(days=1)
+
+
+def load_marks(checkpoint):
+    """``{source: (datetime, id)}`` for the sources rolled up so far."""
+    marks = {}
+    for source, mark in (checkpoint.position or {}).items():
+        marks[source] = (parse_datetime(mark['at']), mark['id'])
+    return marks
+
+
+def get_marks():
+    checkpoint = JobCheckpoint.objects.filter(name=CHECKPOINT_NAME).first()
+    return load_marks(checkpoint) if checkpoint else {}
+
+
+def _after(field, mark):
+    at, pk = mark
+    return Q(**{f'{field}__gt': at}) | Q(**{field: at, 'id__gt': pk})
+
+
+def _up_to(field, mark):
+    at, pk = mark
+    return Q(**{f'{field}__lt': at}) | Q(**{field: at, 'id__lte': pk})
+
+
+def _add(day, **amounts):
+    updated = DailyRollup.objects.filter(day=day).update(
+        **{name: F(name) + amount for name, amount in amounts.items()}
+    )
+    if not updated:
+        DailyRollup.objects.create(day=day, **amounts)
+
+
+def _advance(source, chunk_size, until):
+    """Roll up the next chunk of ``source``; return how many rows it had."""
+    model, field = SOURCES[source]
+    with transaction.atomic():
+        checkpoint, _ = JobCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+        checkpoint = JobCheckpoint.objects.select_for_update().get(pk=checkpoint.pk)
+        marks = load_marks(checkpoint)
+        queryset = model.objects.filter(**{f'{field}__lt': until})
+        if source in marks:
+            queryset = queryset.filter(_after(field, marks[source]))
+        columns = ['id', field] + (['total_amount'] if source == 'orders' else [])
+        rows = list(queryset.order_by(field, 'id').values_list(*columns)[:chunk_size])
+        if not rows:
+            return 0
+
+        per_day = defaultdict(lambda: [0, Decimal('0')])
+        for row in rows:
+            totals = per_day[day_of(row[1])]
+            totals[0] += 1
+            if source == 'orders':
+                totals[1] += row[2]
+        for day, (count, revenue) in per_day.items():
+            if source == 'orders':
+                _add(day, order_count=count, revenue=revenue)
+            else:
+                _add(day, new_customers=count)
+
+        last_id, last_at = rows[-1][0], rows[-1][1]
+        checkpoint.position = {
+            **(checkpoint.position or {}),
+            source: {'at': last_at.isoformat(), 'id': last_id},
+        }
+        checkpoint.save(update_fields=['position', 'updated_at'])
+    return len(rows)
+
+
+def update(chunk_size=None, progress=None):
+    """Roll up everything older than the settle window; return rows counted.
+
+    ``progress(source, rows_so_far)`` is called after every chunk.
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    until = settle_cutoff()
+    counted = {}
+    for source in SOURCES:
+        counted[source] = 0
+        while True:
+            rows = _advance(source, chunk_size, until)
+            counted[source] += rows
+            if rows and progress is not None:
+                progress(source, counted[source])
+            if rows < chunk_size:
+                break
+    return counted
+
+
+def rebuild():
+    """Drop every rollup and the marks; the next ``update`` starts over."""
+    with transaction.atomic():
+        DailyRollup.objects.all().delete()
+        JobCheckpoint.objects.filter(name=CHECKPOINT_NAME).delete()
+
+
+def refresh_days(order_days=(), customer_days=()):
+    """Recompute the given days from the tables, up to the high-water marks."""
+    marks = get_marks()
+    with transaction.atomic():
+        if 'orders' in marks:
+            mark = marks['orders']
+            for day in sorted(set(order_days)):
+                if day > day_of(mark[0]):
+                    continue
+                start, end = day_bounds(day)
+                totals = Order.objects.filter(
+                    _up_to('order_date', mark), order_date__gte=start, order_date__lt=end
+                ).aggregate(count=Count('id'), revenue=Sum('total_amount'))
+                DailyRollup.objects.update_or_create(day=day, defaults={
+                    'order_count': totals['count'],
+                    'revenue': totals['revenue'] or Decimal('0'),
+                })
+        if 'customers' in marks:
+            mark = marks['customers']
+            for day in sorted(set(customer_days)):
+                if day > day_of(mark[0]):
+                    continue
+                start, end = day_bounds(day)
+                count = Customer.objects.filter(
+                    _up_to('created_at', mark), created_at__gte=start, created_at__lt=end
+                ).count()
+                DailyRollup.objects.update_or_create(day=day, defaults={'new_customers': count})
+
+
+def _refresh_pending():
+    days = getattr(_pending, 'days', None)
+    if not days:
+        return
+    _pending.days = None
+    refresh_days(order_days=days['orders'], customer_days=days['customers'])
+
+
+def row_changed(source, *values):
+    """A row dated ``values`` was written; refresh its days on commit."""
+    # Rows inside the settle window cannot be behind the mark yet.
+    cutoff = settle_cutoff()
+    days = {day_of(value) for value in values if value is not None and value < cutoff}
+    if not days:
+        return
+    pending = getattr(_pending, 'days', None)
+    if pending is None:
+        pending = _pending.days = {'orders': set(), 'customers': set()}
+    pending[source].update(days)
+    # Registered per row: the first callback to run refreshes every pending
+    # day, the rest find nothing left. Days from a rolled-back transaction
+    # are refreshed with the next commit, which is harmless.
+    transaction.on_commit(_refresh_pending)
+
+
+def summarize(start, end):
+    """Totals of the rollups for days in ``[start, end)``."""
+    totals = DailyRollup.objects.filter(day__gte=start, day__lt=end).aggregate(
+        orders=Sum('order_count'), revenue=Sum('revenue'), new_customers=Sum('new_customers'),
+    )
+    return {
+        'orders': totals['orders'] or 0,
+        'revenue': (totals['revenue'] or Decimal('0')).quantize(CENTS),
+        'new_customers': totals['new_customers'] or 0,
+    }
+
+
+def _delta(current, previous):
+    if not previous:
+        return None
+    return float((Decimal(current) - Decimal(previous)) / Decimal(previous))
+
+
+def weekly_report(today=None):
+    """Lifetime totals plus the last 7 days against the 7 before them."""
+    today = today or timezone.localdate()
+    week_start = today - timedelta(days=7)
+    this_week = summarize(week_start, today)
+    last_week = summarize(week_start - timedelta(days=7), week_start)
+    lifetime = summarize(datetime.min.date(), datetime.max.date())
+    return {
+        'customers': lifetime['new_customers'],
+        'orders': lifetime['orders'],
+        'revenue': lifetime['revenue'],
+        'this_week': this_week,
+        'last_week': last_week,
+        'deltas': {key: _delta(this_week[key], last_week[key]) for key in this_week},
+    }
@@ -0,0 +1,162 @@
+"""
+Word and prefix search over customers and products.
+
+On SQLite each model has an FTS5 index: ``crm_app_customer_search`` (name,
+email) and ``crm_app_product_search`` (name). Both are external-content
+tables over the model tables. Triggers (migration 0008) keep them in sync
+on every write path, bulk inserts and the cleanup's raw deletes included.
+``rebuild_search_index`` rebuilds them from the tables. A migration that
+makes Django remake ``crm_app_customer`` or ``crm_app_product`` (SQLite
+``ALTER`` support) drops the triggers and must recreate them.
+
+A query is split into words. Every word must match an indexed word, and
+the last one also matches as a prefix, since it may still be being typed.
+``ann smi`` finds "Ann Smith"; ``synthetic-1-42`` finds
+``synthetic-1-42@example.com``. Prefixes of two to four letters have their
+own index, and a single trailing letter only matches whole words. A longer
+last word is searched as a whole word when that alone yields
+``CRM_SEARCH_MAX_CANDIDATES`` matches. This avoids expanding a prefix that
+most rows share.
+
+FTS5's bm25 rank counts every row containing each word, which takes tens
+of milliseconds for a word found in most of a million rows. Instead,
+candidates are ranked by how the query matches them: the whole name, a
+prefix of the name, a prefix of the email, then anything else
+(``search_rank``, lower is better). The candidates are the newest
+``CRM_SEARCH_MAX_CANDIDATES`` matches read from the index in rowid order,
+plus up to as many rows whose name or email starts with the query, read
+from the ``Lower`` indexes of those columns (migration 0009). So the best
+matches are found however old they are. Connections page over
+``(search_rank, id)``. A query matching more rows than that only sees the
+newest of the rest and should be narrowed.
+"""
+import re
+import time
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower
+
+from .models import Customer, Product
+
+# model -> (FTS5 table, indexed columns in rank order)
+INDEXES = {
+    Customer: ('crm_app_customer_search', ('name', 'email')),
+    Product: ('crm_app_product_search', ('name',)),
+}
+RANK_KEYS = ('search_rank', 'id')
+# Prefix lengths with their own index (migration 0008).
+PREFIX_LENGTHS = (2, 3, 4)
+WORD = re.compile(r'\w+')
+# Ranges of the characters that end a word for the index's tokenizer, in a
+# lowercased column: ASCII spaces and punctuation.
+SEPARATOR_RANGES = (('\x00', '0'), (':', 'a'), ('{', '\x80'))
+
+
+def get_max_candidates():
+    return getattr(settings, 'CRM_SEARCH_MAX_CANDIDATES', 1000)
+
+
+def match_expression(q, prefix=True):
+    """The FTS5 query for ``q``: quoted words, the last one as a prefix."""
+    words = WORD.findall(q.lower())
+    if not words:
+        raise ValueError('Search for at least one letter or digit.')
+    terms = [f'"{word}"' for word in words]
+    if prefix and len(words[-1]) > 1:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _candidates(table, q, expression, cursor):
+    """The MATCH expression to read candidates with."""
+    if len(WORD.findall(q.lower())[-1]) <= max(PREFIX_LENGTHS):
+        return expression
+    # A prefix longer than the prefix index merges the row lists of every
+    # word it matches before the LIMIT applies. When the whole word alone
+    # already fills the candidates, use it and skip that merge.
+    exact = match_expression(q, prefix=False)
+    cursor.execute(
+        f'SELECT count(*) FROM (SELECT rowid FROM {table} WHERE {table} MATCH %s LIMIT %s)',
+        (exact, get_max_candidates()),
+    )
+    return exact if cursor.fetchone()[0] >= get_max_candidates() else expression
+
+
+def _starting_with(model, column, q, whole_word):
+    """Querysets of the ids of rows whose ``column`` starts with ``q``.
+
+    Range scans of the column's ``Lower`` index (migration 0009), each
+    reading at most ``CRM_SEARCH_MAX_CANDIDATES`` ids: the rows equal to
+    ``q``, and the longer ones. With ``whole_word`` the last word of ``q``
+    has to end where the column's word does, as it does in the index.
+    """
+    key = q.lower()
+    rows = model.objects.alias(search_key=Lower(column)).order_by()
+    if whole_word:
+        longer = reduce(or_, (
+            Q(search_key__gte=key + low, search_key__lt=key + high)
+            for low, high in SEPARATOR_RANGES
+        ))
+    else:
+        longer = Q(search_key__gt=key, search_key__lt=key + '\U0010ffff')
+    return [
+        rows.filter(search_key=key).values('id')[:get_max_candidates()],
+        rows.filter(longer).values('id')[:get_max_candidates()],
+    ]
+
+
+def search(model, q):
+    """``model`` rows matching ``q``, annotated with their ``search_rank``."""
+    table, columns = INDEXES[model]
+    text = q.strip()
+    expression = match_expression(text)
+    connection = connections[router.db_for_read(model)]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            expression = _candidates(table, text, expression, cursor)
+        parts = [
+            f'SELECT rowid FROM (SELECT rowid FROM {table} WHERE {table} MATCH %s '
+            f'ORDER BY rowid DESC LIMIT %s)'
+        ]
+        params = [expression, get_max_candidates()]
+        # A row starting with the query matches it and ranks first, so it
+        # is a candidate however old it is.
+        for column in columns:
+            for queryset in _starting_with(model, column, text,
+                                           whole_word=not expression.endswith('*')):
+                sql, query_params = queryset.query.get_compiler(connection=connection).as_sql()
+                parts.append(f'SELECT * FROM ({sql})')
+                params += query_params
+        rows = model.objects.filter(id__in=RawSQL(' UNION '.join(parts), params))
+    else:
+        # No FTS5 index elsewhere; fine for development databases only.
+        rows = model.objects.filter(*(
+            reduce(or_, (Q(**{f'{column}__icontains': word}) for column in columns))
+            for word in WORD.findall(text)
+        ))
+    ranks = [When(**{f'{columns[0]}__iexact': text}, then=Value(0))]
+    ranks += [
+        When(**{f'{column}__istartswith': text}, then=Value(i + 1))
+        for i, column in enumerate(columns)
+    ]
+    return rows.annotate(search_rank=Case(
+        *ranks, default=Value(len(columns) + 1), output_field=IntegerField(),
+    ))
+
+
+def rebuild(models=None, using='default'):
+    """Rebuild and optimize the indexes; return ``{table: seconds}``."""
+    timings = {}
+    with connections[using].cursor() as cursor:
+        for model in models or INDEXES:
+            table, _ = INDEXES[model]
+            start = time.perf_counter()
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+            timings[table] = time.perf_counter() - start
+    return timings
@@ -0,0 +1,132 @@
+"""
+Keep derived data current on model writes.
+
+The stats receivers are only connected while ``CRM_PRECOMPUTED_STATS`` is
+enabled, and the cache tag receivers while ``CRM_RESPONSE_CACHE_ENABLED``
+is (see ``connect_optional_receivers``), so saves and deletes do not pay for
+features that are off. Daily rollups only need a refresh when a row behind
+their high-water mark changes, which ``rollups.row_changed`` checks without
+a query for rows dated now; the refresh runs once per transaction.
+"""
+from decimal import Decimal
+
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache_tags, rollups, stats
+from .models import Customer, Order, Product
+
+
+@receiver(pre_save, sender=Order)
+def remember_previous_order(sender, instance, raw=False, using=None, **kwargs):
+    if raw or instance._state.adding:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    if 'total_amount' in loaded and 'order_date' in loaded:
+        previous = loaded['total_amount'], loaded['order_date']
+    else:
+        # Built by hand or loaded with deferred fields: read what is stored.
+        previous = (
+            Order.objects.using(using).filter(pk=instance.pk)
+            .values_list('total_amount', 'order_date').first()
+        )
+    if previous is not None:
+        instance._previous_total_amount, instance._previous_order_date = previous
+
+
+@receiver(post_save, sender=Order)
+def reset_loaded_order(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._loaded_values = {
+            'total_amount': Decimal(str(instance.total_amount)),
+            'order_date': instance.order_date,
+        }
+
+
+def order_saved(sender, instance, created, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    amount = Decimal(str(instance.total_amount))
+    if created:
+        stats.apply_order_delta(1, amount, using=using)
+        return
+    previous = getattr(instance, '_previous_total_amount', None)
+    if previous is not None and previous != amount:
+        stats.apply_order_delta(0, amount - previous, using=using)
+
+
+def order_deleted(sender, instance, using=None, **kwargs):
+    stats.apply_order_delta(-1, -Decimal(str(instance.total_amount)), using=using)
+
+
+def customer_saved(sender, instance, created, raw=False, using=None, **kwargs):
+    if created and not raw:
+        stats.apply_customer_delta(1, using=using)
+
+
+def customer_deleted(sender, instance, using=None, **kwargs):
+    stats.apply_customer_delta(-1, using=using)
+
+
+@receiver(post_save, sender=Order)
+def order_saved_rollups(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rollups.row_changed(
+            'orders', instance.order_date, getattr(instance, '_previous_order_date', None)
+        )
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted_rollups(sender, instance, **kwargs):
+    rollups.row_changed('orders', instance.order_date)
+
+
+@receiver(post_save, sender=Customer)
+def customer_saved_rollups(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        rollups.row_changed('customers', instance.created_at)
+
+
+@receiver(post_delete, sender=Customer)
+def customer_deleted_rollups(sender, instance, **kwargs):
+    rollups.row_changed('customers', instance.created_at)
+
+
+def invalidate_cache_tags(sender, raw=False, **kwargs):
+    if not raw:
+        cache_tags.invalidate(sender)
+
+
+STATS_RECEIVERS = (
+    (post_save, Order, order_saved),
+    (post_delete, Order, order_deleted),
+    (post_save, Customer, customer_saved),
+    (post_delete, Customer, customer_deleted),
+)
+
+CACHE_TAG_RECEIVERS = tuple(
+    (signal, model, invalidate_cache_tags)
+    for model in (Customer, Product, Order)
+    for signal in (post_save, post_delete)
+)
+
+
+def _connect(receivers, enabled):
+    for signal, sender, handler in receivers:
+        if enabled:
+            signal.connect(handler, sender=sender)
+        else:
+            signal.disconnect(handler, sender=sender)
+
+
+def connect_optional_receivers():
+    """Connect the stats and cache tag receivers whose feature is enabled."""
+    _connect(STATS_RECEIVERS, stats.precomputed_enabled())
+    _connect(CACHE_TAG_RECEIVERS, cache_tags.enabled())
+
+
+@receiver(setting_changed)
+def feature_setting_changed(setting, **kwargs):
+    if setting in ('CRM_PRECOMPUTED_STATS', 'CRM_RESPONSE_CACHE_ENABLED'):
+        connect_optional_receivers()
@@ -0,0 +1,123 @@
+"""
+Dashboard totals (customers, orders, revenue, average order value).
+
+``live_totals`` aggregates in the database with a single statement. When
+``CRM_PRECOMPUTED_STATS`` is enabled, ``CRMStats`` holds a running copy of
+the same numbers that the signal handlers in ``crm_app.signals`` adjust on
+every ``Customer``/``Order`` write, so reading them never scans a table.
+Bulk operations that bypass model signals must call ``apply_order_delta`` /
+``apply_customer_delta`` themselves, or ``recompute`` afterwards.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS, router
+from django.db.models import F, Sum
+
+from .models import CRMStats, Customer, Order
+
+STATS_PK = 1
+CENTS = Decimal('0.01')
+
+
+def precomputed_enabled():
+    return getattr(settings, 'CRM_PRECOMPUTED_STATS', False)
+
+
+def _to_decimal(value):
+    if value is None:
+        return Decimal('0.00')
+    return Decimal(str(value)).quantize(CENTS)
+
+
+def _totals(customers, orders, revenue):
+    average = (revenue / orders).quantize(CENTS) if orders else Decimal('0.00')
+    return {
+        'customers': customers,
+        'orders': orders,
+        'revenue': revenue,
+        'average_order_value': average,
+    }
+
+
+def live_totals(using=DEFAULT_DB_ALIAS):
+    """Count customers and orders and sum revenue in one round trip."""
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    sql = (
+        f"SELECT (SELECT COUNT(*) FROM {quote(Customer._meta.db_table)}), "
+        f"COUNT(*), SUM({quote('total_amount')}) "
+        f"FROM {quote(Order._meta.db_table)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        customers, orders, revenue = cursor.fetchone()
+    return _totals(customers, orders, _to_decimal(revenue))
+
+
+def recompute(using=DEFAULT_DB_ALIAS):
+    """Rebuild the stats row from the tables and return the totals."""
+    totals = live_totals(using)
+    CRMStats.objects.using(using).update_or_create(
+        pk=STATS_PK,
+        defaults={
+            'customer_count': totals['customers'],
+            'order_count': totals['orders'],
+            'revenue': totals['revenue'],
+        },
+    )
+    return totals
+
+
+def stored_totals(using=DEFAULT_DB_ALIAS):
+    """Read the precomputed row, building it on first use."""
+    row = CRMStats.objects.using(using).filter(pk=STATS_PK).first()
+    if row is None:
+        # Only default builds the row; a replica gets it with its next sync.
+        return recompute(using) if using == DEFAULT_DB_ALIAS else live_totals(using)
+    return _totals(row.customer_count, row.order_count, _to_decimal(row.revenue))
+
+
+def get_totals(using=None):
+    """The totals, from ``using`` or else the database ``Order`` is read from."""
+    using = using or router.db_for_read(Order)
+    if precomputed_enabled():
+        return stored_totals(using)
+    return live_totals(using)
+
+
+def apply_order_delta(count, revenue, using=DEFAULT_DB_ALIAS):
+    if not precomputed_enabled():
+        return
+    updated = CRMStats.objects.using(using).filter(pk=STATS_PK).update(
+        order_count=F('order_count') + count,
+        revenue=F('revenue') + revenue,
+    )
+    if not updated:
+        recompute(using)
+
+
+def apply_customer_delta(count, using=DEFAULT_DB_ALIAS):
+    if not precomputed_enabled():
+        return
+    updated = CRMStats.objects.using(using).filter(pk=STATS_PK).update(
+        customer_count=F('customer_count') + count,
+    )
+    if not updated:
+        recompute(using)
+
+
+def revenue_between(start, end, using=None):
+    """Revenue of orders placed in ``[start, end)``."""
+    total = Order.objects.using(using).filter(
+        order_date__gte=start, order_date__lt=end
+    ).aggregate(total=Sum('total_amount'))['total']
+    return _to_decimal(total)
+
+
+async def arevenue_between(start, end, using=None):
+    """``revenue_between`` using the async ORM."""
+    total = (await Order.objects.using(using).filter(
+        order_date__gte=start, order_date__lt=end
+    ).aaggregate(total=Sum('total_amount')))['total']
+    return _to_decimal(total)
@@ -0,0 +1,163 @@
+"""
+Deterministic synthetic CRM data for load testing and benchmarks.
+
+Rows are generated from one ``random.Random(seed)`` and dated relative to
+a fixed ``anchor`` (midnight UTC today unless given), so the same seed,
+sizes, profile and anchor always give the same dataset. Rows are written
+with ``bulk_create`` ``chunk_size`` at a time, each chunk in its own
+transaction, and only one chunk of model instances is in memory at a time.
+``bulk_create`` bypasses model signals, so the dashboard totals and cache
+tags are updated per chunk here, and the daily rollups of every day written
+to are refreshed once at the end.
+"""
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import transaction
+
+from . import cache_tags, rollups, stats
+from .models import Customer, Order, Product
+
+CENTS = Decimal('0.01')
+SPAN_DAYS = 730
+
+
+def _sample(rng):
+    # The mix create_sample_data has always produced: last week, last
+    # month, and orders old enough for the inactive-customer cleanup.
+    bucket = rng.random()
+    if bucket < 0.3:
+        return timedelta(days=rng.uniform(0, 7))
+    if bucket < 0.6:
+        return timedelta(days=rng.uniform(8, 30))
+    return timedelta(days=rng.uniform(365, 500))
+
+
+def _uniform(rng):
+    return timedelta(days=rng.uniform(0, SPAN_DAYS))
+
+
+def _recent(rng):
+    # Exponential decay with a 30 day mean: most orders are recent.
+    return timedelta(days=min(rng.expovariate(1 / 30), SPAN_DAYS))
+
+
+# Date-distribution profiles: each returns how long before the anchor an
+# order was placed.
+PROFILES = {
+    'sample': _sample,
+    'uniform': _uniform,
+    'recent': _recent,
+}
+
+
+def default_anchor():
+    now = datetime.now(dt_timezone.utc)
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class GenerationReport:
+    def __init__(self):
+        self.counts = {}
+        self.seconds = {}
+
+    def add(self, label, count, seconds):
+        self.counts[label] = self.counts.get(label, 0) + count
+        self.seconds[label] = self.seconds.get(label, 0) + seconds
+
+    def rate(self, label):
+        seconds = self.seconds.get(label, 0)
+        return self.counts.get(label, 0) / seconds if seconds else 0.0
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    @property
+    def total_seconds(self):
+        return sum(self.seconds.values())
+
+
+class SyntheticGenerator:
+    def __init__(self, seed=0, profile='sample', anchor=None, chunk_size=5000):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile {profile!r}; choose from {', '.join(PROFILES)}.")
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.offset = PROFILES[profile]
+        self.anchor = anchor or default_anchor()
+        self.chunk_size = chunk_size
+        self.report = GenerationReport()
+        self.days = {'orders': set(), 'customers': set()}
+
+    def email(self, i):
+        return f'synthetic-{self.seed}-{i}@example.com'
+
+    def _write(self, label, model, count, make_row, progress):
+        """Insert ``count`` rows built by ``make_row(i)``; return customer ids."""
+        customer_ids = []
+        for chunk in self._chunks(count):
+            start = time.perf_counter()
+            rows = [make_row(i) for i in chunk]
+            with transaction.atomic():
+                created = model.objects.bulk_create(rows)
+                if model is Customer:
+                    stats.apply_customer_delta(len(created))
+                    self.days['customers'].update(rollups.day_of(c.created_at) for c in created)
+                elif model is Order:
+                    revenue = sum((order.total_amount for order in created), Decimal('0'))
+                    stats.apply_order_delta(len(created), revenue)
+                    self.days['orders'].update(rollups.day_of(o.order_date) for o in created)
+                cache_tags.invalidate(model)
+            self.report.add(label, len(created), time.perf_counter() - start)
+            if model is Customer:
+                customer_ids.extend(customer.pk for customer in created)
+            if progress is not None:
+                progress(label, self.report)
+        return customer_ids
+
+    def _chunks(self, count):
+        for start in range(0, count, self.chunk_size):
+            yield range(start, min(start + self.chunk_size, count))
+
+    def _customer(self, i):
+        return Customer(
+            name=f'Customer {i}',
+            email=self.email(i),
+            created_at=self.anchor - _uniform(self.rng),
+        )
+
+    def _product(self, i):
+        return Product(
+            name=f'Product {self.seed}-{i}',
+            price=Decimal(str(round(self.rng.uniform(1, 2000), 2))).quantize(CENTS),
+            stock=self.rng.randint(0, 100),
+        )
+
+    def _order(self, i):
+        return Order(
+            customer_id=self.rng.choice(self.customer_ids),
+            order_date=self.anchor - self.offset(self.rng),
+            total_amount=Decimal(str(round(self.rng.uniform(5, 500), 2))).quantize(CENTS),
+        )
+
+    def generate(self, customers=0, products=0, orders=0, progress=None):
+        """Create the rows and return a ``GenerationReport``.
+
+        ``progress(label, report)`` is called after every chunk.
+        """
+        if customers and Customer.objects.filter(email=self.email(0)).exists():
+            raise ValueError(
+                f"Customers for seed {self.seed} already exist; use another seed."
+            )
+        self.customer_ids = self._write('customers', Customer, customers, self._customer, progress)
+        if orders and not self.customer_ids:
+            self.customer_ids = list(Customer.objects.order_by('id').values_list('id', flat=True))
+            if not self.customer_ids:
+                raise ValueError('Orders need at least one customer.')
+        self._write('products', Product, products, self._product, progress)
+        self._write('orders', Order, orders, self._order, progress)
+        rollups.refresh_days(self.days['orders'], self.days['customers'])
+        return self.report
@@ -1,7 +1,7 @@
 from django.test import TestCase
 
 # Create your tests here.
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client
 from django.utils import timezone
 from datetime import datetime, timedelta
 from crm_app.models import Customer, Product, Order
@@ -9,6 +9,7 @@ from django.core.management import call_command
 import json
 import os
 import tempfile
+from io import StringIO
 
 class CRMModelsTest(TestCase):
     def setUp(self):
@@ -100,7 +101,7 @@ class CronJobsTest(TestCase):
         initial_count = Customer.objects.count()
         
         # Run the cleanup command
-        call_command('cleanup_customers')
+        call_command('cleanup_customers', stdout=StringIO())
         
         # Verify customers without recent orders are cleaned up
         final_count = Customer.objects.count()
@@ -129,4 +130,1872 @@ class CronScriptsTest(TestCase):
             'crm/cron_jobs/order_reminders_crontab.txt'
         ]
         for file_path in files:
-            self.assertTrue(os.path.exists(file_path))
\ No newline at end of file
+            self.assertTrue(os.path.exists(file_path))
+
+class QueryBatchingTest(TestCase):
+    def setUp(self):
+        for i in range(3):
+            customer = Customer.objects.create(
+                name=f"Batch Customer {i}",
+                email=f"batch{i}@example.com"
+            )
+            for _ in range(2):
+                Order.objects.create(customer=customer, total_amount=10)
+
+    def execute(self, query):
+        from types import SimpleNamespace
+        from crm.schema import schema
+        result = schema.execute(query, context_value=SimpleNamespace())
+        self.assertIsNone(result.errors)
+        return result.data
+
+    def test_orders_customer_is_one_query_per_level(self):
+        """Orders and their customers load with one joined query"""
+        with self.assertNumQueries(1):
+            data = self.execute(
+                '{ orders { edges { node { id customer { email } } } } }'
+            )
+        orders = [edge['node'] for edge in data['orders']['edges']]
+        self.assertEqual(len(orders), 6)
+        self.assertTrue(all(o['customer']['email'] for o in orders))
+
+    def test_orders_last_week_customer_is_batched(self):
+        """ordersLastWeek with customer emails, as sent by the reminder job"""
+        with self.assertNumQueries(1):
+            data = self.execute(
+                '{ ordersLastWeek { id orderDate customer { email } } }'
+            )
+        self.assertEqual(len(data['ordersLastWeek']), 6)
+
+    def test_customers_order_set_is_batched(self):
+        """Reverse FK loads in one query and reuses the known customers"""
+        with self.assertNumQueries(2):
+            data = self.execute(
+                '{ customers { edges { node {'
+                ' email orderSet { id customer { email } } } } } }'
+            )
+        for edge in data['customers']['edges']:
+            customer = edge['node']
+            self.assertEqual(len(customer['orderSet']), 2)
+            for order in customer['orderSet']:
+                self.assertEqual(order['customer']['email'], customer['email'])
+
+    def test_unselected_relations_are_not_loaded(self):
+        with self.assertNumQueries(1):
+            self.execute('{ orders { edges { node { id totalAmount } } } }')
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        for i in range(5):
+            Product.objects.create(name=f"Product {i}", price=1, stock=i)
+
+    def execute(self, query, **variables):
+        from crm.schema import schema
+        return schema.execute(query, variable_values=variables)
+
+    def page(self, **variables):
+        result = self.execute('''
+            query ($first: Int, $after: String, $last: Int, $before: String) {
+                products(first: $first, after: $after, last: $last, before: $before) {
+                    edges { cursor node { name } }
+                    pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+                }
+            }
+        ''', **variables)
+        self.assertIsNone(result.errors)
+        return result.data['products']
+
+    def test_walk_forward_with_constant_queries(self):
+        names, after = [], None
+        while True:
+            with self.assertNumQueries(1):
+                page = self.page(first=2, after=after)
+            names += [edge['node']['name'] for edge in page['edges']]
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        self.assertEqual(names, [f"Product {i}" for i in range(5)])
+
+    def test_walk_backward(self):
+        page = self.page(last=2)
+        self.assertEqual(
+            [edge['node']['name'] for edge in page['edges']],
+            ["Product 3", "Product 4"]
+        )
+        self.assertTrue(page['pageInfo']['hasPreviousPage'])
+        page = self.page(last=2, before=page['pageInfo']['startCursor'])
+        self.assertEqual(
+            [edge['node']['name'] for edge in page['edges']],
+            ["Product 1", "Product 2"]
+        )
+
+    def test_orders_cursor_uses_order_date_and_id(self):
+        customer = Customer.objects.create(name="Pager", email="pager@example.com")
+        for _ in range(3):
+            Order.objects.create(customer=customer, total_amount=1)
+        from crm.schema import schema
+        query = '''
+            query ($after: String) {
+                orders(first: 1, after: $after) {
+                    edges { node { id } }
+                    pageInfo { endCursor }
+                }
+            }
+        '''
+        seen, after = [], None
+        for _ in range(3):
+            result = schema.execute(query, variable_values={'after': after})
+            self.assertIsNone(result.errors)
+            seen.append(result.data['orders']['edges'][0]['node']['id'])
+            after = result.data['orders']['pageInfo']['endCursor']
+        self.assertEqual(len(set(seen)), 3)
+
+    def test_page_size_is_capped(self):
+        from django.test import override_settings
+        with override_settings(CRM_MAX_PAGE_SIZE=3):
+            result = self.execute('{ products(first: 4) { edges { cursor } } }')
+        self.assertIn("exceeds the maximum", result.errors[0].message)
+
+    def test_empty_pages_are_rejected(self):
+        for args in ('first: 0', 'last: 0', 'first: -1'):
+            result = self.execute('{ products(%s) { edges { cursor } } }' % args)
+            self.assertIn("Page size must be at least 1", result.errors[0].message)
+
+    def test_invalid_cursor_is_rejected(self):
+        result = self.execute('{ products(after: "bogus") { edges { cursor } } }')
+        self.assertIn("Invalid cursor", result.errors[0].message)
+
+
+class DashboardTotalsTest(TestCase):
+    QUERY = '{ totalCustomers totalOrders totalRevenue averageOrderValue }'
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Totals", email="totals@example.com")
+        Order.objects.create(customer=self.customer, total_amount='10.50')
+        Order.objects.create(customer=self.customer, total_amount='20.00')
+
+    def execute(self, query, **variables):
+        from types import SimpleNamespace
+        from crm.schema import schema
+        result = schema.execute(
+            query, context_value=SimpleNamespace(), variable_values=variables
+        )
+        self.assertIsNone(result.errors)
+        return result.data
+
+    def test_totals_in_one_query(self):
+        with self.assertNumQueries(1):
+            data = self.execute(self.QUERY)
+        self.assertEqual(data, {
+            'totalCustomers': 1,
+            'totalOrders': 2,
+            'totalRevenue': 30.5,
+            'averageOrderValue': 15.25,
+        })
+
+    def test_totals_on_empty_tables(self):
+        Order.objects.all().delete()
+        data = self.execute(self.QUERY)
+        self.assertEqual(data['totalRevenue'], 0.0)
+        self.assertEqual(data['averageOrderValue'], 0.0)
+
+    def test_revenue_between(self):
+        old = Order.objects.create(customer=self.customer, total_amount=100)
+        Order.objects.filter(pk=old.pk).update(
+            order_date=timezone.now() - timedelta(days=30)
+        )
+        data = self.execute(
+            'query ($from: DateTime!, $to: DateTime!) {'
+            ' revenueBetween(from: $from, to: $to) }',
+            **{'from': (timezone.now() - timedelta(days=1)).isoformat(),
+               'to': (timezone.now() + timedelta(days=1)).isoformat()}
+        )
+        self.assertEqual(data['revenueBetween'], 30.5)
+
+    def test_precomputed_row_tracks_writes(self):
+        from django.test import override_settings
+        from crm_app import stats
+        with override_settings(CRM_PRECOMPUTED_STATS=True):
+            stats.recompute()
+            order = Order.objects.create(customer=self.customer, total_amount=5)
+            order.total_amount = 9
+            order.save()
+            other = Customer.objects.create(name="Other", email="other@example.com")
+            Order.objects.create(customer=other, total_amount=1)
+            other.delete()
+            with self.assertNumQueries(1):
+                data = self.execute(self.QUERY)
+        self.assertEqual(data['totalCustomers'], 1)
+        self.assertEqual(data['totalOrders'], 3)
+        self.assertEqual(data['totalRevenue'], 39.5)
+        self.assertEqual(stats.stored_totals(), stats.live_totals())
+
+
+class UpdateLowStockProductsTest(TestCase):
+    MUTATION = '''
+        mutation ($threshold: Int, $increment: Int, $ids: [ID!]) {
+            updateLowStockProducts(threshold: $threshold, increment: $increment, ids: $ids) {
+                success
+                message
+                updatedProducts { id name stock }
+            }
+        }
+    '''
+
+    def setUp(self):
+        self.products = [
+            Product.objects.create(name=f"Stock {stock}", price=1, stock=stock)
+            for stock in (0, 4, 9, 10, 25)
+        ]
+
+    def execute(self, **variables):
+        from crm.schema import schema
+        result = schema.execute(self.MUTATION, variable_values=variables)
+        self.assertIsNone(result.errors)
+        return result.data['updateLowStockProducts']
+
+    def test_defaults_restock_below_ten(self):
+        with self.assertNumQueries(4):  # savepoint, select, update, release
+            data = self.execute()
+        self.assertEqual(data['message'], "Updated 3 products")
+        self.assertEqual(
+            [(p['name'], p['stock']) for p in data['updatedProducts']],
+            [("Stock 0", 10), ("Stock 4", 14), ("Stock 9", 19)]
+        )
+        self.assertEqual(
+            list(Product.objects.order_by('id').values_list('stock', flat=True)),
+            [10, 14, 19, 10, 25]
+        )
+
+    def test_threshold_increment_and_ids(self):
+        data = self.execute(
+            threshold=20, increment=5,
+            ids=[str(self.products[0].id), str(self.products[3].id)]
+        )
+        self.assertEqual(
+            [p['stock'] for p in data['updatedProducts']], [5, 15]
+        )
+        self.assertEqual(Product.objects.get(pk=self.products[1].pk).stock, 4)
+
+    def test_non_positive_increment_is_rejected(self):
+        data = self.execute(increment=0)
+        self.assertFalse(data['success'])
+        self.assertFalse(Product.objects.filter(stock__gt=25).exists())
+
+
+class DocumentCacheTest(TestCase):
+    QUERY = '{ hello }'
+
+    def setUp(self):
+        from crm.document_cache import document_cache
+        self.cache = document_cache
+        self.cache.clear()
+        self.client = Client()
+
+    def post(self, body):
+        response = self.client.post('/graphql', body, content_type='application/json')
+        return response.status_code, response.json()
+
+    def apq(self, sha):
+        return {'persistedQuery': {'version': 1, 'sha256Hash': sha}}
+
+    def test_repeated_query_is_parsed_once(self):
+        from unittest import mock
+        with mock.patch('crm.views.parse', wraps=__import__('graphql').parse) as parse:
+            for _ in range(3):
+                status, body = self.post({'query': self.QUERY})
+                self.assertEqual(status, 200)
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual(self.cache.info()['hits'], 2)
+        self.assertEqual(self.cache.info()['misses'], 1)
+
+    def test_invalid_documents_are_not_cached(self):
+        status, _ = self.post({'query': '{ noSuchField }'})
+        self.assertEqual(status, 400)
+        self.assertEqual(self.cache.info()['size'], 0)
+
+    def test_automatic_persisted_query_round_trip(self):
+        from crm.document_cache import query_hash
+        sha = query_hash(self.QUERY)
+        status, body = self.post({'extensions': self.apq(sha)})
+        self.assertEqual(
+            body['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_FOUND'
+        )
+        status, body = self.post({'query': self.QUERY, 'extensions': self.apq(sha)})
+        self.assertEqual(body['data']['hello'], "Hello from GraphQL CRM!")
+        status, body = self.post({'extensions': self.apq(sha)})
+        self.assertEqual(status, 200)
+        self.assertEqual(body['data']['hello'], "Hello from GraphQL CRM!")
+
+    def test_hash_mismatch_is_rejected(self):
+        status, body = self.post({'query': self.QUERY, 'extensions': self.apq('0' * 64)})
+        self.assertEqual(
+            body['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_HASH_MISMATCH'
+        )
+
+    def test_cache_is_bounded_lru(self):
+        from crm.document_cache import DocumentCache
+        cache = DocumentCache(maxsize=2)
+        cache.put('a', 'A')
+        cache.put('b', 'B')
+        cache.get('a')
+        cache.put('c', 'C')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 'A')
+        self.assertEqual(cache.info()['size'], 2)
+
+
+class QueryCostTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+    def post(self, query, **variables):
+        response = self.client.post(
+            '/graphql', {'query': query, 'variables': variables},
+            content_type='application/json'
+        )
+        return response.status_code, response.json()
+
+    def cost(self, query, **variables):
+        from graphql import parse
+        from crm.cost import analyze_query
+        from crm.schema import schema
+        return analyze_query(schema.graphql_schema, parse(query), variables=variables)
+
+    def test_cost_is_returned_in_extensions(self):
+        status, body = self.post('{ hello totalOrders }')
+        self.assertEqual(status, 200)
+        self.assertEqual(body['extensions']['cost']['cost'], 1)
+        self.assertEqual(body['extensions']['cost']['depth'], 1)
+
+    def test_connection_cost_scales_with_page_size(self):
+        query = '''query ($n: Int) { customers(first: $n) {
+            edges { node { id orderSet { id } } } } }'''
+        small = self.cost(query, n=10)
+        large = self.cost(query, n=100)
+        self.assertEqual(small.depth, 5)
+        self.assertGreater(large.cost, 9 * small.cost)
+
+    def test_fragments_are_costed(self):
+        plain = self.cost('{ lowStockProducts { id name } }')
+        fragment = self.cost(
+            '{ lowStockProducts { ...P } } fragment P on ProductType { id name }'
+        )
+        self.assertEqual(plain.cost, fragment.cost)
+
+    def test_deep_nesting_is_rejected(self):
+        from django.test import override_settings
+        query = '''{ customers { edges { node { orderSet { customer {
+            orderSet { customer { orderSet { customer { email } } } } } } } } } }'''
+        with override_settings(CRM_QUERY_MAX_DEPTH=6):
+            status, body = self.post(query)
+        self.assertEqual(status, 400)
+        error = body['errors'][0]
+        self.assertEqual(error['extensions']['code'], 'QUERY_TOO_COMPLEX')
+        self.assertGreater(error['extensions']['depth'], 6)
+        self.assertNotIn('data', body)
+
+    def test_costly_query_is_rejected(self):
+        from django.test import override_settings
+        with override_settings(CRM_QUERY_MAX_COST=100):
+            status, body = self.post('''{ customers(first: 500) {
+                edges { node { orderSet { id } } } } }''')
+        self.assertEqual(status, 400)
+        self.assertIn("exceeds the maximum cost", body['errors'][0]['message'])
+        self.assertEqual(body['extensions']['cost']['maxCost'], 100)
+
+    def test_variable_defaults_are_costed(self):
+        from django.test import override_settings
+        query = '''query ($n: Int = 500) { customers(first: $n) {
+            edges { node { orderSet { customer { orderSet { id } } } } } } }'''
+        self.assertEqual(self.cost(query).cost, self.cost(query, n=500).cost)
+        with override_settings(CRM_QUERY_MAX_COST=10000):
+            status, body = self.post(query)
+        self.assertEqual(status, 400)
+        self.assertIn("exceeds the maximum cost", body['errors'][0]['message'])
+
+    def test_introspection_is_not_costed(self):
+        from graphql import get_introspection_query
+        status, body = self.post(get_introspection_query())
+        self.assertEqual(status, 200)
+
+
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        from django.core.cache import caches
+        from django.test import override_settings
+        self.settings_override = override_settings(CRM_RESPONSE_CACHE_ENABLED=True)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        caches['graphql'].clear()
+        self.client = Client()
+        self.customer = Customer.objects.create(name="Cached", email="cached@example.com")
+        Product.objects.create(name="Low", price=1, stock=2)
+
+    def post(self, query):
+        response = self.client.post('/graphql', {'query': query},
+                                    content_type='application/json')
+        return response.json()
+
+    def test_repeated_query_is_served_from_cache(self):
+        first = self.post('{ totalCustomers lowStockProducts { name stock } }')
+        self.assertEqual(first['extensions']['responseCache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.post('{ totalCustomers lowStockProducts { name stock } }')
+        self.assertEqual(second['extensions']['responseCache'], 'HIT')
+        self.assertEqual(first['data'], second['data'])
+
+    def test_model_write_invalidates_entries_reading_it(self):
+        self.post('{ totalCustomers }')
+        self.post('{ lowStockProducts { name } }')
+        Customer.objects.create(name="New", email="new@example.com")
+        body = self.post('{ totalCustomers }')
+        self.assertEqual(body['extensions']['responseCache'], 'MISS')
+        self.assertEqual(body['data']['totalCustomers'], 2)
+        body = self.post('{ lowStockProducts { name } }')
+        self.assertEqual(body['extensions']['responseCache'], 'HIT')
+
+    def test_bulk_restock_invalidates_products(self):
+        self.post('{ lowStockProducts { name stock } }')
+        self.post('mutation { updateLowStockProducts { success } }')
+        body = self.post('{ lowStockProducts { name stock } }')
+        self.assertEqual(body['extensions']['responseCache'], 'MISS')
+        self.assertEqual(body['data']['lowStockProducts'], [])
+
+    def test_nested_relations_are_tagged(self):
+        Order.objects.create(customer=self.customer, total_amount=3)
+        query = '{ ordersLastWeek { id customer { email } } }'
+        self.post(query)
+        Customer.objects.filter(pk=self.customer.pk).update(email="x@example.com")
+        self.customer.email = "changed@example.com"
+        self.customer.save()
+        body = self.post(query)
+        self.assertEqual(body['extensions']['responseCache'], 'MISS')
+        self.assertEqual(
+            body['data']['ordersLastWeek'][0]['customer']['email'],
+            "changed@example.com"
+        )
+
+    def test_connections_are_cached(self):
+        query = '{ customers(first: 5) { edges { cursor node { name } } pageInfo { hasNextPage } } }'
+        self.post(query)
+        body = self.post(query)
+        self.assertEqual(body['extensions']['responseCache'], 'HIT')
+
+    def test_mutations_and_introspection_are_not_cached(self):
+        body = self.post('{ __typename hello }')
+        self.assertNotIn('responseCache', body['extensions'])
+        body = self.post('mutation { updateLowStockProducts { success } }')
+        self.assertNotIn('responseCache', body['extensions'])
+
+    def test_file_backend(self):
+        import shutil
+        from django.test import override_settings
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        caches = {
+            'graphql': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            }
+        }
+        with override_settings(CACHES=caches):
+            self.post('{ totalOrders }')
+            body = self.post('{ totalOrders }')
+            self.assertEqual(body['extensions']['responseCache'], 'HIT')
+            Order.objects.create(customer=self.customer, total_amount=1)
+            body = self.post('{ totalOrders }')
+            self.assertEqual(body['extensions']['responseCache'], 'MISS')
+            self.assertEqual(body['data']['totalOrders'], 1)
+
+
+class AsyncGraphQLTest(TestCase):
+    def setUp(self):
+        for i in range(3):
+            customer = Customer.objects.create(name=f"Async {i}", email=f"async{i}@example.com")
+            Order.objects.create(customer=customer, total_amount=10)
+        Product.objects.create(name="Async Low", price=1, stock=1)
+
+    async def post(self, query, **variables):
+        from django.test import AsyncClient
+        response = await AsyncClient().post(
+            '/graphql/async', {'query': query, 'variables': variables},
+            content_type='application/json'
+        )
+        return response.status_code, response.json()
+
+    def test_totals_share_one_query(self):
+        from asgiref.sync import async_to_sync
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            status, body = async_to_sync(self.post)(
+                '{ totalCustomers totalOrders totalRevenue }'
+            )
+        self.assertEqual(status, 200)
+        self.assertEqual(body['data'], {
+            'totalCustomers': 3, 'totalOrders': 3, 'totalRevenue': 30.0
+        })
+        self.assertEqual(len(queries), 1)
+
+    def test_customer_relation_is_batched(self):
+        from asgiref.sync import async_to_sync
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            status, body = async_to_sync(self.post)(
+                '{ ordersLastWeek { id customer { email orderSet { id } } } }'
+            )
+        self.assertEqual(status, 200)
+        emails = {o['customer']['email'] for o in body['data']['ordersLastWeek']}
+        self.assertEqual(len(emails), 3)
+        self.assertEqual(len(queries), 2)
+
+    async def test_connection_and_mutation(self):
+        status, body = await self.post(
+            '{ customers(first: 2) { edges { node { name } } pageInfo { hasNextPage } } }'
+        )
+        self.assertEqual(len(body['data']['customers']['edges']), 2)
+        self.assertTrue(body['data']['customers']['pageInfo']['hasNextPage'])
+        status, body = await self.post(
+            'mutation { updateLowStockProducts(increment: 5) { message updatedProducts { stock } } }'
+        )
+        self.assertEqual(body['data']['updateLowStockProducts']['updatedProducts'], [{'stock': 6}])
+
+    def test_async_schema_matches_sync_schema(self):
+        from crm.schema import schema
+        from crm.schema_async import schema as async_schema
+        self.assertEqual(str(schema), str(async_schema))
+
+
+class JobExecutorTest(TestCase):
+    def setUp(self):
+        customer = Customer.objects.create(name="Job", email="job@example.com")
+        Order.objects.create(customer=customer, total_amount=25)
+        Product.objects.create(name="Job Low", price=1, stock=2)
+
+    def test_runs_in_process(self):
+        from crm.executor import execute
+        data = execute('{ hello totalCustomers ordersLastWeek { customer { email } } }')
+        self.assertEqual(data['totalCustomers'], 1)
+        self.assertEqual(data['ordersLastWeek'], [{'customer': {'email': 'job@example.com'}}])
+
+    def test_mutation_with_variables(self):
+        from crm.executor import execute
+        data = execute(
+            'mutation ($increment: Int) { updateLowStockProducts(increment: $increment) '
+            '{ updatedProducts { stock } } }',
+            {'increment': 3},
+        )
+        self.assertEqual(data['updateLowStockProducts']['updatedProducts'], [{'stock': 5}])
+
+    def test_errors_raise(self):
+        from crm.executor import GraphQLExecutionError, execute
+        with self.assertRaises(GraphQLExecutionError):
+            execute('{ noSuchField }')
+
+    def test_remote_mode_reuses_one_session(self):
+        from unittest import mock
+        from django.test import override_settings
+        from crm import executor
+        response = mock.Mock()
+        response.json.return_value = {'data': {'hello': 'Hello, GraphQL!'}}
+        with override_settings(CRM_JOBS_GRAPHQL_URL='http://crm.internal/graphql'), \
+                mock.patch.object(executor, '_session', mock.Mock()) as session:
+            session.post.return_value = response
+            self.assertEqual(executor.execute('{ hello }'), {'hello': 'Hello, GraphQL!'})
+            executor.execute('{ hello }')
+        self.assertEqual(session.post.call_count, 2)
+        self.assertEqual(session.post.call_args.args, ('http://crm.internal/graphql',))
+
+
+class OrderRemindersTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        from crm import joblog
+        self.log_path = tempfile.mktemp(suffix='.txt')
+        self.addCleanup(lambda: os.path.exists(self.log_path) and os.remove(self.log_path))
+        self.addCleanup(joblog.shutdown)
+        for i in range(5):
+            customer = Customer.objects.create(name=f"Remind {i}", email=f"remind{i}@example.com")
+            order = Order.objects.create(customer=customer, total_amount=10)
+            Order.objects.filter(pk=order.pk).update(order_date=self.now - timedelta(hours=5 - i))
+        old = Order.objects.create(customer=customer, total_amount=10)
+        Order.objects.filter(pk=old.pk).update(order_date=self.now - timedelta(days=30))
+
+    def read_log(self):
+        with open(self.log_path) as f:
+            return f.read().splitlines()
+
+    def send(self, **kwargs):
+        from crm_app.reminders import send_order_reminders
+        return send_order_reminders(log_path=self.log_path, now=self.now, **kwargs)
+
+    def test_sends_recent_orders_in_chunks(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.send(chunk_size=2), 5)
+        lines = self.read_log()
+        self.assertEqual(len(lines), 5)
+        self.assertIn('Customer: remind0@example.com', lines[0])
+        self.assertIn('Customer: remind4@example.com', lines[-1])
+        self.assertEqual(len([q for q in queries if 'crm_app_order' in q['sql']]), 3)
+
+    def test_rerun_does_not_resend(self):
+        self.send(chunk_size=2)
+        self.assertEqual(self.send(chunk_size=2), 0)
+        customer = Customer.objects.first()
+        Order.objects.create(customer=customer, total_amount=10)
+        self.now = timezone.now() + timedelta(minutes=2)
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(len(self.read_log()), 6)
+
+    def test_late_commit_behind_the_last_run_is_sent(self):
+        customer = Customer.objects.first()
+        recent = Order.objects.create(customer=customer, total_amount=10,
+                                      order_date=self.now - timedelta(seconds=10))
+        self.assertEqual(self.send(), 5)
+        # Placed before the last order seen, but committed after the run.
+        late = Order.objects.create(customer=customer, total_amount=10,
+                                    order_date=self.now - timedelta(seconds=30))
+        self.now += timedelta(minutes=2)
+        self.assertEqual(self.send(), 2)
+        lines = self.read_log()
+        self.assertIn(f'Order ID {late.id},', lines[-2])
+        self.assertIn(f'Order ID {recent.id},', lines[-1])
+
+    def test_interrupted_run_resumes(self):
+        from unittest import mock
+        from crm_app import reminders
+        original = reminders.iter_chunks
+
+        def interrupted(*args, **kwargs):
+            chunks = original(*args, **kwargs)
+            yield next(chunks)
+            raise RuntimeError('killed')
+
+        with mock.patch.object(reminders, 'iter_chunks', interrupted):
+            with self.assertRaises(RuntimeError):
+                self.send(chunk_size=2)
+        self.assertEqual(len(self.read_log()), 2)
+        self.assertEqual(self.send(chunk_size=2), 3)
+        self.assertEqual(len(self.read_log()), 5)
+        self.assertEqual(self.send(reset=True), 5)
+
+
+class CustomerCleanupTest(TestCase):
+    def setUp(self):
+        old = timezone.now() - timedelta(days=400)
+        for i in range(5):
+            customer = Customer.objects.create(name=f"Inactive {i}", email=f"inactive{i}@example.com")
+            order = Order.objects.create(customer=customer, total_amount=10)
+            Order.objects.filter(pk=order.pk).update(order_date=old)
+        self.active = Customer.objects.create(name="Active", email="active@example.com")
+        Order.objects.create(customer=self.active, total_amount=99)
+
+    def run_cleanup(self, **kwargs):
+        from crm_app.cleanup import cleanup_inactive_customers
+        return cleanup_inactive_customers(pause=0, **kwargs)
+
+    def test_deletes_in_batches_with_cascade(self):
+        seen = []
+        result = self.run_cleanup(batch_size=2, progress=lambda r, remaining: seen.append(remaining))
+        self.assertEqual((result.customers, result.orders, result.batches), (5, 5, 3))
+        self.assertEqual(seen, [3, 1, 0])
+        self.assertEqual(list(Customer.objects.all()), [self.active])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_dry_run_deletes_nothing(self):
+        result = self.run_cleanup(dry_run=True)
+        self.assertEqual((result.customers, result.orders), (5, 5))
+        self.assertEqual(Customer.objects.count(), 6)
+
+    def test_keeps_precomputed_totals_current(self):
+        from django.test import override_settings
+        from crm_app import stats
+        with override_settings(CRM_PRECOMPUTED_STATS=True):
+            stats.recompute()
+            self.run_cleanup(batch_size=2)
+            self.assertEqual(stats.stored_totals(), stats.live_totals())
+
+    def test_interrupted_run_resumes_with_same_cutoff(self):
+        from unittest import mock
+        from crm_app import cleanup
+        from crm_app.models import JobCheckpoint
+        original = cleanup.delete_batch
+        calls = []
+
+        def interrupted(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('killed')
+            return original(*args, **kwargs)
+
+        with mock.patch.object(cleanup, 'delete_batch', interrupted):
+            with self.assertRaises(RuntimeError):
+                self.run_cleanup(batch_size=2)
+        position = JobCheckpoint.objects.get(name='customer_cleanup').position
+        self.assertEqual(position['customers'], 2)
+        result = self.run_cleanup(batch_size=2)
+        self.assertEqual(result.customers, 5)
+        self.assertEqual(result.cutoff.isoformat(), position['cutoff'])
+        self.assertEqual(JobCheckpoint.objects.get(name='customer_cleanup').position, {})
+
+    def test_resume_with_other_days_is_refused(self):
+        from unittest import mock
+        from django.core.management.base import CommandError
+        from crm_app import cleanup
+        original = cleanup.delete_batch
+        calls = []
+
+        def interrupted(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('killed')
+            return original(*args, **kwargs)
+
+        with mock.patch.object(cleanup, 'delete_batch', interrupted):
+            with self.assertRaises(RuntimeError):
+                self.run_cleanup(batch_size=2)
+        with self.assertRaisesMessage(CommandError, 'days=365'):
+            call_command('cleanup_customers', days=30, stdout=StringIO())
+        out = StringIO()
+        call_command('cleanup_customers', batch_size=2, sleep=0, stdout=out)
+        self.assertIn('Resumed the interrupted run with cutoff', out.getvalue())
+        self.assertIn('Successfully deleted 5 inactive customers', out.getvalue())
+
+    def test_customer_who_ordered_meanwhile_is_kept(self):
+        from crm_app.cleanup import delete_batch
+        customer = Customer.objects.get(name="Inactive 0")
+        Order.objects.create(customer=customer, total_amount=5)
+        ids = list(Customer.objects.values_list('id', flat=True))
+        self.assertEqual(delete_batch(ids, timezone.now() - timedelta(days=365)), (4, 4))
+        self.assertTrue(Customer.objects.filter(pk=customer.pk).exists())
+
+
+class QueryPlanTest(TestCase):
+    def test_hot_queries_use_indexes(self):
+        from io import StringIO
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('order_date_idx', out.getvalue())
+        self.assertIn('product_low_stock_idx', out.getvalue())
+
+    def test_customer_email_is_unique(self):
+        from django.db import IntegrityError
+        Customer.objects.create(name="One", email="same@example.com")
+        with self.assertRaises(IntegrityError):
+            Customer.objects.create(name="Two", email="same@example.com")
+
+
+class SyntheticDataTest(TestCase):
+    def snapshot(self):
+        return (
+            list(Customer.objects.order_by('email').values_list('email', 'created_at')),
+            list(Product.objects.order_by('name').values_list('name', 'price', 'stock')),
+            sorted(Order.objects.values_list('customer__email', 'order_date', 'total_amount')),
+        )
+
+    def test_same_seed_gives_same_data(self):
+        call_command('create_sample_data', customers=7, products=4, orders=30,
+                     seed=42, anchor='2026-01-01T00:00:00', chunk_size=8, stdout=StringIO())
+        first = self.snapshot()
+        Order.objects.all().delete()
+        Customer.objects.all().delete()
+        Product.objects.all().delete()
+        call_command('create_sample_data', customers=7, products=4, orders=30,
+                     seed=42, anchor='2026-01-01T00:00:00', chunk_size=5, stdout=StringIO())
+        self.assertEqual(self.snapshot(), first)
+        self.assertEqual([len(rows) for rows in first], [7, 4, 30])
+
+    def test_reports_throughput_and_keeps_totals(self):
+        from django.test import override_settings
+        from crm_app import stats
+        with override_settings(CRM_PRECOMPUTED_STATS=True):
+            stats.recompute()
+            out = StringIO()
+            call_command('create_sample_data', customers=5, orders=12, profile='recent',
+                         chunk_size=5, stdout=out)
+            self.assertEqual(stats.stored_totals(), stats.live_totals())
+        self.assertIn('Created 12 orders', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+
+    def test_rejects_reused_seed(self):
+        from django.core.management.base import CommandError
+        call_command('create_sample_data', customers=2, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('create_sample_data', customers=2, stdout=StringIO())
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        customer = Customer.objects.create(name="Metrics", email="metrics@example.com")
+        Order.objects.create(customer=customer, total_amount=10)
+
+    def sample(self, name):
+        from crm.metrics import registry
+        for line in registry.render().splitlines():
+            if line.startswith(name + ' '):
+                return float(line.rsplit(' ', 1)[1])
+        return 0.0
+
+    def post(self, query, operation_name=None):
+        return self.client.post(
+            '/graphql', {'query': query, 'operationName': operation_name},
+            content_type='application/json'
+        )
+
+    def test_records_operation_field_and_sql_metrics(self):
+        from django.test import override_settings
+        query = 'query Reminders { ordersLastWeek { id customer { email } } }'
+        ops = 'crm_graphql_operations_total{operation="Reminders",status="ok"}'
+        sql = 'crm_graphql_sql_queries_sum{operation="Reminders"}'
+        field = 'crm_graphql_field_duration_seconds_count{field="Query.ordersLastWeek"}'
+        before = self.sample(ops), self.sample(sql), self.sample(field)
+        with override_settings(CRM_METRICS_ENABLED=True):
+            self.post(query, 'Reminders')
+            response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertEqual(self.sample(ops) - before[0], 1)
+        self.assertEqual(self.sample(sql) - before[1], 1)
+        self.assertEqual(self.sample(field) - before[2], 1)
+        body = response.content.decode()
+        self.assertIn('crm_graphql_field_duration_seconds_count{field="OrderType.customer"}', body)
+        self.assertNotIn('field="OrderType.id"', body)
+        self.assertIn('crm_graphql_response_bytes_count{operation="Reminders"}', body)
+        self.assertIn('crm_graphql_document_cache_hits_total', body)
+
+    def test_counts_errors(self):
+        from django.test import override_settings
+        key = 'crm_graphql_errors_total{operation="Broken"}'
+        before = self.sample(key)
+        with override_settings(CRM_METRICS_ENABLED=True):
+            self.post('query Broken { revenueBetween(from: "x", to: "y") }', 'Broken')
+        # One error per invalid argument.
+        self.assertEqual(self.sample(key) - before, 2)
+
+    def test_disabled_records_nothing(self):
+        key = 'crm_graphql_operations_total{operation="Quiet",status="ok"}'
+        self.post('query Quiet { hello }', 'Quiet')
+        self.assertEqual(self.sample(key), 0)
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_operation_names_are_capped(self):
+        from django.test import override_settings
+        from crm import metrics
+        with override_settings(CRM_METRICS_MAX_OPERATIONS=len(metrics._operation_names)):
+            self.assertEqual(metrics.operation_label('NeverSeenBefore'), metrics.OTHER)
+
+
+class ProfilingTest(TestCase):
+    QUERY = '{ ordersLastWeek { id customer { email } } totalOrders }'
+
+    def setUp(self):
+        for i in range(2):
+            customer = Customer.objects.create(name=f"Profiled {i}", email=f"profiled{i}@example.com")
+            Order.objects.create(customer=customer, total_amount=10)
+
+    def post(self, **headers):
+        response = self.client.post(
+            '/graphql', {'query': self.QUERY}, content_type='application/json', headers=headers
+        )
+        return response.json()
+
+    def test_trace_with_sql_plans_and_resolver_tree(self):
+        from django.test import override_settings
+        with override_settings(CRM_PROFILE_TOKEN='secret'):
+            body = self.post(**{'X-CRM-Profile': 'secret'})
+        profile = body['extensions']['profile']
+        self.assertEqual(profile['sqlCount'], 2)
+        plans = [line for statement in profile['sql'] for line in statement['plan']]
+        self.assertTrue(any('SEARCH crm_app_order USING' in line for line in plans))
+        self.assertEqual(
+            [node['field'] for node in profile['resolvers']],
+            ['Query.ordersLastWeek', 'Query.totalOrders'],
+        )
+        children = profile['resolvers'][0]['children']
+        self.assertEqual([child['path'] for child in children],
+                         ['ordersLastWeek.0.customer', 'ordersLastWeek.1.customer'])
+        self.assertNotIn('samples', profile)
+
+    def test_sampler(self):
+        from django.test import override_settings
+        with override_settings(CRM_PROFILE_TOKEN='secret'):
+            body = self.post(**{'X-CRM-Profile': 'secret', 'X-CRM-Profile-Sample': '1'})
+        samples = body['extensions']['profile']['samples']
+        self.assertEqual(set(samples), {'intervalMs', 'total', 'folded', 'top'})
+
+    def test_requires_matching_token(self):
+        from django.test import override_settings
+        self.assertNotIn('profile', self.post(**{'X-CRM-Profile': 'secret'})['extensions'])
+        with override_settings(CRM_PROFILE_TOKEN='secret'):
+            body = self.post(**{'X-CRM-Profile': 'wrong'})
+        self.assertNotIn('profile', body['extensions'])
+
+
+class DailyRollupTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.customers = []
+        for i in range(4):
+            self.customers.append(Customer.objects.create(
+                name=f"Rollup {i}", email=f"rollup{i}@example.com",
+                created_at=self.now - timedelta(days=20 - i),
+            ))
+        for i in range(10):
+            Order.objects.create(customer=self.customers[i % 4], total_amount=10 + i,
+                                 order_date=self.now - timedelta(days=i, hours=1))
+
+    def live(self):
+        from collections import defaultdict
+        from decimal import Decimal
+        from crm_app.rollups import day_of
+        days = defaultdict(lambda: [0, Decimal('0'), 0])
+        for order_date, amount in Order.objects.values_list('order_date', 'total_amount'):
+            days[day_of(order_date)][0] += 1
+            days[day_of(order_date)][1] += amount
+        for created_at in Customer.objects.values_list('created_at', flat=True):
+            days[day_of(created_at)][2] += 1
+        return {day: tuple(values) for day, values in days.items()}
+
+    def stored(self):
+        from crm_app.models import DailyRollup
+        return {
+            row.day: (row.order_count, row.revenue, row.new_customers)
+            for row in DailyRollup.objects.all()
+            if row.order_count or row.new_customers
+        }
+
+    def test_incremental_update_matches_live_totals(self):
+        from crm_app import rollups
+        self.assertEqual(rollups.update(chunk_size=3), {'orders': 10, 'customers': 4})
+        self.assertEqual(self.stored(), self.live())
+        Order.objects.create(customer=self.customers[0], total_amount=7,
+                             order_date=self.now - timedelta(minutes=30))
+        self.assertEqual(rollups.update(chunk_size=3), {'orders': 1, 'customers': 0})
+        self.assertEqual(self.stored(), self.live())
+
+    def test_recent_rows_wait_for_the_settle_window(self):
+        from crm_app import rollups
+        rollups.update()
+        Order.objects.create(customer=self.customers[0], total_amount=5)
+        self.assertEqual(rollups.update(), {'orders': 0, 'customers': 0})
+
+    def test_interrupted_backfill_resumes_without_double_counting(self):
+        from unittest import mock
+        from crm_app import rollups
+        original = rollups._advance
+        calls = []
+
+        def interrupted(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 3:
+                raise RuntimeError('killed')
+            return original(*args, **kwargs)
+
+        with mock.patch.object(rollups, '_advance', interrupted):
+            with self.assertRaises(RuntimeError):
+                rollups.update(chunk_size=4)
+        self.assertEqual(rollups.update(chunk_size=4), {'orders': 2, 'customers': 4})
+        self.assertEqual(self.stored(), self.live())
+
+    def test_changes_behind_the_mark_refresh_their_days(self):
+        from crm_app import rollups
+        rollups.update()
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.order_by('order_date').first()
+            order.order_date = self.now - timedelta(days=30)
+            order.total_amount = 100
+            order.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.order_by('order_date').last().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(customer=self.customers[1], total_amount=3,
+                                 order_date=self.now - timedelta(days=3, hours=5))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customers[3].delete()
+        self.assertEqual(self.stored(), self.live())
+
+    def test_cascade_refreshes_once_per_transaction(self):
+        from unittest import mock
+        from crm_app import rollups
+        rollups.update()
+        with mock.patch.object(rollups, 'refresh_days', wraps=rollups.refresh_days) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.customers[0].delete()
+        refresh.assert_called_once()
+        self.assertEqual(self.stored(), self.live())
+
+    def test_saves_skip_features_that_are_off(self):
+        order = Order.objects.first()
+        order.total_amount = 99
+        with self.assertNumQueries(1):
+            order.save()
+
+    def test_cleanup_and_generator_keep_rollups_current(self):
+        from crm_app import rollups
+        from crm_app.cleanup import cleanup_inactive_customers
+        from crm_app.synthetic import SyntheticGenerator
+        Order.objects.filter(customer=self.customers[0]).update(
+            order_date=self.now - timedelta(days=400))
+        rollups.update()
+        rollups.refresh_days(order_days=[rollups.day_of(self.now - timedelta(days=400))])
+        self.assertEqual(cleanup_inactive_customers(pause=0).customers, 1)
+        self.assertEqual(self.stored(), self.live())
+        SyntheticGenerator(seed=5, chunk_size=4).generate(customers=6, orders=15)
+        self.assertEqual(self.stored(), self.live())
+
+    def test_weekly_report_deltas(self):
+        from decimal import Decimal
+        from crm_app import rollups
+        from crm_app.models import DailyRollup
+        today = timezone.localdate()
+        DailyRollup.objects.create(day=today - timedelta(days=1), order_count=3,
+                                   revenue=Decimal('30'), new_customers=2)
+        DailyRollup.objects.create(day=today - timedelta(days=9), order_count=2,
+                                   revenue=Decimal('40'))
+        DailyRollup.objects.create(day=today, order_count=5, revenue=Decimal('5'))
+        report = rollups.weekly_report(today)
+        self.assertEqual((report['customers'], report['orders'], report['revenue']),
+                         (2, 10, Decimal('75')))
+        self.assertEqual(report['this_week']['orders'], 3)
+        self.assertEqual(report['deltas']['orders'], 0.5)
+        self.assertEqual(report['deltas']['revenue'], -0.25)
+        self.assertIsNone(report['deltas']['new_customers'])
+
+    def test_report_task_logs_totals_and_deltas(self):
+        from crm import joblog, tasks
+        with tempfile.TemporaryDirectory() as tmp, self.settings(CRM_JOB_LOG_DIR=tmp):
+            self.addCleanup(joblog.shutdown)
+            result = tasks.generate_crm_report()
+            joblog.flush()
+            with open(os.path.join(tmp, 'crm_report_log.txt')) as f:
+                line = f.read()
+        self.assertEqual(result, 'Report generated: 4 customers, 10 orders, 145.00 revenue')
+        self.assertIn('Report: 4 customers, 10 orders, 145.00 revenue; last 7 days:', line)
+
+
+class AnalyticsTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.alice = Customer.objects.create(name="Alice", email="alice@example.com")
+        self.bob = Customer.objects.create(name="Bob", email="bob@example.com")
+        for days, customer, amount in [(1, self.alice, 100), (2, self.bob, 30), (2, self.bob, 30),
+                                       (9, self.alice, 50), (40, self.bob, 500)]:
+            Order.objects.create(customer=customer, total_amount=amount,
+                                 order_date=self.now - timedelta(days=days))
+        self.client = Client()
+
+    def query(self, query):
+        response = self.client.post('/graphql', json.dumps({'query': query}),
+                                    content_type='application/json')
+        return response.json()
+
+    def live_between(self, start, end):
+        from django.db.models import Count, Sum
+        return Order.objects.filter(order_date__gte=start, order_date__lt=end).aggregate(
+            orders=Count('id'), revenue=Sum('total_amount'))
+
+    def test_orders_between_agrees_with_and_without_rollups(self):
+        from crm_app import analytics, rollups
+        ranges = [(self.now - timedelta(days=50), self.now),
+                  (self.now - timedelta(days=9, hours=3), self.now - timedelta(days=1, hours=12)),
+                  (self.now - timedelta(days=2, hours=1), self.now - timedelta(days=1, hours=23))]
+        before = [analytics.orders_between(*r) for r in ranges]
+        rollups.update()
+        for r, result in zip(ranges, before):
+            live = self.live_between(*r)
+            self.assertEqual(result['orders'], live['orders'])
+            self.assertEqual(analytics.orders_between(*r), result)
+
+    def test_series_reads_rollups_and_only_recent_days_from_orders(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from crm_app import analytics, rollups
+        rollups.update()
+        today = timezone.localdate()
+        with CaptureQueriesContext(connection) as queries:
+            series = analytics.revenue_series(today - timedelta(days=59), today, 'day')
+        self.assertEqual(len(series), 60)
+        self.assertEqual(sum(point['orders'] for point in series), 5)
+        self.assertEqual(series[-3]['revenue'], 60)
+        order_scans = [q['sql'] for q in queries if '"crm_app_order"' in q['sql']]
+        self.assertEqual(len(order_scans), 1)
+
+    def test_weekly_and_monthly_buckets(self):
+        from datetime import date
+        from crm_app import analytics
+        self.assertEqual(analytics.bucket_start(date(2026, 10, 18), 'week'), date(2026, 10, 12))
+        series = analytics.revenue_series(date(2026, 1, 15), date(2026, 3, 2), 'month')
+        self.assertEqual([point['start'] for point in series],
+                         [date(2026, 1, 1), date(2026, 2, 1), date(2026, 3, 1)])
+        with self.assertRaises(ValueError):
+            analytics.revenue_series(date(2026, 3, 2), date(2026, 1, 15))
+
+    def test_graphql_fields(self):
+        today = timezone.localdate()
+        body = self.query(f'''{{
+            ordersCount(from: "{(self.now - timedelta(days=10)).isoformat()}",
+                        to: "{self.now.isoformat()}")
+            revenueSeries(from: "{today - timedelta(days=13)}", to: "{today}", granularity: WEEK) {{
+                start orders revenue
+            }}
+            byRevenue: topCustomers(window: 30) {{ customer {{ name }} orders revenue }}
+            byOrders: topCustomers(by: ORDERS, limit: 1, window: null) {{ customer {{ name }} }}
+        }}''')
+        self.assertNotIn('errors', body)
+        data = body['data']
+        self.assertEqual(data['ordersCount'], 4)
+        self.assertEqual(sum(point['orders'] for point in data['revenueSeries']), 4)
+        self.assertEqual(data['byRevenue'], [
+            {'customer': {'name': 'Alice'}, 'orders': 2, 'revenue': 150.0},
+            {'customer': {'name': 'Bob'}, 'orders': 2, 'revenue': 60.0},
+        ])
+        self.assertEqual(data['byOrders'], [{'customer': {'name': 'Bob'}}])
+
+    def test_top_customers_load_customers_in_one_query(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            body = self.query('{ topCustomers { customer { name } } }')
+        self.assertEqual(len(body['data']['topCustomers']), 2)
+        self.assertEqual(len(queries), 2)
+
+    def test_invalid_arguments_are_errors(self):
+        body = self.query('{ topCustomers(limit: 1000) { orders } }')
+        self.assertIn('limit must be between 1 and 100', body['errors'][0]['message'])
+
+    def test_async_endpoint_serves_the_same_fields(self):
+        from asgiref.sync import async_to_sync
+        from django.test import AsyncClient
+        query = '{ topCustomers { customer { name } revenue } ordersCount(from: "%s", to: "%s") }' % (
+            (self.now - timedelta(days=10)).isoformat(), self.now.isoformat())
+        response = async_to_sync(AsyncClient().post)(
+            '/graphql/async', {'query': query}, content_type='application/json')
+        self.assertEqual(response.json(), self.query(query))
+
+
+class SQLiteProfileTest(TestCase):
+    def production_settings(self):
+        import subprocess
+        import sys
+        from django.conf import settings
+        script = ('import json; from crm import settings; '
+                  'print(json.dumps([settings.DATABASES["default"].get("OPTIONS", {}), '
+                  'settings.CRM_SQLITE_PRAGMAS]))')
+        env = {**os.environ, 'CRM_SQLITE_PROFILE': 'production'}
+        output = subprocess.run([sys.executable, '-c', script], env=env, cwd=settings.BASE_DIR,
+                                check=True, capture_output=True, text=True).stdout
+        return json.loads(output)
+
+    def test_profile_is_off_by_default(self):
+        from django.conf import settings
+        self.assertNotIn('transaction_mode', settings.DATABASES['default'].get('OPTIONS', {}))
+        self.assertEqual(settings.CRM_SQLITE_PRAGMAS, {})
+
+    def test_production_profile_sets_immediate_transactions(self):
+        options, pragmas = self.production_settings()
+        self.assertEqual(options, {'transaction_mode': 'IMMEDIATE'})
+        self.assertEqual(pragmas['journal_mode'], 'WAL')
+
+    def test_new_connections_get_the_pragmas(self):
+        from django.conf import settings
+        from django.db import connections
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        from django.test import override_settings
+        from crm_app.db import read_pragmas
+        with tempfile.TemporaryDirectory() as tmp, \
+                override_settings(CRM_SQLITE_PRAGMAS=settings.CRM_SQLITE_PRODUCTION_PRAGMAS):
+            settings_dict = {**connections['default'].settings_dict,
+                             'NAME': os.path.join(tmp, 'wal.sqlite3')}
+            wrapper = DatabaseWrapper(settings_dict, alias='wal_test')
+            try:
+                wrapper.ensure_connection()
+                self.assertEqual(
+                    read_pragmas(wrapper, ['busy_timeout', 'journal_mode', 'synchronous',
+                                           'cache_size', 'temp_store']),
+                    {'busy_timeout': 5000, 'journal_mode': 'wal', 'synchronous': 1,
+                     'cache_size': -65536, 'temp_store': 2})
+            finally:
+                wrapper.close()
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+    # The backup API cannot copy a database with a write transaction open,
+    # so the data has to be committed.
+
+    @classmethod
+    def setUpClass(cls):
+        from django.conf import settings
+        cls.tmp = tempfile.TemporaryDirectory()
+        # A second SQLite file registered as the replica for this class only
+        # (after the test runner has set up its databases).
+        settings.DATABASES['replica'] = {
+            **settings.DATABASES['default'],
+            'NAME': os.path.join(cls.tmp.name, 'replica.sqlite3'),
+        }
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        from django.conf import settings
+        from django.db import connections
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del settings.DATABASES['replica']
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Replica", email="replica@example.com")
+        Order.objects.create(customer=self.customer, total_amount=10)
+        self.client = Client()
+
+    def sync(self):
+        from crm import routers
+        routers.sync_replica()
+
+    def query(self, query):
+        return self.client.post('/graphql', json.dumps({'query': query}),
+                                content_type='application/json')
+
+    def test_router_sends_reads_in_replica_context_to_the_replica(self):
+        from crm import routers
+        self.sync()
+        Order.objects.create(customer=self.customer, total_amount=20)
+        with routers.use_replica():
+            self.assertEqual(Order.objects.count(), 1)
+            order = Order.objects.get()
+            self.assertEqual(order._state.db, 'replica')
+            order.total_amount = 15
+            order.save()
+            Order.objects.create(customer=self.customer, total_amount=30)
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertEqual(Order.objects.filter(total_amount=15).count(), 1)
+
+    def test_only_lag_tolerant_queries_read_the_replica(self):
+        self.sync()
+        Order.objects.create(customer=self.customer, total_amount=20)
+        self.assertEqual(self.query('{ totalOrders ordersCount(from: "2000-01-01T00:00:00Z", '
+                                    'to: "2100-01-01T00:00:00Z") }').json()['data'],
+                         {'totalOrders': 1, 'ordersCount': 1})
+        body = self.query('{ totalOrders orders(first: 5) { edges { node { id } } } }').json()
+        self.assertEqual(body['data']['totalOrders'], 2)
+        self.sync()
+        self.assertEqual(self.query('{ totalOrders }').json()['data']['totalOrders'], 2)
+
+    def test_mutation_pins_the_client_to_default(self):
+        from crm import routers
+        self.sync()
+        Order.objects.create(customer=self.customer, total_amount=20)
+        response = self.query('mutation { updateLowStockProducts { success } }')
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        self.assertEqual(self.query('{ totalOrders }').json()['data']['totalOrders'], 2)
+        self.client.cookies.clear()
+        self.assertEqual(self.query('{ totalOrders }').json()['data']['totalOrders'], 1)
+
+    def test_cached_replica_answers_do_not_reach_pinned_clients(self):
+        from django.core.cache import caches
+        self.sync()
+        caches['graphql'].clear()
+        writer = Client()
+
+        def post(client, query):
+            return client.post('/graphql', json.dumps({'query': query}),
+                               content_type='application/json').json()
+
+        post(writer, 'mutation { updateLowStockProducts { success } }')
+        Order.objects.create(customer=self.customer, total_amount=20)
+        with self.settings(CRM_RESPONSE_CACHE_ENABLED=True):
+            stale = post(self.client, '{ totalOrders }')
+            fresh = post(writer, '{ totalOrders }')
+        self.assertEqual(stale['data']['totalOrders'], 1)
+        self.assertEqual(fresh['data']['totalOrders'], 2)
+        self.assertEqual(fresh['extensions']['responseCache'], 'MISS')
+
+    def test_async_view_routes_the_same_way(self):
+        from asgiref.sync import async_to_sync
+        from django.test import AsyncClient
+        self.sync()
+        Order.objects.create(customer=self.customer, total_amount=20)
+        response = async_to_sync(AsyncClient().post)(
+            '/graphql/async', {'query': '{ totalOrders }'}, content_type='application/json')
+        self.assertEqual(response.json()['data']['totalOrders'], 1)
+
+    def test_metrics_and_profile_cover_replica_queries(self):
+        import re
+        from django.test import override_settings
+        self.sync()
+        sql = 'crm_graphql_sql_queries_sum{operation="ReplicaTotals"} '
+
+        def post(**headers):
+            return self.client.post(
+                '/graphql', {'query': 'query ReplicaTotals { totalOrders }',
+                             'operationName': 'ReplicaTotals'},
+                content_type='application/json', headers=headers,
+            ).json()
+
+        with override_settings(CRM_METRICS_ENABLED=True):
+            post()
+            metrics = self.client.get('/metrics').content.decode()
+        self.assertEqual(float(re.search(re.escape(sql) + r'(\S+)', metrics).group(1)), 1)
+        with override_settings(CRM_PROFILE_TOKEN='secret'):
+            statements = post(**{'X-CRM-Profile': 'secret'})['extensions']['profile']['sql']
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(statements[0]['database'], 'replica')
+        self.assertIn('crm_app_order', ' '.join(statements[0]['plan']))
+
+    def test_sync_command(self):
+        out = StringIO()
+        call_command('sync_replica', stdout=out)
+        self.assertIn('Replica replica synced', out.getvalue())
+
+    def test_report_reads_rollups_from_default_without_syncing(self):
+        from unittest import mock
+        from crm import joblog, routers, tasks
+        with mock.patch.object(routers, 'sync_replica') as sync, \
+                self.settings(CRM_ROLLUP_SETTLE_SECONDS=0, CRM_JOB_LOG_DIR=self.tmp.name):
+            self.addCleanup(joblog.shutdown)
+            result = tasks.generate_crm_report()
+            joblog.flush()
+        sync.assert_not_called()
+        # The replica was never synced, so a read from it would have failed.
+        self.assertEqual(result, 'Report generated: 1 customers, 1 orders, 10.00 revenue')
+
+
+class JobLogTest(TestCase):
+    def setUp(self):
+        from crm import joblog
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(joblog.shutdown)
+        self.dir = tmp.name
+        self.joblog = joblog
+
+    def read(self, name):
+        self.joblog.flush()
+        with open(os.path.join(self.dir, name)) as f:
+            return f.read().splitlines()
+
+    def test_text_lines_keep_their_formats(self):
+        import re
+        from contextlib import redirect_stdout
+        from crm.cron import log_crm_heartbeat
+        with self.settings(CRM_JOB_LOG_DIR=self.dir), redirect_stdout(StringIO()):
+            log_crm_heartbeat()
+            call_command('cleanup_customers', stdout=StringIO())
+        self.assertRegex(self.read('crm_heartbeat_log.txt')[0],
+                         r'^\d\d/\d\d/\d{4}-\d\d:\d\d:\d\d CRM is alive$')
+        self.assertTrue(re.match(r'^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d - Deleted 0 inactive customers$',
+                                 self.read('customer_cleanup_log.txt')[0]))
+
+    def test_json_lines_carry_fields(self):
+        old = Customer.objects.create(name="Old", email="old-log@example.com")
+        Customer.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=400))
+        with self.settings(CRM_JOB_LOG_DIR=self.dir, CRM_JOB_LOG_FORMAT='json'):
+            call_command('cleanup_customers', stdout=StringIO())
+        entry = json.loads(self.read('customer_cleanup_log.txt')[0])
+        self.assertEqual(entry['job'], 'cleanup')
+        self.assertEqual(entry['level'], 'INFO')
+        self.assertEqual(entry['message'], 'Deleted 1 inactive customers')
+        self.assertEqual((entry['rows'], entry['batches']), (1, 1))
+        self.assertIn('duration_ms', entry)
+
+    def test_batches_are_written_with_one_flush(self):
+        from unittest import mock
+        from crm.joblog import JobFileHandler
+        log = self.joblog.get_logger('reminders', os.path.join(self.dir, 'batch.txt'))
+        with mock.patch.object(JobFileHandler, 'flush', autospec=True,
+                               side_effect=JobFileHandler.flush) as flushed:
+            for i in range(50):
+                log.event(f'line {i}')
+            self.assertEqual(len(self.read('batch.txt')), 50)
+        self.assertEqual(flushed.call_count, 1)
+
+    def test_rotates_by_size_and_age(self):
+        from crm.joblog import JobFileHandler, make_formatter
+        path = os.path.join(self.dir, 'rotate.txt')
+        handler = JobFileHandler(path, make_formatter('report', 'json'), max_bytes=400,
+                                 backup_count=2, rotate_seconds=3600)
+        self.joblog._handlers[path] = handler
+        log = self.joblog.get_logger('report', path)
+        for i in range(10):
+            log.event('x' * 50, i=i)
+        self.joblog.flush()
+        self.assertTrue(os.path.exists(path + '.1'))
+        self.assertTrue(os.path.exists(path + '.2'))
+        self.assertFalse(os.path.exists(path + '.3'))
+        self.assertEqual(json.loads(self.read('rotate.txt')[-1])['i'], 9)
+
+        handler.close()
+        os.utime(path, (0, 0))
+        log.event('new interval')
+        self.assertEqual([json.loads(line)['message'] for line in self.read('rotate.txt')],
+                         ['new interval'])
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.ann = Customer.objects.create(name="Ann Smith", email="ann@example.com")
+        self.annabel = Customer.objects.create(name="Annabel Jones", email="bel@example.com")
+        self.smithers = Customer.objects.create(name="Wayland Smithers", email="ann.s@corp.test")
+        Customer.objects.create(name="Bob Brown", email="bob@example.com")
+        Product.objects.create(name="Laptop Stand", price=30, stock=5)
+        Product.objects.create(name="Laptop", price=900, stock=5)
+        Product.objects.create(name="Desk Lamp", price=20, stock=5)
+
+    def query(self, query, **variables):
+        from crm.schema import schema
+        result = schema.execute(query, variable_values=variables)
+        self.assertIsNone(result.errors)
+        return result.data
+
+    def names(self, field, q, **args):
+        data = self.query(
+            f'query ($q: String!, $first: Int, $after: String) {{ {field}(q: $q, first: $first, '
+            f'after: $after) {{ edges {{ node {{ name }} }} pageInfo {{ endCursor hasNextPage }} }} }}',
+            q=q, **args,
+        )[field]
+        return [edge['node']['name'] for edge in data['edges']], data['pageInfo']
+
+    def test_words_and_prefixes_ranked(self):
+        names, _ = self.names('searchCustomers', 'ann')
+        # Name prefix first, then email prefix, then other words.
+        self.assertEqual(names, ['Ann Smith', 'Annabel Jones', 'Wayland Smithers'])
+        self.assertEqual(self.names('searchCustomers', 'smi')[0],
+                         ['Ann Smith', 'Wayland Smithers'])
+        # Every word must match, in the name or the email.
+        self.assertEqual(self.names('searchCustomers', 'ann smith')[0],
+                         ['Ann Smith', 'Wayland Smithers'])
+        self.assertEqual(self.names('searchCustomers', 'annabel j')[0], [])
+        self.assertEqual(self.names('searchCustomers', 'annabel jo')[0], ['Annabel Jones'])
+        self.assertEqual(self.names('searchCustomers', 'corp.te')[0], ['Wayland Smithers'])
+        self.assertEqual(self.names('searchProducts', 'laptop')[0], ['Laptop', 'Laptop Stand'])
+        self.assertEqual(self.names('searchProducts', 'zz')[0], [])
+
+    def test_keyset_pages(self):
+        first, page_info = self.names('searchCustomers', 'ann', first=2)
+        self.assertTrue(page_info['hasNextPage'])
+        rest, page_info = self.names('searchCustomers', 'ann', first=2,
+                                     after=page_info['endCursor'])
+        self.assertEqual(first + rest, ['Ann Smith', 'Annabel Jones', 'Wayland Smithers'])
+        self.assertFalse(page_info['hasNextPage'])
+
+    def test_best_matches_older_than_the_candidate_window(self):
+        # Every email shares the word "1", so the newest rows fill the
+        # window; the named customer and name prefixes must still rank first.
+        Customer.objects.bulk_create(
+            Customer(name=f"Customer {i}", email=f"synthetic-1-{i}@example.com")
+            for i in range(1, 51)
+        )
+        with self.settings(CRM_SEARCH_MAX_CANDIDATES=10):
+            names, page_info = self.names('searchCustomers', 'Customer 1', first=1)
+            self.assertEqual(names, ['Customer 1'])
+            self.assertTrue(page_info['hasNextPage'])
+            self.assertEqual(self.names('searchCustomers', 'Customer 2', first=3)[0],
+                             ['Customer 2'])
+            self.assertEqual(self.names('searchCustomers', 'ann', first=2)[0],
+                             ['Ann Smith', 'Annabel Jones'])
+
+    def test_index_follows_writes(self):
+        from crm_app import cleanup
+        self.ann.name = "Anne Dupont"
+        self.ann.save()
+        self.assertEqual(self.names('searchCustomers', 'dupont')[0], ['Anne Dupont'])
+        self.assertEqual(self.names('searchCustomers', 'smith')[0], ['Wayland Smithers'])
+        Customer.objects.bulk_create([Customer(name="Zed Bulk", email="zed@example.com")])
+        self.assertEqual(self.names('searchCustomers', 'zed')[0], ['Zed Bulk'])
+        cleanup.delete_batch([self.smithers.id], timezone.now())
+        self.assertEqual(self.names('searchCustomers', 'wayland')[0], [])
+
+    def test_empty_query_is_an_error(self):
+        from crm.schema import schema
+        result = schema.execute('{ searchCustomers(q: " -- ") { edges { cursor } } }')
+        self.assertIn('at least one letter or digit', result.errors[0].message)
+
+    def test_async_schema_and_rebuild_command(self):
+        from asgiref.sync import async_to_sync
+        from crm.schema_async import schema as async_schema
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO crm_app_customer_search(crm_app_customer_search) "
+                           "VALUES ('delete-all')")
+        # "brown" starts neither the name nor the email: only the index finds it.
+        self.assertEqual(self.names('searchCustomers', 'brown')[0], [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('crm_app_customer_search rebuilt', out.getvalue())
+        result = async_to_sync(async_schema.execute_async)(
+            '{ searchCustomers(q: "brown") { edges { node { email } } } }')
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data['searchCustomers']['edges'],
+                         [{'node': {'email': 'bob@example.com'}}])
+
+
+class ProjectionTest(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Proj", email="proj@example.com")
+        Order.objects.create(customer=self.customer, total_amount=10)
+        Order.objects.create(customer=self.customer, total_amount=20)
+        Product.objects.create(name="Thin", price=5, stock=2)
+
+    def execute(self, query):
+        from types import SimpleNamespace
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from crm.schema import schema
+        with CaptureQueriesContext(connection) as queries:
+            result = schema.execute(query, context_value=SimpleNamespace())
+        self.assertIsNone(result.errors)
+        return result.data, [query['sql'] for query in queries]
+
+    def test_only_selected_columns_are_read(self):
+        data, sql = self.execute('{ products { edges { node { name } } } }')
+        self.assertEqual(data['products']['edges'], [{'node': {'name': 'Thin'}}])
+        self.assertEqual(len(sql), 1)
+        self.assertIn('"crm_app_product"."name"', sql[0])
+        self.assertNotIn('"crm_app_product"."price"', sql[0])
+
+    def test_foreign_key_is_joined_with_its_columns(self):
+        data, sql = self.execute(
+            '{ ordersLastWeek { totalAmount ...Buyer } } '
+            'fragment Buyer on OrderType { customer { email } }'
+        )
+        self.assertEqual({o['customer']['email'] for o in data['ordersLastWeek']},
+                         {'proj@example.com'})
+        self.assertEqual(len(sql), 1)
+        self.assertIn('INNER JOIN "crm_app_customer"', sql[0])
+        self.assertIn('"crm_app_customer"."email"', sql[0])
+        self.assertNotIn('"crm_app_customer"."name"', sql[0])
+
+    def test_reverse_relation_is_prefetched_projected(self):
+        data, sql = self.execute(
+            '{ customers { edges { node { name orderSet { totalAmount } } } } }'
+        )
+        orders = data['customers']['edges'][0]['node']['orderSet']
+        self.assertEqual([float(o['totalAmount']) for o in orders], [10.0, 20.0])
+        self.assertEqual(len(sql), 2)
+        self.assertNotIn('"crm_app_customer"."email"', sql[0])
+        self.assertNotIn('"crm_app_order"."order_date"', sql[1])
+
+    def test_projected_rows_are_not_shared_with_loaders(self):
+        """A customer projected to its name still loads its email in one query"""
+        data, sql = self.execute(
+            '{ customers { edges { node { name } } } '
+            'orders { edges { node { customer { email } } } } }'
+        )
+        self.assertEqual(len(sql), 2)
+        self.assertEqual(data['orders']['edges'][0]['node']['customer']['email'],
+                         'proj@example.com')
+
+    def test_mutation_reads_selected_columns(self):
+        data, sql = self.execute(
+            'mutation { updateLowStockProducts { updatedProducts { name } } }'
+        )
+        self.assertEqual(data['updateLowStockProducts']['updatedProducts'], [{'name': 'Thin'}])
+        select = next(statement for statement in sql if statement.startswith('SELECT'))
+        self.assertNotIn('"crm_app_product"."price"', select)
+        self.assertEqual(Product.objects.get().stock, 12)
+
+
+class BulkMutationTest(TestCase):
+    def setUp(self):
+        self.ann = Customer.objects.create(name="Ann", email="ann@example.com")
+        Product.objects.create(name="Lamp", price=20, stock=3)
+
+    def execute(self, query, **variables):
+        from crm.schema import schema
+        result = schema.execute(query, variable_values=variables)
+        self.assertIsNone(result.errors)
+        return next(iter(result.data.values()))
+
+    def upsert_customers(self, rows):
+        return self.execute(
+            'mutation ($rows: [CustomerInput!]!) { bulkUpsertCustomers(rows: $rows) {'
+            ' success message created updated errors { index field messages }'
+            ' customers { id name email } } }', rows=rows,
+        )
+
+    def test_upsert_customers_by_email(self):
+        data = self.upsert_customers([
+            {'name': "Ann Smith", 'email': "ann@example.com"},
+            {'name': "Bea", 'email': "bea@example.com"},
+            {'name': "Cal", 'email': "not-an-email"},
+            {'name': "Bea Again", 'email': "bea@example.com"},
+            {'name': "", 'email': "dee@example.com"},
+        ])
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'Created 1, updated 1, 3 rows failed')
+        self.assertEqual([(e['index'], e['field']) for e in data['errors']],
+                         [(2, 'email'), (3, 'email'), (4, 'name')])
+        self.assertEqual(data['errors'][1]['messages'], ['Same email as row 1.'])
+        self.assertEqual([c and c['name'] for c in data['customers']],
+                         ["Ann Smith", "Bea", None, None, None])
+        self.assertEqual(data['customers'][0]['id'], str(self.ann.id))
+        self.assertEqual(sorted(Customer.objects.values_list('name', flat=True)),
+                         ["Ann Smith", "Bea"])
+
+    def test_upsert_products_by_name(self):
+        Product.objects.create(name="Twin", price=1, stock=1)
+        Product.objects.create(name="Twin", price=2, stock=2)
+        data = self.execute(
+            'mutation ($rows: [ProductInput!]!) { bulkUpsertProducts(rows: $rows) {'
+            ' created updated errors { index field messages } products { name price stock } } }',
+            rows=[
+                {'name': "Lamp", 'stock': 8},
+                {'name': "Desk", 'price': '99.50'},
+                {'name': "Chair"},
+                {'name': "Twin", 'stock': 5},
+                {'name': "Pen", 'price': '1.234'},
+            ],
+        )
+        self.assertEqual((data['created'], data['updated']), (1, 1))
+        self.assertEqual(data['products'][:2], [
+            {'name': "Lamp", 'price': '20.00', 'stock': 8},
+            {'name': "Desk", 'price': '99.50', 'stock': 0},
+        ])
+        self.assertEqual([(e['index'], e['field']) for e in data['errors']],
+                         [(2, 'price'), (3, 'name'), (4, 'price')])
+        self.assertEqual(data['errors'][1]['messages'], ["2 products are named 'Twin'."])
+
+    def test_create_orders_updates_totals_and_rollups(self):
+        from decimal import Decimal
+        from crm_app import rollups, stats
+        from crm_app.models import DailyRollup
+        Order.objects.create(customer=self.ann, total_amount=1,
+                             order_date=timezone.now() - timedelta(days=1))
+        rollups.update()
+        last_week = timezone.now() - timedelta(days=7)
+        with self.settings(CRM_PRECOMPUTED_STATS=True):
+            stats.recompute()
+            data = self.execute(
+                'mutation ($rows: [OrderInput!]!) { bulkCreateOrders(rows: $rows) {'
+                ' success created errors { index field } orders { customer { email } } } }',
+                rows=[
+                    {'customerId': str(self.ann.id), 'totalAmount': '10.00',
+                     'orderDate': last_week.isoformat()},
+                    {'customerEmail': "ann@example.com", 'totalAmount': '5.50'},
+                    {'customerEmail': "nobody@example.com", 'totalAmount': '1.00'},
+                    {'customerId': '999999', 'totalAmount': '1.00'},
+                    {'totalAmount': '1.00'},
+                    {'customerId': str(self.ann.id), 'totalAmount': '-1'},
+                ],
+            )
+            totals = stats.get_totals()
+        self.assertEqual(data['created'], 2)
+        self.assertEqual([(e['index'], e['field']) for e in data['errors']],
+                         [(2, 'customerEmail'), (3, 'customerId'), (4, 'customerId'),
+                          (5, 'totalAmount')])
+        self.assertEqual(data['orders'][0], {'customer': {'email': "ann@example.com"}})
+        self.assertEqual((totals['orders'], totals['revenue']), (3, Decimal('16.50')))
+        rollup = DailyRollup.objects.get(day=rollups.day_of(last_week))
+        self.assertEqual((rollup.order_count, rollup.revenue), (1, Decimal('10.00')))
+
+    def test_too_many_rows_writes_nothing(self):
+        with self.settings(CRM_BULK_MAX_ROWS=1):
+            data = self.upsert_customers([
+                {'name': "Bea", 'email': "bea@example.com"},
+                {'name': "Cal", 'email': "cal@example.com"},
+            ])
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'At most 1 rows per call; got 2.')
+        self.assertEqual(Customer.objects.count(), 1)
+
+    def test_database_errors_fail_only_their_rows(self):
+        """A chunk that hits a unique violation is retried row by row"""
+        from unittest import mock
+        from crm_app import bulk
+        rows = [{'name': f"New {i}", 'email': f"new{i}@example.com"} for i in range(3)]
+        rows.insert(1, {'name': "Ann", 'email': "ann@example.com"})
+        # As if Ann were inserted by another writer after the lookup.
+        with mock.patch.object(Customer.objects, 'in_bulk', return_value={}):
+            result = bulk.upsert_customers(rows, chunk_size=2)
+        self.assertEqual(result.created, 3)
+        self.assertEqual([(e.index, e.field) for e in result.errors], [(1, None)])
+        self.assertIn('UNIQUE', result.errors[0].messages[0])
+        self.assertEqual(Customer.objects.count(), 4)
+
+    def test_async_schema_and_search_index(self):
+        from asgiref.sync import async_to_sync
+        from crm_app import search
+        from crm.schema_async import schema as async_schema
+        result = async_to_sync(async_schema.execute_async)(
+            'mutation { bulkUpsertCustomers(rows: [{name: "Zelda Quill", email: "zq@example.com"}])'
+            ' { success created } }')
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data['bulkUpsertCustomers'], {'success': True, 'created': 1})
+        self.assertEqual([c.name for c in search.search(Customer, 'quill')], ["Zelda Quill"])
+
+
+class TransferTest(TestCase):
+    def setUp(self):
+        self.ann = Customer.objects.create(
+            name="Ann, Jr.", email="ann@example.com",
+            created_at=timezone.now() - timedelta(days=40))
+        Product.objects.create(name="Lamp", price=20, stock=3)
+        Order.objects.create(customer=self.ann, total_amount='12.34',
+                             order_date=timezone.now() - timedelta(days=2))
+
+    def export(self, **kwargs):
+        from crm_app import transfer
+        out = StringIO()
+        transfer.export(out, **kwargs)
+        return out.getvalue()
+
+    def snapshot(self):
+        return (
+            list(Customer.objects.order_by('email').values_list('name', 'email', 'created_at')),
+            list(Product.objects.order_by('name').values_list('name', 'price', 'stock')),
+            list(Order.objects.order_by('order_date')
+                 .values_list('customer__email', 'order_date', 'total_amount')),
+        )
+
+    def test_round_trip(self):
+        from crm_app import transfer
+        for fmt in transfer.FORMATS:
+            before = self.snapshot()
+            text = self.export(fmt=fmt, chunk_size=1)
+            Order.objects.all().delete()
+            Customer.objects.all().delete()
+            Product.objects.all().delete()
+            result = transfer.import_records(StringIO(text), fmt)
+            self.assertEqual((result.records, result.created, result.errors), (3, 3, 0))
+            self.assertEqual(self.snapshot(), before)
+
+    def test_csv_has_one_header_for_all_models(self):
+        lines = self.export(fmt='csv', models='order,customer').splitlines()
+        self.assertEqual(lines[0], 'model,id,name,email,created_at,customer_email,'
+                                   'order_date,total_amount')
+        self.assertTrue(lines[1].startswith('customer,'))
+        self.assertIn('"Ann, Jr."', lines[1])
+        self.assertTrue(lines[2].startswith('order,') and lines[2].endswith(',12.34'))
+
+    def test_export_memory_does_not_grow_with_rows(self):
+        import tracemalloc
+
+        def peak():
+            tracemalloc.start()
+            try:
+                for _ in __import__('crm_app').transfer.export_chunks(
+                        models='customer', chunk_size=1000):
+                    pass
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        def add(count):
+            start = Customer.objects.count()
+            Customer.objects.bulk_create(
+                Customer(name=f"Row {i}", email=f"row{i}@example.com")
+                for i in range(start, start + count)
+            )
+
+        # Both sizes span several chunks; only the chunk should be in memory.
+        add(2000)
+        peak()
+        small = peak()
+        add(18000)
+        self.assertLess(peak(), small * 1.5)
+
+    def test_import_reports_errors_and_resumes(self):
+        from unittest import mock
+        from crm_app import bulk, transfer
+        path = os.path.join(tempfile.mkdtemp(), 'crm.ndjson')
+        with open(path, 'w') as out:
+            for i in range(5):
+                out.write(json.dumps({'model': 'customer', 'name': f"C{i}",
+                                      'email': f"c{i}@example.com"}) + '\n')
+            out.write('not json\n')
+            out.write(json.dumps({'model': 'order', 'customer_email': 'c1@example.com',
+                                  'total_amount': '5.00'}) + '\n')
+            out.write(json.dumps({'model': 'order', 'customer_email': 'zz@example.com',
+                                  'total_amount': '5.00'}) + '\n')
+        original = bulk.create_orders
+
+        def interrupted(rows):
+            raise RuntimeError('killed')
+
+        with mock.patch.dict(transfer.WRITERS, order=interrupted):
+            with self.assertRaises(RuntimeError):
+                call_command('import_crm', path, chunk_size=2, stdout=StringIO())
+        self.assertEqual(Customer.objects.count(), 6)
+        out, err = StringIO(), StringIO()
+        with mock.patch.dict(transfer.WRITERS, order=original):
+            call_command('import_crm', path, chunk_size=2, stdout=out, stderr=err)
+        self.assertIn('Resumed after record 6', out.getvalue())
+        self.assertIn('Imported 8 records: 6 created, 0 updated, 2 failed', out.getvalue())
+        # Record 6 failed before the interruption; it is counted, not repeated.
+        self.assertIn('1 more failed records not shown', err.getvalue())
+        self.assertIn("record 8 (order): customer_email: No customer with email", err.getvalue())
+        self.assertEqual(Order.objects.filter(customer__email='c1@example.com').count(), 1)
+
+    def test_export_endpoint_requires_staff_or_token(self):
+        from django.contrib.auth.models import User
+        self.assertEqual(self.client.get('/export').status_code, 403)
+        with self.settings(CRM_EXPORT_TOKEN='secret'):
+            self.assertEqual(self.client.get(
+                '/export', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            response = self.client.get('/export?models=product',
+                                       HTTP_AUTHORIZATION='Bearer secret')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        record = json.loads(b''.join(response.streaming_content))
+        self.assertEqual((record['model'], record['name'], record['price']),
+                         ('product', 'Lamp', '20.00'))
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        response = self.client.get('/export?format=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 4)
+        self.assertEqual(self.client.get('/export?format=xml').status_code, 400)
+
+
+class ExportLockTest(TransactionTestCase):
+    # A file database in IMMEDIATE mode without WAL, where any open read
+    # transaction or statement also keeps writers from committing.
+
+    @classmethod
+    def setUpClass(cls):
+        from django.conf import settings
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, 'export.sqlite3')
+        settings.DATABASES['export_lock'] = {
+            **settings.DATABASES['default'],
+            'NAME': cls.path,
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+        }
+        cls.databases = {'default', 'export_lock'}
+        super().setUpClass()
+        call_command('migrate', database='export_lock', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        from django.conf import settings
+        from django.db import connections
+        super().tearDownClass()
+        connections['export_lock'].close()
+        del connections['export_lock']
+        del settings.DATABASES['export_lock']
+        cls.tmp.cleanup()
+
+    def test_writes_commit_while_an_export_is_streaming(self):
+        import sqlite3
+        from crm_app import transfer
+        Customer.objects.using('export_lock').bulk_create(
+            Customer(name=f"Row {i}", email=f"row{i}@example.com") for i in range(30)
+        )
+        chunks = transfer.export_chunks(models='customer', chunk_size=10, using='export_lock')
+        self.assertEqual(next(chunks).count('\n'), 10)
+        writer = sqlite3.connect(self.path, timeout=1)
+        try:
+            writer.execute("INSERT INTO crm_app_customer (name, email, created_at) "
+                           "VALUES ('Late', 'late@example.com', '2026-01-01 00:00:00')")
+            writer.commit()
+        finally:
+            writer.close()
+        # The rest of the export, without the customer added after it started.
+        self.assertEqual(''.join(chunks).count('\n'), 20)
+        self.assertEqual(Customer.objects.using('export_lock').count(), 31)
@@ -0,0 +1,337 @@
+"""
+Streaming export and import of customers, products and orders.
+
+A record is a flat dict with a ``model`` key (``customer``, ``product``
+or ``order``) and that model's ``FIELDS``. Records are written as NDJSON,
+one JSON object per line, or as CSV with a ``model`` column followed by
+the fields of every exported model. Orders carry their customer's email
+instead of the customer id, so a file imports into any database; the
+exported ``id`` columns are informational and ignored on import.
+
+``export_chunks`` reads each model in id order, ``chunk_size`` rows per
+keyset query (``id > last``), and encodes each page as it arrives, so
+memory use does not depend on the table sizes. No transaction stays open
+between pages, so writers are never blocked by a slow reader of the
+stream. The export covers the rows up to each model's highest id when it
+starts (see ``_tops``), so rows added during the export are left out and
+every exported order's customer is in the export too (unless it was
+deleted meanwhile). Rows changed during the export are read as they are
+when their page is read.
+
+``import_records`` parses its input one record at a time and writes runs
+of up to ``chunk_size`` records of one model through ``crm_app.bulk``:
+customers are upserted on email, products on name, and orders created.
+Each run commits in its own transaction together with the
+``crm_import`` ``JobCheckpoint``. An interrupted import of the same file
+resumes after the last run that committed, so no order is created twice.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max
+
+from . import bulk
+from .models import Customer, JobCheckpoint, Order, Product
+
+CHECKPOINT_NAME = 'crm_import'
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+MODELS = {
+    'customer': Customer,
+    'product': Product,
+    'order': Order,
+}
+FIELDS = {
+    'customer': ('id', 'name', 'email', 'created_at'),
+    'product': ('id', 'name', 'price', 'stock'),
+    'order': ('id', 'customer_email', 'order_date', 'total_amount'),
+}
+# Record fields read through a relation.
+LOOKUPS = {
+    'customer_email': 'customer__email',
+}
+WRITERS = {
+    'customer': bulk.upsert_customers,
+    'product': bulk.upsert_products,
+    'order': bulk.create_orders,
+}
+# Error messages kept in ImportResult.messages; the rest are only counted.
+MAX_MESSAGES = 20
+
+
+def get_export_chunk_size():
+    return getattr(settings, 'CRM_EXPORT_CHUNK_SIZE', 2000)
+
+
+def get_import_chunk_size():
+    return getattr(settings, 'CRM_IMPORT_CHUNK_SIZE', 1000)
+
+
+def parse_models(names=None):
+    """The model names in ``names`` (comma separated or a list), all by default."""
+    if not names:
+        return list(MODELS)
+    if isinstance(names, str):
+        names = [name.strip() for name in names.split(',') if name.strip()]
+    unknown = [name for name in names if name not in MODELS]
+    if unknown:
+        raise ValueError(f"Unknown model {unknown[0]!r}; choose from {', '.join(MODELS)}.")
+    # Customers before the orders that refer to them.
+    return [name for name in MODELS if name in names]
+
+
+def check_format(fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; choose from {', '.join(FORMATS)}.")
+    return fmt
+
+
+def columns(models):
+    """The CSV header for ``models``: ``model`` and each field once."""
+    names = ['model']
+    for model in models:
+        names.extend(field for field in FIELDS[model] if field not in names)
+    return names
+
+
+def _text(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class CSVEncoder:
+    """Encodes batches of rows as CSV text, reusing one buffer."""
+
+    def __init__(self, header):
+        self.header = header
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator='\n')
+
+    def _flush(self):
+        text = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return text
+
+    def head(self):
+        self.writer.writerow(self.header)
+        return self._flush()
+
+    def encode(self, model, rows):
+        fields = FIELDS[model]
+        for row in rows:
+            values = dict(zip(fields, row))
+            self.writer.writerow(
+                [model] + [_text(values.get(name)) for name in self.header[1:]]
+            )
+        return self._flush()
+
+
+def _ndjson(model, rows):
+    fields = FIELDS[model]
+    return ''.join(
+        json.dumps({'model': model, **{f: _text(v) for f, v in zip(fields, row)}}) + '\n'
+        for row in rows
+    )
+
+
+def _tops(models, using):
+    """The highest id of each of ``models`` when the export starts.
+
+    Read orders first: an order at or below its top was created before
+    the customer top was read, so its customer is at or below that top.
+    """
+    return {
+        model: MODELS[model].objects.using(using).aggregate(top=Max('id'))['top'] or 0
+        for model in reversed(models)
+    }
+
+
+def export_chunks(models=None, fmt='ndjson', chunk_size=None, using=DEFAULT_DB_ALIAS,
+                  progress=None):
+    """Yield the export of ``models`` as text, one chunk of rows at a time.
+
+    ``progress(model, count)`` is called after every chunk with the rows
+    of ``model`` written so far.
+    """
+    models = parse_models(models)
+    check_format(fmt)
+    chunk_size = chunk_size or get_export_chunk_size()
+    if fmt == 'csv':
+        encoder = CSVEncoder(columns(models))
+        encode = encoder.encode
+        yield encoder.head()
+    else:
+        encode = _ndjson
+    tops = _tops(models, using)
+    for model in models:
+        lookups = [LOOKUPS.get(field, field) for field in FIELDS[model]]
+        rows = (
+            MODELS[model].objects.using(using).filter(id__lte=tops[model])
+            .order_by('id').values_list(*lookups)
+        )
+        count, last = 0, 0
+        while True:
+            # A whole page per query, so no statement stays open (holding
+            # a read lock) while the caller writes the page out.
+            batch = list(rows.filter(id__gt=last)[:chunk_size])
+            if batch:
+                yield encode(model, batch)
+                count += len(batch)
+                last = batch[-1][0]
+            if progress is not None:
+                progress(model, count)
+            if len(batch) < chunk_size:
+                break
+
+
+def export(out, models=None, fmt='ndjson', chunk_size=None, using=DEFAULT_DB_ALIAS,
+           progress=None):
+    """Write the export to the text stream ``out``; return ``{model: rows}``."""
+    counts = {}
+
+    def counted(model, count):
+        counts[model] = count
+        if progress is not None:
+            progress(model, count)
+
+    for text in export_chunks(models, fmt, chunk_size, using, counted):
+        out.write(text)
+    return counts
+
+
+def read_records(stream, fmt='ndjson', skip=0):
+    """Yield ``(number, record)`` for each record of the text ``stream``.
+
+    Records are numbered from 1. The first ``skip`` are not yielded (and,
+    for NDJSON, not parsed). A line that is not a JSON object yields a
+    record with an ``error`` and no ``model``.
+    """
+    check_format(fmt)
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(stream), 1):
+            if number > skip:
+                yield number, {key: value for key, value in row.items() if value != ''}
+        return
+    number = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        number += 1
+        if number <= skip:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            record = {'error': f'Invalid JSON: {error}'}
+        if not isinstance(record, dict):
+            record = {'error': 'Not a JSON object.'}
+        yield number, record
+
+
+class ImportResult:
+    def __init__(self, records=0, created=0, updated=0, errors=0, resumed_from=0):
+        self.records = records
+        self.created = created
+        self.updated = updated
+        self.errors = errors
+        self.resumed_from = resumed_from
+        self.messages = []
+
+    def error(self, number, model, field, messages):
+        self.errors += 1
+        if len(self.messages) < MAX_MESSAGES:
+            where = f'{field}: ' if field else ''
+            self.messages.append(f"record {number} ({model or '?'}): {where}{'; '.join(messages)}")
+
+    def position(self, source):
+        return {
+            'source': source,
+            'records': self.records,
+            'created': self.created,
+            'updated': self.updated,
+            'errors': self.errors,
+        }
+
+
+def _write_run(model, run, result):
+    """Write one run of records of ``model``; record its counts in ``result``."""
+    if model not in WRITERS:
+        for number, record in run:
+            result.error(number, model, None, [record.get('error') or f'Unknown model {model!r}.'])
+        return
+    rows = [
+        {field: value for field, value in record.items() if field not in ('model', 'id')}
+        for _, record in run
+    ]
+    outcome = WRITERS[model](rows)
+    result.created += outcome.created
+    result.updated += outcome.updated
+    failed = {}
+    for error in outcome.errors:
+        failed.setdefault(error.index, []).append(error)
+    for index, errors in failed.items():
+        messages = [f'{error.field}: {m}' if error.field else m
+                    for error in errors for m in error.messages]
+        result.error(run[index][0], model, None, messages)
+
+
+def import_records(stream, fmt='ndjson', source=None, chunk_size=None, restart=False,
+                   progress=None):
+    """Import the records of the text ``stream``; return an ``ImportResult``.
+
+    ``source`` names the input (e.g. its path and size). With a source the
+    import is checkpointed and resumes where the last import of the same
+    source stopped, unless ``restart``. ``progress(result)`` is called
+    after every committed run.
+    """
+    chunk_size = min(chunk_size or get_import_chunk_size(), bulk.get_max_rows())
+    checkpoint, position = None, {}
+    if source is not None:
+        checkpoint, _ = JobCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+        position = {} if restart else checkpoint.position or {}
+        if position.get('source') != source:
+            position = {}
+    result = ImportResult(
+        records=position.get('records', 0),
+        created=position.get('created', 0),
+        updated=position.get('updated', 0),
+        errors=position.get('errors', 0),
+        resumed_from=position.get('records', 0),
+    )
+
+    def commit(model, run):
+        with transaction.atomic():
+            _write_run(model, run, result)
+            result.records = run[-1][0]
+            if checkpoint is not None:
+                checkpoint.position = result.position(source)
+                checkpoint.save(update_fields=['position', 'updated_at'])
+        if progress is not None:
+            progress(result)
+
+    run, run_model = [], None
+    for number, record in read_records(stream, fmt, skip=result.records):
+        model = record.get('model')
+        if run and (model != run_model or len(run) == chunk_size):
+            commit(run_model, run)
+            run = []
+        run.append((number, record))
+        run_model = model
+    if run:
+        commit(run_model, run)
+
+    if checkpoint is not None:
+        checkpoint.position = {}
+        checkpoint.save(update_fields=['position', 'updated_at'])
+    return result
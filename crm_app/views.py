@@ -1,3 +1,36 @@
-from django.shortcuts import render
+import hmac
 
-# Create your views here.
+from django.conf import settings
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
+
+from . import transfer
+
+
+def _allowed(request):
+    """Staff users, or a request with ``Authorization: Bearer <CRM_EXPORT_TOKEN>``."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_active and user.is_staff:
+        return True
+    token = getattr(settings, 'CRM_EXPORT_TOKEN', None)
+    scheme, _, supplied = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(
+        token and scheme.lower() == 'bearer'
+        and hmac.compare_digest(supplied.encode(), token.encode())
+    )
+
+
+def export_view(request):
+    """Stream ``?models=`` (all by default) as ``?format=ndjson`` or ``csv``."""
+    if not _allowed(request):
+        return HttpResponseForbidden('Staff or an export token only.')
+    fmt = request.GET.get('format', 'ndjson')
+    try:
+        models = transfer.parse_models(request.GET.get('models'))
+        transfer.check_format(fmt)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    response = StreamingHttpResponse(
+        transfer.export_chunks(models, fmt), content_type=transfer.FORMATS[fmt]
+    )
+    response['Content-Disposition'] = f'attachment; filename="crm-export.{fmt}"'
+    return response